@@ -0,0 +1,433 @@
+"""Link-level entanglement generation: sampled pairs instead of photons.
+
+With photon-level BSM nodes every elementary link pair costs one
+Barrett-Kok attempt after another, each a dozen events (negotiation,
+emissions, photons, detections, results), and on lossy links most Timeline
+events are failed attempts. ``LinkAbstraction`` swaps the generation
+protocol on chosen links for ``LinkGenerationA``, which draws from the same
+hardware parameters how many attempts the next pair takes and how they
+fail, and puts both memories in their entangled state at the time the
+photon-level protocol would have. Resource management, purification,
+swapping and routing are untouched, so attack studies keep their
+behaviour at a fraction of the events::
+
+    abstraction = LinkAbstraction(network)        # every link, or edges=[...]
+    run_request(network, ...)
+    abstraction.close()
+
+``run_scenario(abstraction="all")`` does the same; ``compare_modes`` runs a
+scenario in both modes over many seeds and tests that the metrics and the
+fidelity and time-to-pair distributions of the pairs agree.
+
+The model follows SeQUeNCe 0.6.4 (components/bsm.py, generation.py):
+
+* a photon reaches a detector with probability ``eta`` (memory efficiency
+  times channel transmission), which clicks with its efficiency;
+* round 1 heralds one excitation with probability ``(eta_a + eta_b) * d / 4``;
+  when both memories emit, a single click heralds a false pair that always
+  fails in round 2;
+* round 2 confirms a true round 1 with probability ``(eta_a + eta_b) * d / 2``;
+* the pair is Phi+ with probability ``raw_fidelity`` of the photon encoding,
+  any other Bell state otherwise, and the memories keep their ``raw_fidelity``;
+* a round lasts ``NEGOTIATE + NEGOTIATE_ACK + quantum channel + BSM result``
+  and a new attempt starts after the request/response of the resource managers;
+  the photons leave on the next time slot of the quantum channel, so rounds
+  that end off the slots take up to one slot (12.5 ns) longer;
+* while the responder has no memory free for the link, the initiator's requests
+  are rejected and sent again every round trip; at link level it waits without
+  messages and its request reaches the responder's resource manager at the first
+  of those round trips after a responder memory is free.
+
+Detector dark counts are not modelled, nor the photons of other memories
+of the link: at photon level memories that generate together emit in
+consecutive slots of the channel (12.5 ns apart), and a click leaves a
+detector blind for its dead time (40 ns by default) to the photons of the
+next ones. Where many memories generate at once, as at the start of a
+reservation, link level thus gives the pairs sooner (473 pairs instead of
+365 in the first 3 ms of the second ``__main__`` case, against 100 and 106
+with one memory per link). Attempts are drawn ``max_attempts`` at a time, so
+changes made by attacks apply from the next batch of attempts on.
+"""
+
+import math
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Callable, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+# Importing sequence structures
+from sequence.components.bsm import BSM
+from sequence.entanglement_management.generation import EntanglementGenerationA
+from sequence.kernel.event import Event
+from sequence.kernel.process import Process
+from sequence.network_management.reservation import eg_req_func, eg_rule_action1, eg_rule_action2
+from sequence.resource_management.resource_manager import ResourceManagerMessage, ResourceManagerMsgType
+from sequence.resource_management.rule_manager import Rule
+
+from event_trace import MEMORY, load_trace
+from hooks import Hooks, counts_pair
+
+# attempts drawn at once; parameters are read again after each batch
+MAX_ATTEMPTS = 100
+# gap the photon-level protocol leaves between the BSM result and the next round
+ROUND_GAP = 10
+# Bell states of a generated pair: the intended one first
+BELL_STATES = (BSM._phi_plus, BSM._phi_minus, BSM._psi_plus, BSM._psi_minus)
+# what pair_samples gives of each pair
+PAIR_COLUMNS = ["fidelity", "time_to_pair"]
+
+
+class LinkGenerationA(EntanglementGenerationA):
+    """EntanglementGenerationA whose attempts are sampled instead of simulated photon by photon.
+
+    Both ends are paired by their resource managers as usual; the primary
+    end then draws the attempts of both and schedules the success of the
+    pair on each end.
+
+    Attributes:
+        initiator (bool): whether this end sent the pairing request.
+        max_attempts (int): attempts drawn at once.
+        attempts (int): attempts drawn so far.
+        req_args (dict): arguments of ``eg_req_func`` on the responder's node, set on the initiator.
+        asked (float): time the initiator first asked for its responder, None once it is paired.
+    """
+
+    def __init__(self, owner: "Node", name: str, middle: str, other: str, memory: "Memory",
+                 initiator: bool = False, max_attempts: int = MAX_ATTEMPTS):
+        super().__init__(owner, name, middle, other, memory)
+        self.initiator = initiator
+        self.max_attempts = max_attempts
+        self.attempts = 0
+        self.partner = None
+        self.asked = None
+        self.req_args = None
+        self.ask_event = None
+
+    def wait_for_pair(self) -> None:
+        """Waits for the other end on the resource manager, as ``send_request`` does, without rejected requests."""
+        self.owner = self.memory.owner
+        resource_manager = self.owner.resource_manager
+        if not self.initiator:
+            resource_manager.waiting_protocols.append(self)
+            node = self.owner.timeline.get_entity_by_name(self.remote_node_name)
+            for protocol in node.resource_manager.pending_protocols:
+                if (isinstance(protocol, LinkGenerationA) and protocol.asked is not None
+                        and eg_req_func([self], protocol.req_args) is self):
+                    protocol.schedule_ask()
+            return
+        resource_manager.pending_protocols.append(self)
+        self.asked = self.owner.timeline.now()
+        self.schedule_ask()
+
+    def schedule_ask(self) -> None:
+        """Schedules the request of the initiator that reaches a waiting responder, if one waits."""
+        node = self.owner.timeline.get_entity_by_name(self.remote_node_name)
+        if self.ask_event is not None or eg_req_func(node.resource_manager.waiting_protocols, self.req_args) is None:
+            return
+        # a rejected request comes back after one round trip and is sent again at once
+        to_partner = self.owner.cchannels[node.name].delay
+        round_trip = to_partner + node.cchannels[self.owner.name].delay
+        first = self.asked + to_partner
+        arrival = first + max(0, math.ceil((self.owner.timeline.now() - first) / round_trip)) * round_trip
+        self.ask_event = Event(int(round(arrival)), Process(self, "ask", []))
+        self.owner.timeline.schedule(self.ask_event)
+
+    def ask(self) -> None:
+        """Delivers the request of the initiator to the resource manager of the responder."""
+        self.ask_event = None
+        if self.asked is None or self not in self.owner.resource_manager.pending_protocols:
+            return
+        node = self.owner.timeline.get_entity_by_name(self.remote_node_name)
+        if eg_req_func(node.resource_manager.waiting_protocols, self.req_args) is None:
+            return  # taken by another request; asked again when a responder waits
+        self.asked = None
+        msg = ResourceManagerMessage(ResourceManagerMsgType.REQUEST, protocol=self.name, node=self.owner.name,
+                                     memories=[self.memory.name], req_condition_func=eg_req_func,
+                                     req_args=self.req_args)
+        node.resource_manager.received_message(self.owner.name, msg)
+
+    def start(self) -> None:
+        # to avoid start after remove protocol
+        if self not in self.owner.protocols:
+            return
+        self.ent_round = 1
+        if self.primary:
+            # the initiator's protocol waits for the response of this end among the pending ones
+            node = self.owner.timeline.get_entity_by_name(self.remote_node_name)
+            self.partner = next((protocol for protocol in node.protocols + node.resource_manager.pending_protocols
+                                 if protocol.name == self.remote_protocol_name), None)
+            if self.partner is None:
+                self._entanglement_fail()
+                return
+            self.partner.partner = self
+            self.draw_attempts(self.owner.timeline.now())
+
+    def _alive(self) -> bool:
+        partner = self.partner
+        return self in self.owner.protocols and partner is not None and (
+            partner in partner.owner.protocols or partner in partner.owner.resource_manager.pending_protocols)
+
+    def link_timing(self) -> dict:
+        """Times (ps) of one attempt; the primary is this end, the other end emits on a slot of its channel."""
+        partner = self.partner
+        own, other = self.owner, partner.owner
+        to_partner, from_partner = own.cchannels[other.name].delay, other.cchannels[own.name].delay
+        delays = own.qchannels[self.middle].delay, other.qchannels[partner.middle].delay
+        results = own.cchannels[self.middle].delay, other.cchannels[partner.middle].delay
+        # the other end answers NEGOTIATE with the first slot from which both photons reach the BSM together
+        negotiate = to_partner + max(delays) - delays[1] + from_partner
+        ends = [delays[1] + delay + ROUND_GAP for delay in results]
+        # the initiator asks its partner once its memory is free again, the primary starts on the request
+        # (the responder) or on the response (the initiator)
+        pairing = from_partner + (to_partner if self.initiator else 0)
+        return {"negotiate": negotiate, "period": 1e12 / other.qchannels[partner.middle].frequency,
+                "round2": ends[0] + negotiate, "retry": ends[0 if self.initiator else 1] + pairing + negotiate,
+                "ends": ends, "emits": [delays[1] - delays[0], 0]}
+
+    def link_probabilities(self) -> tuple:
+        """Probabilities (success, failure in round 1, failure in round 2) of one attempt."""
+        partner = self.partner
+        etas = [memory.efficiency * (1 - node.qchannels[middle].loss) for memory, node, middle in
+                ((self.memory, self.owner, self.middle), (partner.memory, partner.owner, partner.middle))]
+        bsm = self.owner.timeline.get_entity_by_name(self.middle).get_components_by_type("SingleAtomBSM")[0]
+        d0, d1 = (detector.efficiency for detector in bsm.detectors)
+        detector = (d0 + d1) / 2
+        round1 = (etas[0] + etas[1]) * detector / 4
+        round2 = (etas[0] + etas[1]) * detector / 2
+        # both memories emit: one click (alone, or both on the same detector) heralds a false pair
+        any_click = 1 - (1 - etas[0] * detector) * (1 - etas[1] * detector)
+        false_pair = (any_click - etas[0] * etas[1] * d0 * d1 / 2) / 4
+        success = round1 * round2
+        fail2 = round1 * (1 - round2) + false_pair
+        return success, 1 - success - fail2, fail2
+
+    def draw_attempts(self, start: float) -> None:
+        """Draws the attempts from ``start`` on, up to the next pair or ``max_attempts`` failures."""
+        if not self._alive():
+            if self in self.owner.protocols:
+                self._entanglement_fail()
+            return
+        rng = self.owner.get_generator()
+        success, fail1, fail2 = self.link_probabilities()
+        timing = self.link_timing()
+        period = timing["period"]
+
+        def slot(time: float) -> float:
+            # as QuantumChannel.schedule_transmit, other memories' photons aside
+            return math.ceil(time / period - 1e-5) * period
+
+        failures = rng.geometric(success) - 1 if success > 0 else math.inf
+        batch = min(failures, self.max_attempts)
+        round2 = rng.binomial(batch, fail2 / (fail1 + fail2)) if batch and fail1 + fail2 > 0 else 0
+        # emission of the other end in round 1 of the next attempt; the rounds go from slot to slot
+        emit = slot(start + timing["negotiate"])
+        emit += (batch - round2) * slot(timing["retry"]) + round2 * (slot(timing["round2"]) + slot(timing["retry"]))
+        self.attempts += batch
+        if failures > batch:
+            time = emit - timing["negotiate"]
+            self._schedule(self, Process(self, "draw_attempts", [time]), time)
+            return
+        self.attempts += 1
+        fidelity = (self.memory.encoding["raw_fidelity"], self.partner.memory.encoding["raw_fidelity"])
+        fidelity = fidelity[rng.integers(2)]
+        state = 0 if rng.random() < fidelity else 1 + int(rng.integers(3))
+        pair = {"state": BELL_STATES[state], "keys": [self.memory.qstate_key, self.partner.memory.qstate_key],
+                "set": False}
+        time = emit + slot(timing["round2"])
+        for protocol, end, offset in zip((self, self.partner), timing["ends"], timing["emits"]):
+            expire = emit + offset + int(protocol.memory.coherence_time * 1e12)
+            self._schedule(protocol, Process(protocol, "link_succeed", [pair, expire]), time + end)
+
+    def _schedule(self, protocol: "LinkGenerationA", process: Process, time: float) -> None:
+        event = Event(int(round(time)), process)
+        self.owner.timeline.schedule(event)
+        protocol.scheduled_events.append(event)
+
+    def link_succeed(self, pair: dict, expire: int) -> None:
+        """Puts the memory of this end in the drawn pair and reports it entangled."""
+        # once the first end has succeeded its protocol is gone, the second only needs its own
+        if self not in self.owner.protocols or not (pair["set"] or self._alive()):
+            if self in self.owner.protocols:
+                self._entanglement_fail()
+            return
+        timeline = self.owner.timeline
+        if not pair["set"]:
+            # the first end to succeed sets the joint state, the other must not undo what it did since
+            timeline.quantum_manager.set(pair["keys"], pair["state"])
+            pair["set"] = True
+        memory = self.memory
+        if memory.coherence_time > 0:
+            memory._schedule_expiration()
+            timeline.update_event_time(memory.expiration_event, max(expire, timeline.now()))
+        self.ent_round = 3
+        self._entanglement_succeed()
+
+    def received_message(self, src: str, msg: "EntanglementGenerationMessage") -> None:
+        pass  # the primary drives both ends
+
+
+def link_rule_action1(memories_info: List["MemoryInfo"], args: dict) -> tuple:
+    """eg_rule_action1 (responder end of a link) with LinkGenerationA."""
+    memory = memories_info[0].memory
+    protocol = LinkGenerationA(None, "EGA." + memory.name, args["mid"], args["path"][args["index"] - 1], memory,
+                               initiator=False, max_attempts=args["max_attempts"])
+    return protocol, [], [], []
+
+def link_rule_action2(memories_info: List["MemoryInfo"], args: dict) -> tuple:
+    """eg_rule_action2 (initiator end of a link) with LinkGenerationA."""
+    memory = memories_info[0].memory
+    path, index = args["path"], args["index"]
+    protocol = LinkGenerationA(None, "EGA." + memory.name, args["mid"], path[index + 1], memory,
+                               initiator=True, max_attempts=args["max_attempts"])
+    protocol.req_args = {"name": args["name"], "reservation": args["reservation"]}
+    return protocol, [], [], []
+
+def link_rule_do(rule: "Rule", memories_info: List["MemoryInfo"]) -> None:
+    """Rule.do of a link-level generation rule: its protocol waits for the other end without messages."""
+    Rule.do(rule, memories_info)
+    rule.protocols[-1].wait_for_pair()
+
+LINK_ACTIONS = {eg_rule_action1: link_rule_action1, eg_rule_action2: link_rule_action2}
+
+
+class LinkAbstraction:
+    """Generates the pairs of the chosen links with LinkGenerationA in the reservations approved from now on.
+
+    Attributes:
+        middles (set): names of the BSM nodes of the abstracted links.
+        rules (int): generation rules switched to link level so far.
+    """
+
+    def __init__(self, network: "Network", edges: Optional[Sequence[int]] = None,
+                 max_attempts: int = MAX_ATTEMPTS):
+        """
+        Args:
+            network (Network): network to abstract, before its requests are made.
+            edges (Sequence[int]): indices of the links to abstract (default: all).
+            max_attempts (int): attempts drawn at once.
+        """
+        bsm_nodes = network.bsm_nodes if edges is None else [network.bsm_nodes[k] for k in edges]
+        self.middles = {bsm.name for bsm in bsm_nodes}
+        self.max_attempts = max_attempts
+        self.rules = 0
+        self._hooks = Hooks()
+        for router in network.routers:
+            self.watch_router(router)
+
+    def watch_router(self, router: "QuantumRouter") -> None:
+        rsvp = router.network_manager.protocol_stack[1]
+        load_rules = rsvp.load_rules
+
+        def abstract_rules(rules: List["Rule"], reservation: "Reservation") -> None:
+            for rule in rules:
+                if rule.action in LINK_ACTIONS and rule.action_args["mid"] in self.middles:
+                    rule.action = LINK_ACTIONS[rule.action]
+                    rule.action_args["max_attempts"] = self.max_attempts
+                    rule.do = partial(link_rule_do, rule)
+                    self.rules += 1
+            load_rules(rules, reservation)
+
+        self._hooks.install(rsvp, "load_rules", abstract_rules)
+
+    def close(self) -> None:
+        """Stops abstracting new reservations; pairs already being generated finish at link level."""
+        self._hooks.restore()
+
+
+def pair_samples(trace: "Trace", start_time: float = 0) -> pd.DataFrame:
+    """Fidelity and time to pair (s) of every pair in a trace, one row per pair.
+
+    The time to pair of a memory runs from its previous pair, or from when
+    that pair was used up and the memory freed (from ``start_time`` for the
+    first one); a pair swapped or purified into a new one thus counts from the
+    old one. Each pair is counted once, as ``counts_pair`` does.
+    """
+    records = trace.select(MEMORY)
+    raw, entangled = trace.code("RAW"), trace.code("ENTANGLED")
+    names = trace.decode(records["owner"]), trace.decode(records["peer"])
+    since, paired, rows = {}, set(), []
+    for record, owner, peer in zip(records, *names):
+        memory = (owner, record["index"])
+        if record["label"] == raw and memory in paired:
+            # failed attempts at photon level free the memory too; only the end of a pair restarts the clock
+            since[memory] = record["time"]
+            paired.discard(memory)
+        elif record["label"] == entangled:
+            if counts_pair(owner, peer):
+                rows.append({"fidelity": record["value"],
+                             "time_to_pair": (record["time"] - since.get(memory, start_time)) / 1e12})
+            since[memory] = record["time"]
+            paired.add(memory)
+    return pd.DataFrame.from_records(rows, columns=PAIR_COLUMNS)
+
+def _compare(name: str, a: np.ndarray, b: np.ndarray) -> dict:
+    row = {"metric": name, "full_mean": a.mean() if len(a) else math.nan,
+           "full_std": a.std(ddof=1) if len(a) > 1 else math.nan,
+           "link_mean": b.mean() if len(b) else math.nan,
+           "link_std": b.std(ddof=1) if len(b) > 1 else math.nan,
+           "t_pvalue": math.nan, "ks_pvalue": math.nan}
+    if len(a) > 1 and len(b) > 1:
+        if np.ptp(a) == 0 and np.ptp(b) == 0:
+            # constant in both modes: the tests are undefined, the samples agree or they do not
+            row["t_pvalue"] = row["ks_pvalue"] = float(a[0] == b[0])
+        else:
+            row["t_pvalue"] = stats.ttest_ind(a, b, equal_var=False).pvalue
+            row["ks_pvalue"] = stats.ks_2samp(a, b).pvalue
+    return row
+
+def compare_modes(params: Optional[dict] = None, seeds: int = 30, func: Optional[Callable[..., dict]] = None,
+                  abstraction="all", metrics: Sequence[str] = ("entangled_pairs", "mean_fidelity", "latency"),
+                  processes: Optional[int] = None, seed: Optional[int] = 0) -> pd.DataFrame:
+    """Runs a scenario in full and link-level mode over ``seeds`` seeds and compares the metrics and the pairs.
+
+    ``func`` takes the arguments of ``run_scenario``, ``trace_dir`` included:
+    the pairs of every run are read back from its trace.
+
+    Returns:
+        pd.DataFrame: per metric, mean and standard deviation in each mode, the
+        p-values of Welch's t-test and of the two-sample Kolmogorov-Smirnov
+        test; the same for the fidelity and the time to pair of all the pairs
+        of all runs (``pair_fidelity`` and ``time_to_pair`` rows), then the pair
+        counts (``pairs`` row) and the mean event counts (``events`` row) of both modes.
+    """
+    # scenario and sweep import this module
+    from scenario import run_scenario
+    from sweep import run_point
+    func = func or run_scenario
+    params = params or {}
+    run_seeds = np.random.SeedSequence(seed).generate_state(seeds).tolist()
+    with tempfile.TemporaryDirectory() as trace_dir:
+        tasks = [(func, {**params, "seed": run_seed, "abstraction": mode, "trace_dir": trace_dir})
+                 for mode in (None, abstraction) for run_seed in run_seeds]
+        with ProcessPoolExecutor(max_workers=processes or os.cpu_count()) as executor:
+            results = list(executor.map(run_point, tasks, chunksize=1))
+        start_time = params.get("start_time", 1e12)
+        pairs = []
+        for half in (results[:seeds], results[seeds:]):
+            frames = [pair_samples(load_trace(os.path.join(trace_dir, result["run_id"] + ".trace")), start_time)
+                      for result in half if "run_id" in result]
+            pairs.append(pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=PAIR_COLUMNS))
+    full, link = pd.DataFrame(results[:seeds]), pd.DataFrame(results[seeds:])
+    rows = [_compare(name, full[name].dropna().to_numpy(), link[name].dropna().to_numpy()) for name in metrics]
+    rows += [_compare(name, pairs[0][column].to_numpy(), pairs[1][column].to_numpy())
+             for name, column in (("pair_fidelity", "fidelity"), ("time_to_pair", "time_to_pair"))]
+    rows.append({"metric": "pairs", "full_mean": len(pairs[0]), "link_mean": len(pairs[1]),
+                 "t_pvalue": math.nan, "ks_pvalue": math.nan})
+    rows.append({"metric": "events", "full_mean": full["events"].mean(), "link_mean": link["events"].mean(),
+                 "full_std": full["events"].std(ddof=1), "link_std": link["events"].std(ddof=1),
+                 "t_pvalue": math.nan, "ks_pvalue": math.nan})
+    return pd.DataFrame.from_records(rows).set_index("metric")
+
+
+if __name__ == '__main__':
+    # one memory per link: the pairs of both modes follow the same distributions
+    print(compare_modes({"sim_time": 1050, "memo_size": 10, "memory_size": 1, "fidelity": 0.6,
+                         "qc_dist": 10}, seeds=20).to_string())
+    # ten memories per link start together and blind the detectors to each other at photon level only
+    print(compare_modes({"sim_time": 1003, "memo_size": 20, "memory_size": 10, "fidelity": 0.6,
+                         "qc_dist": 10}, seeds=20).to_string())
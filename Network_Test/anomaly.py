@@ -0,0 +1,333 @@
+"""Online detection of fidelity drops while a run is simulated.
+
+``displayMemoryFidelity()`` shows the fidelities once the run is over, not
+when an attack started to degrade them. ``FidelityDetector`` watches the
+memory managers of the routers and, on every pair they report entangled,
+updates a few statistics of that router ("node") and of the router pair
+("link"; with swapping, a pair of distant routers too):
+
+* ``ewma``: exponentially weighted mean of the fidelity, alarm when it
+  falls below the lower control limit of an EWMA chart,
+* ``cusum``: one-sided (downward) CUSUM of the standardized fidelity,
+  alarm when it exceeds ``cusum_threshold``,
+* ``quantile``: exponentially weighted rate of fidelities under the
+  ``quantile`` of the baseline (estimated with the P² algorithm), alarm
+  when it exceeds ``tail_ratio`` times its rate in the baseline.
+
+The first ``warmup`` samples of each key are its baseline (mean, standard
+deviation, low quantile and how often the samples fall under it: pairs
+share a few fidelities, so that is often more than ``quantile``); alarms
+start after it. A statistic raises an alarm when it leaves its control
+region and again only once it has come back. Every update costs a
+constant number of operations whatever the length of the run, so the
+detector can ride along the runs of a sweep::
+
+    detector = FidelityDetector(tl, network.routers)
+    tl.run()
+    detector.report(attack_time=attack.time)  # {"alarms": ..., "detection_latency": ..., ...}
+
+``run_scenario(detector={...})`` does the same and adds the report to the
+metrics, with the time of the first attack.
+"""
+
+import math
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from hooks import Hooks, counts_pair
+
+DETECTORS = ("ewma", "cusum", "quantile")
+SCOPES = ("link", "node")
+
+
+class Ewma:
+    """Exponentially weighted moving average.
+
+    Attributes:
+        alpha (float): weight of the newest sample.
+        mean (float): current average, NaN before the first sample.
+    """
+
+    def __init__(self, alpha: float):
+        self.alpha = alpha
+        self.mean = math.nan
+
+    def update(self, value: float) -> float:
+        self.mean = value if math.isnan(self.mean) else self.mean + self.alpha * (value - self.mean)
+        return self.mean
+
+
+class Cusum:
+    """One-sided CUSUM of the downward deviations of standardized samples from a target.
+
+    Attributes:
+        target (float): in-control mean.
+        scale (float): in-control standard deviation.
+        slack (float): deviations (in ``scale``) tolerated per sample.
+        statistic (float): accumulated deviation, 0 while in control.
+    """
+
+    def __init__(self, target: float, scale: float, slack: float = 0.5):
+        self.target = target
+        self.scale = scale
+        self.slack = slack
+        self.statistic = 0.0
+
+    def update(self, value: float) -> float:
+        self.statistic = max(0.0, self.statistic + (self.target - value) / self.scale - self.slack)
+        return self.statistic
+
+
+class P2Quantile:
+    """Streaming estimate of one quantile with five markers (Jain and Chlamtac's P² algorithm).
+
+    Attributes:
+        q (float): quantile estimated.
+        n (int): samples seen.
+    """
+
+    def __init__(self, q: float):
+        self.q = q
+        self.n = 0
+        self._heights = []
+        self._positions = [1, 2, 3, 4, 5]
+        self._desired = [1, 1 + 2 * q, 1 + 4 * q, 3 + 2 * q, 5]
+        self._increments = [0, q / 2, q, (1 + q) / 2, 1]
+
+    @property
+    def value(self) -> float:
+        """Current estimate, exact up to five samples."""
+        if self.n > 5:
+            return self._heights[2]
+        if not self.n:
+            return math.nan
+        heights = sorted(self._heights)
+        return heights[min(int(self.q * self.n), self.n - 1)]
+
+    def update(self, value: float) -> None:
+        self.n += 1
+        heights, positions = self._heights, self._positions
+        if self.n <= 5:
+            heights.append(value)
+            if self.n == 5:
+                heights.sort()
+            return
+        if value < heights[0]:
+            heights[0] = value
+            cell = 0
+        elif value >= heights[4]:
+            heights[4] = max(heights[4], value)
+            cell = 3
+        else:
+            cell = next(i for i in range(4) if heights[i] <= value < heights[i + 1])
+        for i in range(cell + 1, 5):
+            positions[i] += 1
+        for i in range(5):
+            self._desired[i] += self._increments[i]
+        # move the three middle markers towards their desired positions, parabolically when it keeps them ordered
+        for i in range(1, 4):
+            shift = self._desired[i] - positions[i]
+            if (shift >= 1 and positions[i + 1] - positions[i] > 1) or \
+                    (shift <= -1 and positions[i - 1] - positions[i] < -1):
+                step = 1 if shift > 0 else -1
+                height = self._parabolic(i, step)
+                if not heights[i - 1] < height < heights[i + 1]:
+                    height = heights[i] + step * (heights[i + step] - heights[i]) / (positions[i + step] - positions[i])
+                heights[i] = height
+                positions[i] += step
+
+    def _parabolic(self, i: int, step: int) -> float:
+        heights, positions = self._heights, self._positions
+        return heights[i] + step / (positions[i + 1] - positions[i - 1]) * (
+            (positions[i] - positions[i - 1] + step) * (heights[i + 1] - heights[i]) / (positions[i + 1] - positions[i])
+            + (positions[i + 1] - positions[i] - step) * (heights[i] - heights[i - 1]) / (positions[i] - positions[i - 1]))
+
+
+class FidelityStats:
+    """Baseline and detectors of the fidelities of one link or node.
+
+    Attributes:
+        n (int): samples seen.
+        baseline (RunningStats): mean and variance of the first ``warmup`` samples.
+        low (P2Quantile): low quantile of the baseline.
+        ewma (Ewma): weighted mean of the fidelity.
+        tail (Ewma): weighted rate of fidelities under the baseline quantile.
+        rate (float): rate of fidelities under the quantile in the baseline.
+        cusum (Cusum): downward CUSUM, None during the warmup.
+        alarmed (Dict[str, bool]): detectors out of their control region.
+    """
+
+    def __init__(self, detector: "FidelityDetector"):
+        # campaign imports scenario, which imports this module
+        from campaign import RunningStats
+
+        self.detector = detector
+        self.n = 0
+        self.baseline = RunningStats()
+        self.low = P2Quantile(detector.quantile)
+        self.ewma = Ewma(detector.alpha)
+        self.tail = Ewma(detector.alpha)
+        self.cusum = None
+        self.limit = math.nan  # lower control limit of the EWMA
+        self.rate = detector.quantile
+        self._under = 0  # baseline samples under the estimate of the quantile so far
+        self.alarmed = dict.fromkeys(DETECTORS, False)
+
+    def update(self, fidelity: float) -> List[tuple]:
+        """Adds a sample; returns the (detector, statistic) pairs that went out of control with it."""
+        detector = self.detector
+        self.n += 1
+        ewma = self.ewma.update(fidelity)
+        if self.n <= detector.warmup:
+            self._under += fidelity < self.low.value
+            self.baseline.update(fidelity)
+            self.low.update(fidelity)
+            if self.n == detector.warmup:
+                self._end_warmup()
+            return []
+        cusum = self.cusum.update(fidelity)
+        tail = self.tail.update(float(fidelity < self.low.value))
+        statistics = {"ewma": (ewma, ewma < self.limit),
+                      "cusum": (cusum, cusum > detector.cusum_threshold),
+                      "quantile": (tail, tail > detector.tail_ratio * self.rate)}
+        alarms = []
+        for name, (value, out) in statistics.items():
+            if out and not self.alarmed[name]:
+                alarms.append((name, value))
+            self.alarmed[name] = out
+        return alarms
+
+    def _end_warmup(self) -> None:
+        detector = self.detector
+        mean = self.baseline.mean
+        sigma = max(math.sqrt(self.baseline.variance) if self.baseline.n > 1 else 0.0, detector.min_sigma)
+        alpha = detector.alpha
+        self.limit = mean - detector.ewma_width * sigma * math.sqrt(alpha / (2 - alpha))
+        self.cusum = Cusum(mean, sigma, detector.cusum_slack)
+        self.rate = max(detector.quantile, self._under / (self.n - 1))
+        self.tail.mean = self.rate  # start at its in-control value
+
+
+class FidelityDetector:
+    """Streaming fidelity statistics of the links and nodes of a run, and the alarms they raised.
+
+    Attributes:
+        timeline (Timeline): watched timeline.
+        stats (Dict[tuple, FidelityStats]): statistics by (scope, key); a link key is "a|b", a node key its name.
+        alarms (List[dict]): alarms in the order raised (time, scope, key, detector, statistic).
+        updates (int): entangled pairs seen.
+    """
+
+    def __init__(self, timeline: "Timeline", routers: List["QuantumRouter"] = (), alpha: float = 0.1,
+                 ewma_width: float = 3.0, cusum_slack: float = 0.5, cusum_threshold: float = 5.0,
+                 quantile: float = 0.1, tail_ratio: float = 3.0, warmup: int = 20, min_sigma: float = 0.005,
+                 scopes: tuple = SCOPES):
+        """
+        Args:
+            timeline (Timeline): timeline of the run, before ``tl.run()``.
+            routers (List[QuantumRouter]): routers whose memory managers are watched.
+            alpha (float): weight of the newest sample in the EWMA and the tail rate.
+            ewma_width (float): width of the EWMA control limit, in standard deviations of the EWMA.
+            cusum_slack (float): CUSUM allowance per sample, in baseline standard deviations.
+            cusum_threshold (float): CUSUM decision interval, in baseline standard deviations.
+            quantile (float): baseline quantile whose undershoots are counted.
+            tail_ratio (float): alarm when the rate of undershoots exceeds this times their baseline rate.
+            warmup (int): samples of each link or node taken as its baseline.
+            min_sigma (float): floor of the baseline standard deviation (pairs of one link often share a fidelity).
+            scopes (tuple): "link", "node" or both.
+        """
+        if not set(scopes) <= set(SCOPES):
+            raise ValueError(f"scopes must be among {SCOPES}")
+        self.timeline = timeline
+        self.alpha = alpha
+        self.ewma_width = ewma_width
+        self.cusum_slack = cusum_slack
+        self.cusum_threshold = cusum_threshold
+        self.quantile = quantile
+        self.tail_ratio = tail_ratio
+        self.warmup = max(int(warmup), 2)
+        self.min_sigma = min_sigma
+        self.scopes = tuple(scopes)
+        self.stats: Dict[tuple, FidelityStats] = {}
+        self.alarms: List[dict] = []
+        self.updates = 0
+        self._hooks = Hooks()
+        for router in routers:
+            self.watch_router(router)
+
+    def watch_router(self, router: "QuantumRouter") -> None:
+        """Feeds the pairs the memory manager of one router reports entangled to the detectors."""
+        memory_manager = router.resource_manager.memory_manager
+        update = memory_manager.update
+        name = router.name
+        links, nodes = "link" in self.scopes, "node" in self.scopes
+
+        def detected_update(memory: "Memory", state: str) -> None:
+            update(memory, state)
+            if state == "ENTANGLED":
+                self.updates += 1
+                fidelity = memory.fidelity
+                if nodes:
+                    self.sample("node", name, fidelity)
+                remote = memory.entangled_memory["node_id"]
+                if links and counts_pair(name, remote):
+                    self.sample("link", name + "|" + remote, fidelity)
+
+        self._hooks.install(memory_manager, "update", detected_update)
+
+    def sample(self, scope: str, key: str, fidelity: float) -> None:
+        """Adds the fidelity of one pair to the statistics of ``key`` and records the alarms it raises."""
+        stats = self.stats.get((scope, key))
+        if stats is None:
+            stats = self.stats[(scope, key)] = FidelityStats(self)
+        for detector, statistic in stats.update(fidelity):
+            self.alarms.append({"time": self.timeline.now(), "scope": scope, "key": key,
+                                "detector": detector, "statistic": statistic})
+
+    def close(self) -> None:
+        """Stops watching the routers."""
+        self._hooks.restore()
+
+    def table(self) -> pd.DataFrame:
+        """Current statistics of every link and node."""
+        rows = []
+        for (scope, key), stats in self.stats.items():
+            rows.append({"scope": scope, "key": key, "samples": stats.n, "baseline_mean": stats.baseline.mean,
+                         "baseline_quantile": stats.low.value, "ewma": stats.ewma.mean,
+                         "ewma_limit": stats.limit,
+                         "cusum": stats.cusum.statistic if stats.cusum is not None else math.nan,
+                         "tail_rate": stats.tail.mean,
+                         **{"alarm_" + name: alarmed for name, alarmed in stats.alarmed.items()}})
+        return pd.DataFrame.from_records(rows)
+
+    def report(self, attack_time: Optional[float] = None) -> dict:
+        """Alarm counts and, given when the attack started (ps), the detection latency (s) of each detector.
+
+        Alarms before ``attack_time``, or all of them without one, are false alarms.
+        """
+        if attack_time is None:
+            false_alarms = len(self.alarms)
+        else:
+            false_alarms = sum(alarm["time"] < attack_time for alarm in self.alarms)
+        report = {"alarms": len(self.alarms), "false_alarms": false_alarms,
+                  "first_alarm": self.alarms[0]["time"] if self.alarms else math.nan}
+        first = {}
+        if attack_time is not None:
+            for alarm in self.alarms:
+                if alarm["time"] >= attack_time:
+                    first.setdefault(alarm["detector"], alarm["time"])
+        for detector in DETECTORS:
+            report["detection_latency_" + detector] = (first[detector] - attack_time) / 1e12 if detector in first \
+                else math.nan
+        report["detection_latency"] = (min(first.values()) - attack_time) / 1e12 if first else math.nan
+        return report
+
+
+if __name__ == '__main__':
+    from scenario import run_scenario
+
+    # r1 generates its pairs at 0.7 instead of 0.85 (raw_fidelity) from 30 ms into the reservation on
+    print(run_scenario(sim_time=1500, memo_size=10, memory_size=5, fidelity=0.8, seed=2,
+                       attacks=[{"kind": "memory_poisoning", "time": 1.03e12, "router": "r1", "raw_fidelity": 0.7}],
+                       detector={}))
@@ -0,0 +1,287 @@
+"""Attacks applied to a built network at a given simulation time.
+
+radom_network_attack.py can only attack by building the whole network
+again with a lower swapping success rate. Here an attack is an object
+scheduled on the timeline of an existing network; when its time comes it
+changes the targeted hardware in place and, if asked to, moves the routing
+around it with ``Network.reroute`` (only the affected forwarding entries
+are rewritten). With a ``duration`` the attack is reverted afterwards.
+
+Attacks are described by plain dicts so they can be swept and cached::
+
+    {"kind": "channel_tampering", "time": 1.5e12, "edge": 0, "extra_attenuation": 1e-4}
+
+Only requests made after an attack see its effect on routing, as in
+SeQUeNCe the path of a reservation is fixed when it is approved. A node
+compromise also rewrites the swapping rules the router already holds for
+approved reservations, loaded or still waiting for their start time.
+"""
+
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+# Importing sequence structures
+from sequence.kernel.event import Event
+from sequence.kernel.process import Process
+from sequence.network_management.reservation import es_rule_actionA
+
+
+class Attack(ABC):
+    """Base class: something done to the network at ``time`` and undone after ``duration``.
+
+    Attributes:
+        name (str): label of the attack in logs, traces and profiles.
+        time (int): simulation time (ps) of the attack.
+        duration (int): time (ps) after which the attack is reverted (default: never).
+        reroute (bool): move the routing around the damage.
+        applied (bool): whether the attack is currently in effect.
+    """
+
+    kind = "attack"
+
+    def __init__(self, time: float, duration: Optional[float] = None, reroute: bool = False):
+        self.time = int(time)
+        self.duration = None if duration is None else int(duration)
+        self.reroute = reroute
+        self.applied = False
+        self.name = f"{self.kind}@{self.time}"
+        self._rerouted = None  # edges whose weight the attack changed, and their weight before
+
+    def schedule(self, network: "Network") -> None:
+        network.tl.schedule(Event(self.time, Process(self, "start", [network])))
+
+    def start(self, network: "Network") -> None:
+        self.apply(network)
+        if self.reroute:
+            weights = self.weights(network)
+            edges = np.flatnonzero(weights != network.weights)
+            self._rerouted = (edges, network.weights[edges])
+            network.reroute(weights)
+        self.applied = True
+        if self.duration is not None:
+            network.tl.schedule(Event(self.time + self.duration, Process(self, "stop", [network])))
+
+    def stop(self, network: "Network") -> None:
+        self.revert(network)
+        if self._rerouted is not None:
+            # only restore our own edges, other attacks may still be rerouting around theirs
+            edges, previous = self._rerouted
+            weights = network.weights.copy()
+            weights[edges] = previous
+            network.reroute(weights)
+            self._rerouted = None
+        self.applied = False
+
+    @abstractmethod
+    def apply(self, network: "Network") -> None:
+        """Changes the targeted hardware."""
+
+    @abstractmethod
+    def revert(self, network: "Network") -> None:
+        """Puts back what ``apply`` changed."""
+
+    def weights(self, network: "Network") -> np.ndarray:
+        """Edge weights the routing should use while the attack lasts."""
+        return network.weights
+
+
+class NodeCompromise(Attack):
+    """A router under the attacker's control fails every swap it performs.
+
+    With ``reroute`` the network detects it and stops routing through it.
+    """
+
+    kind = "node_compromise"
+
+    def __init__(self, time: float, router: str, swapping_success_rate: float = 0.0, **kwargs):
+        super().__init__(time, **kwargs)
+        self.router = router
+        self.swapping_success_rate = swapping_success_rate
+        self._previous = None
+
+    def apply(self, network: "Network") -> None:
+        self._previous = network.get_router(self.router).network_manager.protocol_stack[1].es_succ_prob
+        self._set_swapping_success_rate(network, self.swapping_success_rate)
+
+    def revert(self, network: "Network") -> None:
+        self._set_swapping_success_rate(network, self._previous)
+
+    def _set_swapping_success_rate(self, network: "Network", rate: float) -> None:
+        router = network.get_router(self.router)
+        router.network_manager.protocol_stack[1].set_swapping_success_rate(rate)
+        # RSVP copies the rate into the arguments of the swapping rules when it approves a reservation
+        resource_manager = router.resource_manager
+        rules = list(resource_manager.rule_manager.rules)
+        rules += [event.process.activation_args[0] for event in network.tl.events
+                  if event.process.owner is resource_manager and event.process.activation == "load"
+                  and not event.is_invalid()]
+        for rule in rules:
+            if rule.action is es_rule_actionA:
+                rule.action_args["es_succ_prob"] = rate
+                for protocol in rule.protocols:
+                    protocol.success_prob = rate
+
+    def weights(self, network: "Network") -> np.ndarray:
+        index = network.router_index(self.router)
+        weights = network.weights.copy()
+        weights[(network.edges == index).any(axis=1)] = np.inf
+        return weights
+
+
+class DetectorDegradation(Attack):
+    """Lowers the efficiency of the detectors of one BSM node, and optionally sets their dark count rate (1/s)."""
+
+    kind = "detector_degradation"
+
+    def __init__(self, time: float, bsm_node: str, efficiency: float, dark_count: Optional[float] = None, **kwargs):
+        super().__init__(time, **kwargs)
+        self.bsm_node = bsm_node
+        self.efficiency = efficiency
+        self.dark_count = dark_count
+        self._previous = []
+
+    def _bsm(self, network: "Network"):
+        node = next(node for node in network.bsm_nodes if node.name == self.bsm_node)
+        return node.get_components_by_type("SingleAtomBSM")[0]
+
+    def apply(self, network: "Network") -> None:
+        detectors = self._bsm(network).detectors
+        self._previous = [(detector.efficiency, detector.dark_count) for detector in detectors]
+        for detector in detectors:
+            detector.efficiency = self.efficiency
+            if self.dark_count is not None:
+                self._set_dark_count(network.tl, detector, self.dark_count)
+
+    def revert(self, network: "Network") -> None:
+        for detector, (efficiency, dark_count) in zip(self._bsm(network).detectors, self._previous):
+            detector.efficiency = efficiency
+            if self.dark_count is not None:
+                self._set_dark_count(network.tl, detector, dark_count)
+
+    @staticmethod
+    def _set_dark_count(timeline: "Timeline", detector: "Detector", dark_count: float) -> None:
+        # Detector.init() starts the chain of dark counts with the rate it has then; restart it with the new one
+        for event in list(timeline.events):
+            if event.process.owner is detector and event.process.activation in ("add_dark_count", "record_detection") \
+                    and not event.is_invalid():
+                timeline.remove_event(event)
+        detector.dark_count = dark_count
+        if dark_count > 0:
+            detector.add_dark_count()
+
+    def weights(self, network: "Network") -> np.ndarray:
+        # a generation attempt needs a detection in each of its two rounds
+        edge = [node.name for node in network.bsm_nodes].index(self.bsm_node)
+        ratio = np.mean([previous for previous, _ in self._previous]) / max(self.efficiency, 1e-12)
+        weights = network.weights.copy()
+        weights[edge] *= ratio ** 2
+        return weights
+
+
+class ChannelTampering(Attack):
+    """Adds attenuation (dB/m) to both quantum channels of one edge."""
+
+    kind = "channel_tampering"
+
+    def __init__(self, time: float, edge: int, extra_attenuation: float, **kwargs):
+        super().__init__(time, **kwargs)
+        self.edge = edge
+        self.extra_attenuation = extra_attenuation
+        self._previous = []
+
+    def apply(self, network: "Network") -> None:
+        channels = network.edge_channels(self.edge)
+        self._previous = [qc.attenuation for qc in channels]
+        for qc in channels:
+            self._set_attenuation(qc, qc.attenuation + self.extra_attenuation)
+
+    def revert(self, network: "Network") -> None:
+        for qc, attenuation in zip(network.edge_channels(self.edge), self._previous):
+            self._set_attenuation(qc, attenuation)
+
+    @staticmethod
+    def _set_attenuation(qc: "QuantumChannel", attenuation: float) -> None:
+        qc.attenuation = attenuation
+        # QuantumChannel.init() computes the loss once, redo it
+        qc.loss = 1 - 10 ** (qc.distance * qc.attenuation / -10)
+
+    def weights(self, network: "Network") -> np.ndarray:
+        # cost of a link ~ 1 / success probability of an attempt, one photon through each channel
+        distance = network.edge_channels(self.edge)[0].distance
+        weights = network.weights.copy()
+        weights[self.edge] *= 10 ** (2 * self.extra_attenuation * distance / 10)
+        return weights
+
+
+class ClassicalDelayInjection(Attack):
+    """Adds delay (ps) to the classical channels between two nodes, both ways by default."""
+
+    kind = "classical_delay"
+
+    def __init__(self, time: float, src: str, dst: str, extra_delay: float, both_ways: bool = True, **kwargs):
+        super().__init__(time, **kwargs)
+        self.src = src
+        self.dst = dst
+        self.extra_delay = int(extra_delay)
+        self.both_ways = both_ways
+
+    def _channels(self, network: "Network") -> list:
+        nodes = {node.name: node for node in network.nodes}
+        pairs = [(self.src, self.dst)] + ([(self.dst, self.src)] if self.both_ways else [])
+        return [nodes[src].cchannels[dst] for src, dst in pairs]
+
+    def apply(self, network: "Network") -> None:
+        for cc in self._channels(network):
+            cc.delay += self.extra_delay
+
+    def revert(self, network: "Network") -> None:
+        for cc in self._channels(network):
+            cc.delay -= self.extra_delay
+
+
+class MemoryPoisoning(Attack):
+    """Lowers the fidelity of the pairs the memories of one router generate from now on."""
+
+    kind = "memory_poisoning"
+
+    def __init__(self, time: float, router: str, raw_fidelity: float, indices: Optional[Sequence[int]] = None,
+                 **kwargs):
+        super().__init__(time, **kwargs)
+        self.router = router
+        self.raw_fidelity = raw_fidelity
+        self.indices = indices
+        self._previous = []
+
+    def _memories(self, network: "Network") -> list:
+        memories = network.get_router(self.router).get_components_by_type("MemoryArray")[0].memories
+        return memories if self.indices is None else [memories[i] for i in self.indices]
+
+    def apply(self, network: "Network") -> None:
+        memories = self._memories(network)
+        self._previous = [memory.raw_fidelity for memory in memories]
+        for memory in memories:
+            memory.raw_fidelity = self.raw_fidelity
+
+    def revert(self, network: "Network") -> None:
+        for memory, raw_fidelity in zip(self._memories(network), self._previous):
+            memory.raw_fidelity = raw_fidelity
+
+
+ATTACKS = {cls.kind: cls for cls in (NodeCompromise, DetectorDegradation, ChannelTampering,
+                                     ClassicalDelayInjection, MemoryPoisoning)}
+
+def make_attack(spec: Dict) -> Attack:
+    """Attack described by ``{"kind": ..., "time": ..., <arguments>}``."""
+    spec = dict(spec)
+    kind = spec.pop("kind")
+    if kind not in ATTACKS:
+        raise ValueError(f"unknown attack '{kind}', expected one of {sorted(ATTACKS)}")
+    return ATTACKS[kind](**spec)
+
+def schedule_attacks(network: "Network", specs: List[Dict]) -> List[Attack]:
+    attacks = [make_attack(spec) for spec in specs]
+    for attack in attacks:
+        attack.schedule(network)
+    return attacks
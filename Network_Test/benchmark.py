@@ -0,0 +1,173 @@
+"""Wall-time benchmarks of the simulation scenarios.
+
+Every case runs in a fresh interpreter (so peak RSS belongs to that case
+alone) and records the wall time of ``tl.run()``, the events executed,
+events per second and peak RSS. Results are saved as JSON baselines that
+carry ``BENCH_FORMAT`` and the SeQUeNCe / Python versions they were measured
+with; ``compare`` reports the cases that got slower, or heavier, than a
+baseline by more than a threshold.
+
+    python benchmark.py --save baselines/local.json
+    python benchmark.py --baseline baselines/local.json --threshold 0.2
+"""
+
+import argparse
+import json
+import platform
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Callable, List, Optional
+
+import numpy as np
+
+from result_cache import sequence_version
+from scenario import run_attack_scenario, run_random_request_scenario, run_scenario
+
+# bump when the cases or the way they are measured change
+BENCH_FORMAT = 1
+
+
+class BenchCase:
+    """One scenario at one size.
+
+    Attributes:
+        name (str): unique name, the key of the case in baselines.
+        func (Callable): picklable scenario returning ``events`` and ``run_time``.
+        params (dict): keyword arguments of ``func``.
+    """
+
+    def __init__(self, name: str, func: Callable[..., dict], params: dict):
+        self.name = name
+        self.func = func
+        self.params = params
+
+
+def default_cases(quick: bool = False) -> List[BenchCase]:
+    """saquare_network.py, random_square_network.py, radom_network_attack.py and the
+    star RandomRequestApp notebook, at increasing router and memory counts."""
+    sizes = [(4, 20), (8, 20)] if quick else [(4, 50), (8, 50), (8, 100), (16, 100)]
+    sim_time = 1100 if quick else 1500
+    ring = {"sim_time": sim_time, "cc_delay": 0.1, "qc_atten": 3e-5, "qc_dist": 1, "seed": 0}
+    cases = []
+    for routers, memories in sizes:
+        size = f"{routers}x{memories}"
+        # the scripts request half the memories of a router
+        network = {**ring, "num_routers": routers, "memo_size": memories, "memory_size": memories // 2}
+        cases.append(BenchCase(f"square_{size}", run_scenario, {**network, "dst": routers // 2}))
+        cases.append(BenchCase(f"random_ring_{size}", run_attack_scenario,
+                               {**network, "swapping_success_rate": None}))
+        cases.append(BenchCase(f"attack_{size}", run_attack_scenario,
+                               {**network, "swapping_success_rate": 0.05}))
+    # the applications only start requesting after 1-2 s
+    star_time = 2100 if quick else 2500
+    cases.append(BenchCase("star_json", run_random_request_scenario, {"sim_time": star_time}))
+    for routers, memories in sizes[1:]:
+        cases.append(BenchCase(f"star_{routers}x{memories}", run_random_request_scenario,
+                               {"sim_time": star_time, "config": None, "num_routers": routers,
+                                "memo_size": memories, "seed": 0}))
+    return cases
+
+def measure(case: BenchCase) -> dict:
+    """Runs one case in the current process."""
+    tick = time.time()
+    results = case.func(**case.params)
+    wall_time = time.time() - tick
+    # ru_maxrss is in KiB on Linux
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return {"wall_time": wall_time, "run_time": results["run_time"], "events": results["events"],
+            "events_per_sec": results["events"] / results["run_time"] if results["run_time"] else float("nan"),
+            "peak_rss_mb": peak_rss}
+
+def run_case(case: BenchCase, repeat: int = 3) -> dict:
+    """Median of ``repeat`` measurements, each in a fresh interpreter."""
+    samples = []
+    for _ in range(repeat):
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+            samples.append(executor.submit(measure, case).result())
+    result = {name: float(np.median([sample[name] for sample in samples])) for name in samples[0]}
+    result["events"] = samples[0]["events"]
+    if any(sample["events"] != result["events"] for sample in samples):
+        result["events_varied"] = True  # seeded cases should always execute the same events
+    return result
+
+def run_benchmarks(cases: List[BenchCase], repeat: int = 3, verbose: bool = True) -> dict:
+    results = {}
+    for case in cases:
+        results[case.name] = run_case(case, repeat)
+        if verbose:
+            row = results[case.name]
+            print("%-20s %8.2f s %10d events %10.0f events/s %8.1f MB" %
+                  (case.name, row["run_time"], row["events"], row["events_per_sec"], row["peak_rss_mb"]))
+    return {"format": BENCH_FORMAT, "sequence": sequence_version(), "python": platform.python_version(),
+            "machine": platform.machine(), "processor": platform.processor(),
+            "date": time.strftime("%Y-%m-%d %H:%M:%S"), "repeat": repeat, "cases": results}
+
+def save_baseline(results: dict, path: str) -> None:
+    with open(path, "w") as fh:
+        json.dump(results, fh, indent=2)
+
+def load_baseline(path: str) -> dict:
+    with open(path) as fh:
+        baseline = json.load(fh)
+    if baseline.get("format") != BENCH_FORMAT:
+        raise ValueError("baseline %s has format %s, expected %s" % (path, baseline.get("format"), BENCH_FORMAT))
+    return baseline
+
+def compare(results: dict, baseline: dict, threshold: float = 0.2) -> List[str]:
+    """Regressions of ``results`` against ``baseline``, one message each.
+
+    A case regresses when its tl.run() time or peak RSS grows, or its events
+    per second drop, by more than ``threshold`` (a fraction). A different
+    event count is reported too: the scenario no longer simulates the same
+    thing and its timings are not comparable.
+    """
+    problems = []
+    for name, row in results["cases"].items():
+        base = baseline["cases"].get(name)
+        if base is None:
+            continue
+        if row["events"] != base["events"]:
+            problems.append("%s: %d events, baseline %d" % (name, row["events"], base["events"]))
+            continue
+        for metric in ("run_time", "peak_rss_mb"):
+            if row[metric] > base[metric] * (1 + threshold):
+                problems.append("%s: %s %.3g -> %.3g (+%.0f%%)" % (
+                    name, metric, base[metric], row[metric], 100 * (row[metric] / base[metric] - 1)))
+        if row["events_per_sec"] < base["events_per_sec"] * (1 - threshold):
+            problems.append("%s: events_per_sec %.0f -> %.0f (%.0f%%)" % (
+                name, base["events_per_sec"], row["events_per_sec"],
+                100 * (row["events_per_sec"] / base["events_per_sec"] - 1)))
+    return problems
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the simulation scenarios.")
+    parser.add_argument("--quick", action="store_true", help="small sizes only")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per case (median is kept)")
+    parser.add_argument("--cases", nargs="*", help="names of the cases to run (default: all)")
+    parser.add_argument("--save", help="write the results as a baseline to this file")
+    parser.add_argument("--baseline", help="compare against this baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown (fraction)")
+    args = parser.parse_args(argv)
+
+    cases = default_cases(args.quick)
+    if args.cases:
+        cases = [case for case in cases if case.name in args.cases]
+    results = run_benchmarks(cases, args.repeat)
+    if args.save:
+        save_baseline(results, args.save)
+    if args.baseline:
+        baseline = load_baseline(args.baseline)
+        if baseline["sequence"] != results["sequence"]:
+            print("note: baseline measured with SeQUeNCe %s, now %s" % (baseline["sequence"], results["sequence"]))
+        problems = compare(results, baseline, args.threshold)
+        for problem in problems:
+            print("REGRESSION", problem)
+        return 1 if problems else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
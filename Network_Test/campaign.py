@@ -0,0 +1,181 @@
+"""Monte-Carlo attack campaigns with confidence-interval early stopping.
+
+A single ``choiceNode()`` draw says nothing statistically. ``run_campaign``
+keeps replicating the attack scenario (new seed, new attacked triple) on a
+process pool and maintains running mean / variance / confidence intervals
+of the chosen metrics. It stops as soon as every interval is narrower than
+the requested width, when ``max_replicas`` is reached, or after
+``min_replicas`` when a metric still has no finite sample (a fidelity that
+is always NaN, a point that always errors): more replicas would not give
+it an interval. Replicas that raise are counted as errors, not as missing
+values of the metrics.
+
+Replicas are folded into the statistics in submission order, so for a
+given root seed the campaign stops after the same replicas and reports the
+same estimates regardless of how the pool schedules them.
+"""
+
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from scenario import run_attack_scenario
+from sweep import run_point
+
+METRICS = ("entangled_pairs", "mean_fidelity", "latency")
+
+
+class RunningStats:
+    """Welford mean / variance of one metric; NaN samples are counted but skipped.
+
+    Attributes:
+        n (int): number of finite samples.
+        missing (int): number of NaN samples (e.g. fidelity of a run without pairs).
+        mean (float): running mean.
+    """
+
+    def __init__(self):
+        self.n = 0
+        self.missing = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def update(self, value: float) -> None:
+        if value is None or not np.isfinite(value):
+            self.missing += 1
+            return
+        self.n += 1
+        delta = value - self.mean
+        self.mean += delta / self.n
+        self._m2 += delta * (value - self.mean)
+
+    @property
+    def variance(self) -> float:
+        return self._m2 / (self.n - 1) if self.n > 1 else float("nan")
+
+    def ci_halfwidth(self, confidence: float = 0.95) -> float:
+        """Half width of the Student-t confidence interval of the mean."""
+        if self.n < 2:
+            return float("inf")
+        return stats.t.ppf(0.5 + confidence / 2, self.n - 1) * np.sqrt(self.variance / self.n)
+
+
+class CampaignResult:
+    """Outcome of ``run_campaign``.
+
+    Attributes:
+        replicas (pd.DataFrame): one row per replica folded into the estimates.
+        summary (pd.DataFrame): n, mean, variance and confidence interval per metric.
+        converged (bool): whether every interval reached its target width.
+        errors (int): replicas that raised instead of returning metrics.
+        unestimable (List[str]): metrics without a finite sample, which stopped the campaign early.
+    """
+
+    def __init__(self, replicas: pd.DataFrame, summary: pd.DataFrame, converged: bool, errors: int = 0,
+                 unestimable: Optional[List[str]] = None):
+        self.replicas = replicas
+        self.summary = summary
+        self.converged = converged
+        self.errors = errors
+        self.unestimable = unestimable or []
+
+
+def _summary(running: Dict[str, RunningStats], confidence: float, errors: int) -> pd.DataFrame:
+    rows = []
+    for name, stat in running.items():
+        half = stat.ci_halfwidth(confidence)
+        mean = stat.mean if stat.n else float("nan")
+        rows.append({"metric": name, "n": stat.n, "missing": stat.missing, "errors": errors, "mean": mean,
+                     "variance": stat.variance, "ci_low": mean - half, "ci_high": mean + half,
+                     "ci_width": 2 * half})
+    return pd.DataFrame.from_records(rows).set_index("metric")
+
+def run_campaign(target_width: Union[float, Dict[str, float]], func: Callable[..., dict] = run_attack_scenario,
+                 params: Optional[dict] = None, metrics: Sequence[str] = METRICS, relative: bool = False,
+                 confidence: float = 0.95, min_replicas: int = 10, max_replicas: int = 1000,
+                 processes: Optional[int] = None, seed: Optional[int] = 0) -> CampaignResult:
+    """Replicates ``func`` until the confidence intervals of ``metrics`` are narrow enough.
+
+    Args:
+        target_width (float | Dict[str, float]): full CI width to reach, for all or per metric.
+        func (Callable): picklable scenario taking a ``seed`` keyword and returning metrics.
+        params (dict): keyword arguments of every replica.
+        metrics (Sequence[str]): metrics to estimate.
+        relative (bool): interpret ``target_width`` as a fraction of |mean|.
+        confidence (float): confidence level of the intervals.
+        min_replicas (int): replicas to run before the stopping rules are checked.
+        max_replicas (int): hard limit on replicas.
+        processes (int): pool size (default: all cores).
+        seed (int): root seed, each replica gets a spawned child.
+
+    Returns:
+        CampaignResult: per-replica rows and the final estimates.
+    """
+    params = params or {}
+    if not isinstance(target_width, dict):
+        target_width = {name: target_width for name in metrics}
+    running = {name: RunningStats() for name in metrics}
+    root = np.random.SeedSequence(seed)
+    processes = processes or os.cpu_count()
+
+    def narrow_enough() -> bool:
+        for name, stat in running.items():
+            width = 2 * stat.ci_halfwidth(confidence)
+            limit = target_width[name] * (abs(stat.mean) if relative else 1)
+            if not width <= limit:
+                return False
+        return True
+
+    rows, done, pending = [], {}, {}
+    submitted = errors = 0
+    converged = False
+    unestimable = []
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        def submit() -> None:
+            nonlocal submitted
+            replica_seed = int(root.spawn(1)[0].generate_state(1)[0])
+            task = (func, {**params, "seed": replica_seed})
+            pending[executor.submit(run_point, task)] = (submitted, replica_seed)
+            submitted += 1
+
+        while submitted < min(processes, max_replicas):
+            submit()
+        while pending:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                index, replica_seed = pending.pop(future)
+                done[index] = {"replica": index, "seed": replica_seed, **future.result()}
+            # fold results in submission order
+            while len(rows) in done:
+                row = done.pop(len(rows))
+                rows.append(row)
+                if "error" in row:
+                    errors += 1
+                else:
+                    for name, stat in running.items():
+                        stat.update(row.get(name, float("nan")))
+                if len(rows) >= min_replicas:
+                    unestimable = [name for name, stat in running.items() if stat.n == 0]
+                    converged = not unestimable and narrow_enough()
+                    if converged or unestimable:
+                        break
+            if converged or unestimable:
+                for future in pending:
+                    future.cancel()
+                break
+            while submitted < max_replicas and len(pending) < processes:
+                submit()
+
+    return CampaignResult(pd.DataFrame.from_records(rows), _summary(running, confidence, errors), converged, errors,
+                          unestimable)
+
+
+if __name__ == '__main__':
+    result = run_campaign({"entangled_pairs": 5, "mean_fidelity": 0.01, "latency": 0.05},
+                          params={"sim_time": 3000, "cc_delay": 0.1, "qc_atten": 3e-5, "qc_dist": 1,
+                                  "swapping_success_rate": 0.05})
+    print(result.summary)
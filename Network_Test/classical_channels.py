@@ -0,0 +1,112 @@
+"""Classical connectivity modes for networks made by ``build_network``.
+
+* ``"full"``: one ClassicalChannel per ordered pair of nodes, created up
+  front. This is what the simulation scripts always did; it costs
+  N * (N - 1) channels before ``tl.run()`` starts.
+* ``"lazy"``: a node's channel to a destination is created the first time
+  the node sends to it (or a protocol looks up its delay), with the same
+  constant delay as "full". Results match "full"; the channel count follows
+  the traffic.
+* ``"relay"``: channels are created lazily as in "lazy", but messages pay
+  one ``cc_delay`` per hop of the shortest classical route along the
+  topology edges (router-router along every link, router-BSM inside every
+  link), as if intermediate nodes relayed them. Neighbours keep the
+  single-hop delay, so elementary link generation is timed as in "full".
+"""
+
+from typing import Callable, Dict, List
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import shortest_path
+
+from sequence.components.optical_channel import ClassicalChannel
+
+CC_MODES = ("full", "lazy", "relay")
+
+
+class LazyChannelTable(dict):
+    """Replacement for ``Node.cchannels`` that creates channels on demand.
+
+    ``Node.send_message`` and the generation protocols only ever index
+    ``cchannels[dst]``, so a missing key is the first use of that channel.
+
+    Attributes:
+        owner (Node): node sending through the channels.
+        delay_fn (Callable[[str, str], float]): delay (ps) from owner to a destination.
+        created (List[ClassicalChannel]): shared list every new channel is appended to.
+    """
+
+    def __init__(self, owner: "Node", delay_fn: Callable[[str, str], float], created: List[ClassicalChannel]):
+        super().__init__(owner.cchannels)
+        self.owner = owner
+        self.delay_fn = delay_fn
+        self.created = created
+
+    def __missing__(self, dst: str) -> ClassicalChannel:
+        cc = ClassicalChannel("cc_%s_%s" % (self.owner.name, dst), self.owner.timeline, 1e3,
+                              delay=self.delay_fn(self.owner.name, dst))
+        cc.set_ends(self.owner, dst)  # stores the channel under self[dst]
+        self.created.append(cc)
+        return cc
+
+
+class RelayDelay:
+    """Hop-count delays over the classical graph of a network.
+
+    Shortest hop counts are computed one source at a time, the first time
+    that source opens a channel, and kept for its later destinations.
+    """
+
+    def __init__(self, network: "Network", cc_delay: float):
+        self.cc_delay = cc_delay
+        nodes = network.nodes
+        self.index = {node.name: i for i, node in enumerate(nodes)}
+        num_routers = len(network.routers)
+        edges = np.asarray(network.edges, dtype=np.int64).reshape(-1, 2)
+        bsm = num_routers + np.arange(len(edges))
+        src = np.concatenate([edges[:, 0], edges[:, 0], edges[:, 1]])
+        dst = np.concatenate([edges[:, 1], bsm, bsm])
+        self.graph = csr_matrix((np.ones(len(src)), (src, dst)), shape=(len(nodes), len(nodes)))
+        self.hops: Dict[int, np.ndarray] = {}
+
+    def __call__(self, src: str, dst: str) -> float:
+        i = self.index[src]
+        if i not in self.hops:
+            self.hops[i] = shortest_path(self.graph, directed=False, unweighted=True, indices=i)
+        hops = self.hops[i][self.index[dst]]
+        if not np.isfinite(hops):
+            raise ValueError(f"no classical route from {src} to {dst}")
+        return hops * self.cc_delay
+
+
+def connect_classical(network: "Network", cc_delay: float, mode: str = "full") -> None:
+    """Creates (or arranges to create) the classical channels of a network.
+
+    Args:
+        network (Network): network returned by ``build_network``.
+        cc_delay (float): delay of one classical hop (ps).
+        mode (str): one of CC_MODES.
+
+    Side Effects:
+        Channels created now or later are appended to ``network.cchannels``.
+    """
+    nodes = network.nodes
+    if mode == "full":
+        for node1 in nodes:
+            for node2 in nodes:
+                if node1 == node2:
+                    continue
+                # Args: name, timeline, length (in m), delay (in ps)
+                cc = ClassicalChannel("cc_%s_%s" % (node1.name, node2.name), network.tl, 1e3, delay=cc_delay)
+                cc.set_ends(node1, node2.name)
+                network.cchannels.append(cc)
+    elif mode == "lazy":
+        for node in nodes:
+            node.cchannels = LazyChannelTable(node, lambda src, dst: cc_delay, network.cchannels)
+    elif mode == "relay":
+        delay_fn = RelayDelay(network, cc_delay)
+        for node in nodes:
+            node.cchannels = LazyChannelTable(node, delay_fn, network.cchannels)
+    else:
+        raise ValueError(f"unknown classical channel mode '{mode}', expected one of {CC_MODES}")
@@ -0,0 +1,303 @@
+"""Command line entry point of the scenarios.
+
+    python cli.py run --sim-time 2000 --qc-dist 1 --plot run.png
+    python cli.py attack --swapping-success-rate 0.05 --campaign 0.1 --relative
+    python cli.py sweep --fixed '{"memo_size": [50, 100, 50, 100]}' --out square_sweep.csv
+    python cli.py threshold swapping_success_rate 0.01 1 --log --rtol 0.05
+    python cli.py render memories/ --out figures/ --format svg
+    python cli.py replay requests.npy --window 1e12 --num-routers 8
+    python cli.py bench --quick --baseline baselines/local.json
+
+Everything runs headless: results are printed as JSON (tables as CSV),
+figures are written to files. The simulation modules are imported by the
+subcommand that needs them, so ``--help`` answers immediately.
+"""
+
+import os
+
+# headless unless the user picked a backend; must be set before matplotlib is imported
+os.environ.setdefault("MPLBACKEND", "Agg")
+
+import argparse
+import json
+import math
+import sys
+import tempfile
+from typing import List, Optional
+
+def abstraction_arg(value: str):
+    return value if value == "all" else json.loads(value)
+
+def add_scenario_arguments(parser: argparse.ArgumentParser) -> None:
+    """Options of scenario.run_scenario; the ones not given keep the function's default."""
+    group = parser.add_argument_group("scenario")
+    default = argparse.SUPPRESS
+    group.add_argument("--sim-time", type=float, default=default, help="simulation time (ms)")
+    group.add_argument("--cc-delay", type=float, default=default, help="classical channel delay (ms)")
+    group.add_argument("--qc-atten", type=float, default=default, help="quantum channel attenuation (dB/m)")
+    group.add_argument("--qc-dist", type=float, default=default, help="quantum channel distance (km)")
+    group.add_argument("--topology", default=default, help="ring, line, star, grid, waxman, erdos_renyi")
+    group.add_argument("--num-routers", type=int, default=default)
+    group.add_argument("--memo-size", type=int, default=default, help="memories per router")
+    group.add_argument("--cc-mode", default=default, help="full, lazy or relay classical channels")
+    group.add_argument("--memory-size", type=int, default=default, help="memories requested")
+    group.add_argument("--fidelity", type=float, default=default, help="requested fidelity")
+    group.add_argument("--seed", type=int, default=default)
+    group.add_argument("--attacks", type=json.loads, default=default,
+                       help='JSON list of attacks, e.g. [{"kind": "node_compromise", "time": 1, "router": "r1"}]')
+    group.add_argument("--termination", type=json.loads, default=default,
+                       help='JSON stop conditions, e.g. {"resolved": true, "wall_clock": 60}')
+    group.add_argument("--detector", type=json.loads, default=default,
+                       help='JSON fidelity anomaly detector arguments, e.g. {"warmup": 20} ({} for the defaults)')
+    group.add_argument("--abstraction", type=abstraction_arg, default=default,
+                       help='generate the pairs of these links at link level: "all" or a JSON list of edge indices')
+    group.add_argument("--memories-dir", default=default, help="save the final memory table here (Parquet)")
+    group.add_argument("--trace-dir", default=default, help="record an event trace here")
+
+def scenario_params(args: argparse.Namespace, exclude: tuple = ()) -> dict:
+    params = dict(vars(args))
+    for name in ("command", "plot", "profile") + exclude:
+        params.pop(name, None)
+    return params
+
+def json_safe(value):
+    """``value`` with NaN and infinities as None, so the output is valid JSON."""
+    if isinstance(value, dict):
+        return {key: json_safe(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [json_safe(item) for item in value]
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+def print_json(results: dict) -> None:
+    print(json.dumps(json_safe(results), indent=2, default=str, allow_nan=False))
+
+def run_with_options(func, params: dict, args: argparse.Namespace) -> dict:
+    """``func(**params)``, profiled and / or plotted as asked on the command line."""
+    if args.plot and "memories_dir" not in params:
+        params["memories_dir"] = tempfile.mkdtemp()
+    if args.profile:
+        from profiler import ProtocolProfiler
+        with ProtocolProfiler() as profiler:
+            results = func(**params)
+        profiler.write_collapsed(args.profile)
+        print(profiler.by_protocol().to_string(), file=sys.stderr)
+    else:
+        results = func(**params)
+    if args.plot:
+        from figures import plot_memories
+        from metrics import load_runs
+        table = load_runs(os.path.join(params["memories_dir"], results["run_id"] + ".parquet"))
+        plot_memories(table, args.plot)
+    return results
+
+def cmd_run(args: argparse.Namespace) -> int:
+    from scenario import run_scenario
+    params = scenario_params(args)
+    print_json(run_with_options(run_scenario, params, args))
+    return 0
+
+def cmd_attack(args: argparse.Namespace) -> int:
+    from scenario import run_attack_scenario
+    params = scenario_params(args, ("campaign", "relative", "max_replicas", "processes"))
+    if args.campaign is None:
+        print_json(run_with_options(run_attack_scenario, params, args))
+        return 0
+    if args.plot or args.profile:
+        # the replicas run in worker processes, there is no single run to draw or profile
+        raise SystemExit("attack: --plot and --profile do not apply to --campaign")
+    from campaign import run_campaign
+    seed = params.pop("seed", 0)
+    for name in ("memories_dir", "trace_dir"):
+        params.pop(name, None)
+    result = run_campaign(args.campaign, params=params, relative=args.relative,
+                          max_replicas=args.max_replicas, processes=args.processes, seed=seed)
+    print(result.summary.to_csv())
+    if result.errors:
+        print("%d of %d replicas failed" % (result.errors, len(result.replicas)), file=sys.stderr)
+    if result.unestimable:
+        print("no finite sample of %s, stopped after %d replicas" % (", ".join(result.unestimable),
+                                                                   len(result.replicas)), file=sys.stderr)
+    return 0 if result.converged else 1
+
+def cmd_sweep(args: argparse.Namespace) -> int:
+    from result_cache import ResultCache
+    from sweep import SQUARE_GRID, expand_grid, run_sweep
+    if args.points:
+        with open(args.points) as fh:
+            points = json.load(fh)
+    else:
+        points = expand_grid(json.loads(args.grid) if args.grid else SQUARE_GRID)
+    fixed = json.loads(args.fixed) if args.fixed else None
+    if args.screen:
+        import pandas as pd
+        from surrogate import Surrogate
+        surrogate = Surrogate(fixed)
+        if args.calibration:
+            surrogate.calibrate(pd.read_csv(args.calibration))
+        total = len(points)
+        points = surrogate.prune(points, min_pairs=args.min_pairs, min_fidelity=args.min_fidelity)
+        print("surrogate kept %d of %d points" % (len(points), total), file=sys.stderr)
+    cache = ResultCache(args.cache) if args.cache else None
+    monitor = None
+    if args.live:
+        import multiprocessing
+        from dashboard import Monitor, serve_in_thread
+        monitor = multiprocessing.Queue()
+        serve_in_thread(Monitor(monitor), port=args.live)
+        print("dashboard on http://127.0.0.1:%d" % args.live, file=sys.stderr)
+    table = run_sweep(points, processes=args.processes, seed=args.seed, fixed=fixed, cache=cache, monitor=monitor,
+                      journal=args.journal)
+    table.to_csv(args.out or sys.stdout, index=False)
+    return 0 if "error" not in table or table["error"].isna().all() else 1
+
+def cmd_threshold(args: argparse.Namespace) -> int:
+    from functools import partial
+
+    from result_cache import ResultCache
+    from thresholds import bisect_threshold, find_boundary, satisfied
+    fixed = json.loads(args.fixed) if args.fixed else {}
+    cache = ResultCache(args.cache) if args.cache else None
+    criterion = partial(satisfied, min_pairs=args.min_pairs,
+                        min_fidelity=fixed.get("fidelity", 0.9) if args.min_fidelity is None else args.min_fidelity)
+    options = dict(fixed=fixed, criterion=criterion, processes=args.processes, batch=args.batch, seed=args.seed,
+                   cache=cache, journal=args.journal)
+    if args.bounds:
+        bounds = {name: tuple(bound) for name, bound in json.loads(args.bounds).items()}
+        result = find_boundary(bounds, log=args.log_params, max_runs=args.max_runs, resolution=args.resolution,
+                               **options)
+        print_json({"runs": len(result.runs), "undecided": result.undecided, "moved": result.moved,
+                    "converged": result.converged})
+        table, ok = result.runs, result.converged
+    else:
+        if args.param is None or args.low is None or args.high is None:
+            raise SystemExit("threshold: give PARAM LOW HIGH, or --bounds")
+        result = bisect_threshold(args.param, args.low, args.high, tol=args.tol, rtol=args.rtol, log=args.log,
+                                  **options)
+        print_json({"param": result.param, "lower": result.lower, "upper": result.upper,
+                    "threshold": result.threshold, "satisfied_below": result.satisfied_below,
+                    "runs": len(result.runs), "grid_runs": result.grid_runs})
+        table, ok = result.runs, result.found
+    if args.out:
+        table.to_csv(args.out, index=False)
+    return 0 if ok else 1
+
+def cmd_render(args: argparse.Namespace) -> int:
+    from figures import render_runs
+    for path in render_runs(args.source, args.out, args.format, routers=args.routers, max_points=args.max_points,
+                            processes=args.processes, overwrite=args.overwrite):
+        print(path)
+    return 0
+
+def cmd_replay(args: argparse.Namespace) -> int:
+    from workload import run_workload
+    params = scenario_params(args, ("trace", "window", "lead"))
+    for name in ("memory_size", "fidelity", "attacks", "memories_dir", "trace_dir"):
+        params.pop(name, None)  # the trace has its own requests
+    params.setdefault("sim_time", 2000)
+    params.setdefault("cc_delay", 0.1)
+    params.setdefault("qc_atten", 3e-5)
+    params.setdefault("qc_dist", 1)
+    print_json(run_workload(args.trace, window=args.window, lead=args.lead, **params))
+    return 0
+
+def cmd_bench(args: argparse.Namespace) -> int:
+    import benchmark
+    return benchmark.main(args.options)
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Headless quantum network simulations.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="one entanglement request between two routers")
+    add_scenario_arguments(run)
+    run.add_argument("--src", type=int, default=argparse.SUPPRESS, help="index of the requesting router")
+    run.add_argument("--dst", type=int, default=argparse.SUPPRESS, help="index of the responding router")
+    run.add_argument("--swapping-success-rate", type=float, default=argparse.SUPPRESS)
+    run.add_argument("--plot", help="draw the memories to this image file")
+    run.add_argument("--profile", help="profile the protocols, collapsed stacks go to this file")
+    run.set_defaults(func=cmd_run)
+
+    attack = commands.add_parser("attack", help="the swapping attack on a random triple of routers")
+    add_scenario_arguments(attack)
+    attack.add_argument("--swapping-success-rate", type=float, default=argparse.SUPPRESS)
+    attack.add_argument("--choice-node", type=int, default=argparse.SUPPRESS, help="first router of the triple")
+    attack.add_argument("--plot", help="draw the memories to this image file")
+    attack.add_argument("--profile", help="profile the protocols, collapsed stacks go to this file")
+    attack.add_argument("--campaign", type=float, help="replicate until every CI is narrower than this")
+    attack.add_argument("--relative", action="store_true", help="campaign width relative to the mean")
+    attack.add_argument("--max-replicas", type=int, default=1000)
+    attack.add_argument("--processes", type=int)
+    attack.set_defaults(func=cmd_attack)
+
+    sweep = commands.add_parser("sweep", help="run_scenario over a parameter grid")
+    sweep.add_argument("--grid", help="JSON {parameter: [values]} (default: the saquare_network.py sliders)")
+    sweep.add_argument("--points", help="JSON file with a list of parameter dicts")
+    sweep.add_argument("--fixed", help="JSON parameters shared by every point")
+    sweep.add_argument("--processes", type=int)
+    sweep.add_argument("--seed", type=int, default=0)
+    sweep.add_argument("--cache", help="result cache directory")
+    sweep.add_argument("--out", help="CSV file (default: stdout)")
+    sweep.add_argument("--journal", help="record finished points to this file and skip them when run again")
+    sweep.add_argument("--live", type=int, metavar="PORT", help="follow the runs on a dashboard at this port")
+    sweep.add_argument("--screen", action="store_true", help="skip points the surrogate model rules out")
+    sweep.add_argument("--calibration", help="sweep CSV to calibrate the surrogate against")
+    sweep.add_argument("--min-pairs", type=float, default=1, help="screen: fewest predicted pairs")
+    sweep.add_argument("--min-fidelity", type=float, default=0.9, help="screen: lowest predicted fidelity")
+    sweep.set_defaults(func=cmd_sweep)
+
+    threshold = commands.add_parser("threshold", help="where a request stops being satisfied, few runs")
+    threshold.add_argument("param", nargs="?", help="parameter to bisect, e.g. swapping_success_rate")
+    threshold.add_argument("low", nargs="?", type=float)
+    threshold.add_argument("high", nargs="?", type=float)
+    threshold.add_argument("--log", action="store_true", help="bisect on a log scale")
+    threshold.add_argument("--tol", type=float, help="absolute width of the final bracket")
+    threshold.add_argument("--rtol", type=float, default=0.05, help="relative width of the final bracket")
+    threshold.add_argument("--bounds", help='JSON {parameter: [low, high]}: learn a multi-parameter boundary')
+    threshold.add_argument("--log-params", nargs="*", default=(), help="--bounds parameters on a log scale")
+    threshold.add_argument("--max-runs", type=int, default=200, help="--bounds: limit on runs")
+    threshold.add_argument("--resolution", type=float, default=0.01,
+                           help="--bounds: stop once less than this fraction of the box changes side in a round")
+    threshold.add_argument("--fixed", help="JSON parameters shared by every run")
+    threshold.add_argument("--min-pairs", type=int, default=1, help="pairs a satisfied request has")
+    threshold.add_argument("--min-fidelity", type=float, help="their fidelity (default: the requested one)")
+    threshold.add_argument("--batch", type=int, help="runs per round (default: the pool size)")
+    threshold.add_argument("--processes", type=int)
+    threshold.add_argument("--seed", type=int, default=0)
+    threshold.add_argument("--cache", help="result cache directory")
+    threshold.add_argument("--journal", help="record the runs to this file and skip them when run again")
+    threshold.add_argument("--out", help="CSV file of every run")
+    threshold.set_defaults(func=cmd_threshold)
+
+    render = commands.add_parser("render", help="figures of stored runs, drawn off-screen on a process pool")
+    render.add_argument("source", help="Parquet file or directory written with --memories-dir")
+    render.add_argument("--out", required=True, help="directory of the figures")
+    render.add_argument("--format", default="png", help="png, svg or pdf")
+    render.add_argument("--routers", nargs="*", help="routers to draw (default: all)")
+    render.add_argument("--max-points", type=int, default=500, help="memories per router drawn one by one")
+    render.add_argument("--processes", type=int)
+    render.add_argument("--overwrite", action="store_true", help="draw again figures newer than their run")
+    render.set_defaults(func=cmd_render)
+
+    replay = commands.add_parser("replay", help="requests streamed from a JSONL or .npy trace")
+    replay.add_argument("trace", help="request trace, see workload.py")
+    add_scenario_arguments(replay)
+    replay.add_argument("--window", type=float, default=1e12, help="requests scheduled ahead of time (ps)")
+    replay.add_argument("--lead", type=float, default=1e9, help="JSONL: issue time before start_time (ps)")
+    replay.set_defaults(func=cmd_replay)
+
+    bench = commands.add_parser("bench", help="benchmark suite, options as in benchmark.py")
+    bench.add_argument("options", nargs=argparse.REMAINDER)
+    bench.set_defaults(func=cmd_bench)
+    return parser
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    func = args.func
+    del args.func
+    return func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
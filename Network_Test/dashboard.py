@@ -0,0 +1,420 @@
+"""Live view of running simulations and sweeps in a Dash dashboard.
+
+Results used to appear only as matplotlib figures once ``tl.run()`` had
+returned. A run connected to a dashboard gets a ``MetricStream`` that
+hooks its routers and, at most every ``interval`` seconds of wall time,
+puts one small delta on a local queue: events executed, entangled pairs
+per router pair and a fixed-bin histogram of their fidelities since the
+previous delta. Nothing per pair or per event crosses the queue, and a full
+queue never blocks the simulation: the delta keeps accumulating until the
+next one fits.
+
+The dashboard process drains the queue into a ``Monitor`` and serves the
+topology (Cytoscape, entangled pairs on the edges), pair counts, fidelity
+distribution and events/sec of any run or of all of them. Rates are
+appended to the browser's plot with ``extendData``, never re-sent whole::
+
+    queue = multiprocessing.Queue()
+    serve_in_thread(Monitor(queue), port=8050)
+    run_sweep(points, monitor=queue)
+
+Dash is only imported by the dashboard process; workers only need NumPy.
+"""
+
+import itertools
+import os
+import queue as queue_module
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Importing sequence structures
+from sequence.kernel.eventlist import EventList
+
+from hooks import Hooks, counts_pair
+
+# fidelity histogram shared by workers and dashboard
+BINS = 25
+FIDELITY_RANGE = (0.5, 1.0)
+
+# queue a worker process streams to, set by connect() (e.g. as pool initializer)
+_queue = None
+_label = None
+_runs = itertools.count()
+
+def connect(queue, label: Optional[str] = None) -> None:
+    """Streams the runs of this process to ``queue`` from now on."""
+    global _queue, _label
+    _queue, _label = queue, label
+
+def connected() -> bool:
+    return _queue is not None
+
+def set_label(label: str) -> None:
+    """Name the dashboard shows for the next runs of this process."""
+    global _label
+    _label = label
+
+def stream_network(timeline: "Timeline", routers: List["QuantumRouter"], edges: Optional[list] = None,
+                   label: Optional[str] = None) -> Optional["MetricStream"]:
+    """A stream of this run if the process is connected to a dashboard, None otherwise."""
+    if _queue is None:
+        return None
+    run = "%d-%d" % (os.getpid(), next(_runs))
+    return MetricStream(_queue, run, timeline, routers, edges, label or _label or run)
+
+def fidelity_bin(fidelity: float) -> int:
+    low, high = FIDELITY_RANGE
+    return min(max(int((fidelity - low) / (high - low) * BINS), 0), BINS - 1)
+
+
+class StreamEventList(EventList):
+    """Event list of a streamed timeline: reads the wall clock every ``check_every`` events."""
+
+    def __init__(self, stream: "MetricStream", events: EventList, check_every: int):
+        super().__init__()
+        self.data = events.data
+        self.inner = events
+        self.stream = stream
+        self.check_every = check_every
+        self.popped = 0
+
+    def push(self, event: "Event") -> None:
+        self.inner.push(event)
+
+    def pop(self) -> "Event":
+        self.popped += 1
+        if not self.popped % self.check_every and time.monotonic() >= self.stream.next_flush:
+            self.stream.flush()
+        return self.inner.pop()
+
+    def top(self) -> "Event":
+        return self.inner.top()
+
+    def remove(self, event: "Event") -> None:
+        self.inner.remove(event)
+
+    def update_event_time(self, event: "Event", time: int) -> None:
+        self.inner.update_event_time(event, time)
+
+
+class MetricStream:
+    """Sends downsampled deltas of one run to a dashboard queue.
+
+    Attributes:
+        run (str): identifier of the run on the dashboard.
+        interval (float): least wall time (s) between two deltas.
+        next_flush (float): monotonic time after which the next delta is sent.
+        dropped (int): deltas merged into the next one because the queue was full.
+    """
+
+    def __init__(self, queue, run: str, timeline: "Timeline", routers: List["QuantumRouter"],
+                 edges: Optional[list] = None, label: Optional[str] = None, interval: float = 0.5,
+                 check_every: int = 256):
+        self.queue = queue
+        self.run = run
+        self.timeline = timeline
+        self.interval = interval
+        self.dropped = 0
+        self.next_flush = time.monotonic() + interval
+        self._pairs = {}
+        self._histogram = [0] * BINS
+        self._events = timeline.run_counter
+        self._tick = time.monotonic()
+        self._hooks = Hooks()
+        self._hooks.install(timeline, "events", StreamEventList(self, timeline.events, check_every))
+        for router in routers:
+            self.stream_router(router)
+        self._send({"kind": "start", "run": run, "label": label or run, "pid": os.getpid(),
+                    "nodes": [router.name for router in routers], "edges": edges or [],
+                    "stop_time": timeline.stop_time}, block=True)
+
+    def stream_router(self, router: "QuantumRouter") -> None:
+        memory_manager = router.resource_manager.memory_manager
+        update = memory_manager.update
+        name = router.name
+
+        def streamed_update(memory: "Memory", state: str) -> None:
+            update(memory, state)
+            if state == "ENTANGLED":
+                remote = memory.entangled_memory["node_id"]
+                if counts_pair(name, remote):
+                    key = name + "|" + remote
+                    self._pairs[key] = self._pairs.get(key, 0) + 1
+                    self._histogram[fidelity_bin(memory.fidelity)] += 1
+
+        self._hooks.install(memory_manager, "update", streamed_update)
+
+    def _send(self, message: dict, block: bool = False) -> bool:
+        try:
+            # start and end messages wait a little for room, deltas never do
+            self.queue.put(message, block=block, timeout=1 if block else None)
+        except queue_module.Full:
+            return False
+        return True
+
+    def flush(self) -> None:
+        """Sends what changed since the last delta that got through."""
+        now = time.monotonic()
+        events = self.timeline.run_counter
+        delta = {"kind": "delta", "run": self.run, "time": self.timeline.now(), "events": events - self._events,
+                 "wall": now - self._tick, "stamp": time.time(), "pairs": self._pairs, "histogram": self._histogram}
+        if self._send(delta):
+            self._pairs = {}
+            self._histogram = [0] * BINS
+            self._events = events
+            self._tick = now
+        else:
+            self.dropped += 1
+        self.next_flush = now + self.interval
+
+    def close(self, metrics: Optional[dict] = None) -> None:
+        """Sends the last delta and the run's scalar metrics, and unhooks the run."""
+        self.flush()
+        scalars = {name: value for name, value in (metrics or {}).items() if np.isscalar(value)}
+        self._send({"kind": "end", "run": self.run, "metrics": scalars}, block=True)
+        self._hooks.restore()
+
+
+class RunState:
+    """What the dashboard knows about one run.
+
+    Attributes:
+        label (str): name shown for the run.
+        status (str): "running" or "done".
+        nodes (List[str]): router names.
+        edges (List[list]): pairs of router names with a quantum link.
+        pairs (Dict[str, int]): entangled pairs per "a|b" router pair.
+        histogram (np.ndarray): fidelities of the pairs, ``BINS`` bins over ``FIDELITY_RANGE``.
+        rates (deque): (worker wall time, events/s) of the last deltas.
+    """
+
+    def __init__(self, message: dict, history: int):
+        self.label = message["label"]
+        self.pid = message["pid"]
+        self.status = "running"
+        self.nodes = message["nodes"]
+        self.edges = message["edges"]
+        self.stop_time = message["stop_time"]
+        self.pairs = {}
+        self.histogram = np.zeros(BINS, dtype=np.int64)
+        self.events = 0
+        self.time = 0
+        self.rates = deque(maxlen=history)
+        self.received = 0  # rates received so far, the browser's cursor into ``rates``
+        self.metrics = {}
+
+    def apply(self, delta: dict) -> None:
+        for key, count in delta["pairs"].items():
+            self.pairs[key] = self.pairs.get(key, 0) + count
+        self.histogram += delta["histogram"]
+        self.events += delta["events"]
+        self.time = delta["time"]
+        if delta["wall"] > 0:
+            self.rates.append((delta["stamp"], delta["events"] / delta["wall"]))
+            self.received += 1
+
+    @property
+    def rate(self) -> float:
+        return self.rates[-1][1] if self.rates else 0.0
+
+
+class Monitor:
+    """Collects the deltas of every run streaming to a queue.
+
+    Attributes:
+        runs (Dict[str, RunState]): runs by identifier, in the order they started.
+        messages (int): messages received so far.
+    """
+
+    def __init__(self, queue, history: int = 300, max_messages: int = 10000):
+        self.queue = queue
+        self.history = history
+        self.max_messages = max_messages
+        self.runs = {}
+        self.messages = 0
+        self._lock = threading.Lock()
+
+    def drain(self) -> int:
+        """Applies the messages waiting in the queue (at most ``max_messages``); returns how many."""
+        count = 0
+        with self._lock:
+            while count < self.max_messages:
+                try:
+                    message = self.queue.get_nowait()
+                except (queue_module.Empty, EOFError, OSError):
+                    break
+                count += 1
+                kind, run = message["kind"], message["run"]
+                if kind == "start":
+                    self.runs[run] = RunState(message, self.history)
+                elif run in self.runs:
+                    if kind == "delta":
+                        self.runs[run].apply(message)
+                    else:
+                        self.runs[run].status = "done"
+                        self.runs[run].metrics = message["metrics"]
+            self.messages += count
+        return count
+
+    def summary(self) -> List[dict]:
+        """One row per run for the run table."""
+        with self._lock:
+            return [{"run": run, "label": state.label, "status": state.status, "time (ms)": state.time / 1e9,
+                     "events": state.events, "events/s": round(state.rate),
+                     "pairs": sum(state.pairs.values())}
+                    for run, state in self.runs.items()]
+
+    def selected(self, run: Optional[str]) -> List[RunState]:
+        """The state of a run, or of all runs without one."""
+        with self._lock:
+            return self._selected(run)
+
+    def _selected(self, run: Optional[str]) -> List[RunState]:
+        if run and run in self.runs:
+            return [self.runs[run]]
+        return list(self.runs.values())
+
+    def pair_counts(self, run: Optional[str]) -> Dict[str, int]:
+        counts = {}
+        with self._lock:
+            for state in self._selected(run):
+                for key, count in state.pairs.items():
+                    counts[key] = counts.get(key, 0) + count
+        return counts
+
+    def histogram(self, run: Optional[str]) -> np.ndarray:
+        with self._lock:
+            return sum((state.histogram for state in self._selected(run)), np.zeros(BINS, dtype=np.int64))
+
+    def rates(self, run: Optional[str], since: int = 0) -> tuple:
+        """New (wall time, events/s) points of a run after the first ``since`` ones, and the new cursor.
+
+        Without a run, the total rate of the running runs, one point per call.
+        """
+        with self._lock:
+            if run and run in self.runs:
+                state = self.runs[run]
+                new = min(state.received - since, len(state.rates))
+                points = list(state.rates)[len(state.rates) - new:] if new > 0 else []
+                return points, state.received
+            total = sum(state.rate for state in self.runs.values() if state.status == "running")
+        return [(time.time(), total)], since + 1
+
+
+def _timestamps(points: list) -> List[str]:
+    return [datetime.fromtimestamp(x).isoformat(sep=" ", timespec="milliseconds") for x, _ in points]
+
+def cytoscape_elements(state_nodes: List[str], edges: List[list], pairs: Dict[str, int]) -> List[dict]:
+    """Routers, quantum links and entangled pairs (dashed, with their count) as Cytoscape elements."""
+    elements = [{"data": {"id": name, "label": name}} for name in state_nodes]
+    elements += [{"data": {"id": "link:%s|%s" % (u, v), "source": u, "target": v}, "classes": "link"}
+                 for u, v in edges]
+    elements += [{"data": {"id": "pairs:" + key, "source": key.split("|")[0], "target": key.split("|")[1],
+                           "label": str(count)}, "classes": "pairs"}
+                 for key, count in pairs.items()]
+    return elements
+
+STYLESHEET = [
+    {"selector": "node", "style": {"label": "data(label)", "background-color": "#4c72b0"}},
+    {"selector": ".link", "style": {"line-color": "#999999", "width": 2}},
+    {"selector": ".pairs", "style": {"line-color": "#dd8452", "line-style": "dashed", "label": "data(label)",
+                                     "curve-style": "bezier", "width": 3}},
+]
+
+def make_app(monitor: Monitor, refresh: float = 1.0):
+    """The Dash application showing ``monitor``, refreshed every ``refresh`` seconds."""
+    import dash_cytoscape as cyto
+    import plotly.graph_objects as go
+    from dash import Dash, Input, Output, State, dash_table, dcc, html, no_update
+
+    low, high = FIDELITY_RANGE
+    centers = low + (np.arange(BINS) + 0.5) * (high - low) / BINS
+    app = Dash(__name__, title="Quantum network runs")
+    app.layout = html.Div([
+        html.H3("Quantum network runs"),
+        dcc.Interval(id="tick", interval=int(refresh * 1000)),
+        dcc.Store(id="cursor", data=0),
+        dcc.Dropdown(id="run", placeholder="all runs"),
+        html.Div([
+            cyto.Cytoscape(id="topology", layout={"name": "cose"}, stylesheet=STYLESHEET,
+                           style={"width": "50%", "height": "400px", "display": "inline-block"}),
+            dcc.Graph(id="fidelity", style={"width": "50%", "display": "inline-block"}),
+        ]),
+        html.Div([
+            dcc.Graph(id="pairs", style={"width": "50%", "display": "inline-block"}),
+            dcc.Graph(id="rate", style={"width": "50%", "display": "inline-block"}),
+        ]),
+        dash_table.DataTable(id="runs", page_size=20, sort_action="native"),
+    ])
+
+    @app.callback(Output("runs", "data"), Output("run", "options"), Input("tick", "n_intervals"))
+    def refresh_runs(_):
+        monitor.drain()
+        rows = monitor.summary()
+        return rows, [{"label": row["label"], "value": row["run"]} for row in rows]
+
+    @app.callback(Output("topology", "elements"), Output("pairs", "figure"), Output("fidelity", "figure"),
+                  Input("tick", "n_intervals"), Input("run", "value"), State("topology", "elements"))
+    def refresh_run(_, run, shown):
+        counts = monitor.pair_counts(run)
+        states = monitor.selected(run)
+        if run and states:
+            elements = cytoscape_elements(states[0].nodes, states[0].edges, counts)
+            if elements == shown:
+                elements = no_update  # Cytoscape keeps its layout when nothing changed
+        else:
+            elements = []
+        keys = sorted(counts)
+        pairs = go.Figure(go.Bar(x=keys, y=[counts[key] for key in keys]),
+                          layout={"title": "Entangled pairs", "margin": {"t": 40}})
+        fidelity = go.Figure(go.Bar(x=centers, y=monitor.histogram(run), width=(high - low) / BINS),
+                             layout={"title": "Fidelity of the pairs", "margin": {"t": 40}})
+        return elements, pairs, fidelity
+
+    @app.callback(Output("rate", "figure"), Output("cursor", "data"), Input("run", "value"))
+    def reset_rate(run):
+        points, cursor = monitor.rates(run)
+        figure = go.Figure(go.Scatter(x=_timestamps(points), y=[y for _, y in points], mode="lines"),
+                           layout={"title": "Events / s", "margin": {"t": 40}})
+        return figure, cursor
+
+    @app.callback(Output("rate", "extendData"), Output("cursor", "data", allow_duplicate=True),
+                  Input("tick", "n_intervals"), State("run", "value"), State("cursor", "data"),
+                  prevent_initial_call=True)
+    def extend_rate(_, run, cursor):
+        points, cursor = monitor.rates(run, cursor or 0)
+        if not points:
+            return no_update, cursor
+        return ({"x": [_timestamps(points)], "y": [[y for _, y in points]]}, [0], monitor.history), cursor
+
+    return app
+
+def serve(monitor: Monitor, host: str = "127.0.0.1", port: int = 8050, refresh: float = 1.0) -> None:
+    """Serves the dashboard until interrupted."""
+    make_app(monitor, refresh).run(host=host, port=port, debug=False)
+
+def serve_in_thread(monitor: Monitor, host: str = "127.0.0.1", port: int = 8050,
+                    refresh: float = 1.0) -> threading.Thread:
+    """Serves the dashboard from a daemon thread, e.g. next to a sweep in the same process."""
+    thread = threading.Thread(target=serve, args=(monitor, host, port, refresh), daemon=True)
+    thread.start()
+    return thread
+
+
+if __name__ == '__main__':
+    import multiprocessing
+
+    from sweep import expand_grid, run_sweep
+
+    queue = multiprocessing.Queue()
+    serve_in_thread(Monitor(queue))
+    print("dashboard on http://127.0.0.1:8050")
+    table = run_sweep(expand_grid({"qc_dist": [1, 2, 4], "cc_delay": [0.1, 0.5]}), monitor=queue,
+                      fixed={"sim_time": 300, "start_time": 1e10, "end_time": 2e11, "memory_size": 10})
+    print(table)
+    input("press Enter to stop the dashboard")
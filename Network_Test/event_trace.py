@@ -0,0 +1,230 @@
+"""Binary trace of what happens during ``tl.run()``.
+
+``TraceRecorder`` hooks a timeline and its routers and appends one
+fixed-width record per
+
+* executed event (owner and activation of the process),
+* memory state change (RAW / OCCUPIED / ENTANGLED, with remote node and fidelity),
+* RSVP message handled by a router (REQUEST / REJECT / APPROVE),
+
+to a memory-mapped file. Names are interned to integer codes and stored
+next to the records in ``<path>.json`` when the recorder is closed.
+``load_trace`` maps the file back read-only as a NumPy structured array, so
+long runs can be analysed later without re-simulating them.
+"""
+
+import json
+from heapq import heappop
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Importing sequence structures
+from sequence.kernel.eventlist import EventList
+
+from hooks import Hooks
+
+TRACE_FORMAT = 1
+
+# record kinds
+EVENT = 0
+MEMORY = 1
+RSVP = 2
+KINDS = ("EVENT", "MEMORY", "RSVP")
+
+# packed, 33 bytes per record
+RECORD_DTYPE = np.dtype([
+    ("time", np.int64),     # simulation time (ps)
+    ("value", np.float64),  # fidelity of the memory / reservation, NaN for events
+    ("owner", np.int32),    # name code of the entity, protocol or router
+    ("label", np.int32),    # name code of the activation / memory state / message type
+    ("peer", np.int32),     # name code of the remote node / responder, -1 if none
+    ("index", np.int32),    # memory index / reserved memories, -1 for events
+    ("kind", np.uint8),
+])
+
+# records kept in Python before being copied to the mapped file
+CHUNK = 1 << 16
+
+
+class TracedEventList(EventList):
+    """Event list of a traced timeline: records every event the timeline executes."""
+
+    def __init__(self, recorder: "TraceRecorder", events: EventList):
+        super().__init__()
+        self.data = events.data
+        self.recorder = recorder
+
+    def pop(self) -> "Event":
+        event = heappop(self.data)
+        # Timeline.run() drops invalid events and puts back the one past stop_time; update_event_time()
+        # takes out an event it delays by popping it at time -1
+        timeline = self.recorder.timeline
+        if timeline.now() <= event.time < timeline.stop_time and not event.is_invalid():
+            process = event.process
+            self.recorder.record(EVENT, event.time, process.owner.name, process.activation)
+        return event
+
+
+class TraceRecorder:
+    """Appends fixed-width records of a run to a memory-mapped file.
+
+    Attributes:
+        path (str): trace file.
+        timeline (Timeline): traced timeline.
+        names (List[str]): interned names, the code of a name is its position.
+        count (int): records written to the file so far.
+    """
+
+    def __init__(self, path: str, timeline: "Timeline", routers: List["QuantumRouter"] = ()):
+        self.path = path
+        self.timeline = timeline
+        self.names = []
+        self.count = 0
+        self._codes = {}
+        self._pending = []
+        self._capacity = CHUNK
+        self._hooks = Hooks()
+        with open(path, "wb") as fh:
+            fh.truncate(self._capacity * RECORD_DTYPE.itemsize)
+        self._map = np.memmap(path, dtype=RECORD_DTYPE, mode="r+", shape=(self._capacity,))
+
+        self._hooks.install(timeline, "events", TracedEventList(self, timeline.events))
+        for router in routers:
+            self.trace_router(router)
+
+    def code(self, name: Optional[str]) -> int:
+        if name is None:
+            return -1
+        code = self._codes.get(name)
+        if code is None:
+            code = self._codes[name] = len(self.names)
+            self.names.append(name)
+        return code
+
+    def record(self, kind: int, time: int, owner: str, label: str, peer: Optional[str] = None,
+               index: int = -1, value: float = float("nan")) -> None:
+        self._pending.append((time, value, self.code(owner), self.code(label), self.code(peer), index, kind))
+        if len(self._pending) >= CHUNK:
+            self.flush()
+
+    def trace_router(self, router: "QuantumRouter") -> None:
+        """Records the memory state changes and RSVP messages of one router."""
+        memory_manager = router.resource_manager.memory_manager
+        rsvp = router.network_manager.protocol_stack[1]
+        update, pop = memory_manager.update, rsvp.pop
+        # get_info_by_memory() searches the memory list, look indices up by identity instead
+        indices = {id(memory): index for index, memory in enumerate(memory_manager.memory_array.memories)}
+
+        def traced_update(memory: "Memory", state: str) -> None:
+            update(memory, state)
+            peer = memory.entangled_memory["node_id"] if state == "ENTANGLED" else None
+            self.record(MEMORY, self.timeline.now(), router.name, state, peer, indices[id(memory)],
+                        memory.fidelity)
+
+        def traced_pop(src: str, msg: "ResourceReservationMessage") -> None:
+            reservation = msg.reservation
+            self.record(RSVP, self.timeline.now(), router.name, msg.msg_type.name, reservation.responder,
+                        reservation.memory_size, reservation.fidelity)
+            pop(src, msg)
+
+        self._hooks.install(memory_manager, "update", traced_update)
+        self._hooks.install(rsvp, "pop", traced_pop)
+
+    def flush(self) -> None:
+        if not self._pending:
+            return
+        end = self.count + len(self._pending)
+        if end > self._capacity:
+            self._grow(max(end, 2 * self._capacity))
+        self._map[self.count:end] = np.array(self._pending, dtype=RECORD_DTYPE)
+        self.count = end
+        self._pending.clear()
+
+    def _grow(self, capacity: int) -> None:
+        self._map.flush()
+        del self._map
+        with open(self.path, "r+b") as fh:
+            fh.truncate(capacity * RECORD_DTYPE.itemsize)
+        self._capacity = capacity
+        self._map = np.memmap(self.path, dtype=RECORD_DTYPE, mode="r+", shape=(capacity,))
+
+    def close(self) -> None:
+        """Unhooks the simulation, trims the file and writes the names next to it."""
+        self._hooks.restore()
+        self.flush()
+        self._map.flush()
+        del self._map
+        with open(self.path, "r+b") as fh:
+            fh.truncate(self.count * RECORD_DTYPE.itemsize)
+        with open(self.path + ".json", "w") as fh:
+            json.dump({"format": TRACE_FORMAT, "dtype": RECORD_DTYPE.descr, "count": self.count,
+                       "names": self.names}, fh)
+
+    def __enter__(self) -> "TraceRecorder":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class Trace:
+    """Read-only view of a recorded trace.
+
+    Attributes:
+        records (np.ndarray): memory-mapped structured array with ``RECORD_DTYPE`` fields.
+        names (List[str]): name of every code.
+    """
+
+    def __init__(self, records: np.ndarray, names: List[str]):
+        self.records = records
+        self.names = names
+        self._codes = {name: code for code, name in enumerate(names)}
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def code(self, name: str) -> int:
+        """Code of a name, -2 (matches nothing) if it never occurs in the trace."""
+        return self._codes.get(name, -2)
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        lookup = np.array(self.names + [""], dtype=object)
+        return lookup[codes]  # -1 maps to ""
+
+    def select(self, kind: int, owner: Optional[str] = None, label: Optional[str] = None) -> np.ndarray:
+        """Records of one kind, optionally of one owner and / or label."""
+        records = self.records
+        mask = records["kind"] == kind
+        if owner is not None:
+            mask &= records["owner"] == self.code(owner)
+        if label is not None:
+            mask &= records["label"] == self.code(label)
+        return records[mask]
+
+    def counts(self, kind: int = EVENT) -> Dict[tuple, int]:
+        """Number of records of one kind per (owner, label)."""
+        records = self.records[self.records["kind"] == kind]
+        pairs, counts = np.unique(np.stack([records["owner"], records["label"]], axis=1), axis=0,
+                                  return_counts=True)
+        return {(self.names[owner], self.names[label]): int(count)
+                for (owner, label), count in zip(pairs, counts)}
+
+    def entangled(self, router: str, peer: Optional[str] = None) -> np.ndarray:
+        """Times (ps) and fidelities of the memories of ``router`` becoming entangled."""
+        records = self.select(MEMORY, router, "ENTANGLED")
+        if peer is not None:
+            records = records[records["peer"] == self.code(peer)]
+        return records[["time", "index", "value"]]
+
+
+def load_trace(path: str) -> Trace:
+    with open(path + ".json") as fh:
+        header = json.load(fh)
+    if header["format"] != TRACE_FORMAT:
+        raise ValueError("trace %s has format %s, expected %s" % (path, header["format"], TRACE_FORMAT))
+    if header["count"] == 0:
+        records = np.empty(0, dtype=RECORD_DTYPE)
+    else:
+        records = np.memmap(path, dtype=RECORD_DTYPE, mode="r", shape=(header["count"],))
+    return Trace(records, header["names"])
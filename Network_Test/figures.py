@@ -0,0 +1,143 @@
+"""Figures of finished runs, drawn from memory tables (see metrics.py).
+
+matplotlib is only imported when a figure is actually drawn, so processes
+that never plot do not pay for it. Figures are written to files and closed
+instead of being shown.
+
+``render_runs`` draws the figures of many stored runs (the Parquet files
+``run_scenario(memories_dir=...)`` writes) on a process pool with the Agg
+backend, so a sweep's hundreds of figures are drawn off-screen and away
+from the simulating processes. Routers with more than ``max_points``
+memories are drawn from aggregated data: the entanglement curve is sampled
+at ``max_points`` evenly spaced counts, and the fidelity bars become the
+mean and range of bins of consecutive memories.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from metrics import RAW_FIDELITY, entangled_times
+
+# memories of one router drawn one by one; above it the data is aggregated
+MAX_POINTS = 500
+FORMATS = ("png", "svg", "pdf")
+
+def _pyplot():
+    from matplotlib import pyplot as plt
+    return plt
+
+def _use_agg() -> None:
+    import matplotlib
+    matplotlib.use("Agg", force=True)
+
+def downsample_curve(times: np.ndarray, max_points: int) -> Tuple[np.ndarray, np.ndarray]:
+    """The entanglement curve (time, count) at no more than ``max_points`` counts, first and last included."""
+    counts = np.arange(1, len(times) + 1)
+    if len(times) <= max_points:
+        return times, counts
+    keep = np.unique(np.linspace(0, len(times) - 1, max_points).round().astype(int))
+    return times[keep], counts[keep]
+
+def bin_fidelities(fidelities: np.ndarray, max_points: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Mean, min and max fidelity of bins of consecutive memories, and the first memory of each bin."""
+    size = -(-len(fidelities) // max_points)
+    starts = np.arange(0, len(fidelities), size)
+    return (starts, np.add.reduceat(fidelities, starts) / np.diff(np.append(starts, len(fidelities))),
+            np.minimum.reduceat(fidelities, starts), np.maximum.reduceat(fidelities, starts))
+
+def plot_memories(table: Dict[str, np.ndarray], path: str, routers: Optional[List[str]] = None,
+                  raw_fidelity: float = RAW_FIDELITY, max_points: int = MAX_POINTS) -> None:
+    """The two figures of the scripts in one file: entangled memories over time and memory fidelities.
+
+    Args:
+        table (Dict[str, np.ndarray]): memory table of one run.
+        path (str): image file to write.
+        routers (List[str]): routers to draw, one column each (default: all in the table).
+        raw_fidelity (float): reference line of the fidelity plots.
+        max_points (int): memories of a router drawn individually; more are aggregated.
+    """
+    plt = _pyplot()
+    if routers is None:
+        routers = list(dict.fromkeys(table["router"]))
+    fig, axes = plt.subplots(2, len(routers), squeeze=False)
+    fig.set_size_inches(4 * len(routers), 10)
+    for column, router in enumerate(routers):
+        # plotEntangleMemories
+        ax = axes[0][column]
+        data = entangled_times(table, router)
+        times, counts = downsample_curve(data, max_points)
+        ax.plot(times, counts, marker="o" if len(data) <= max_points else None)
+        ax.set_title(router)
+        ax.set_xlabel("Simulation Time (s)")
+        # displayMemoryFidelity
+        ax = axes[1][column]
+        mask = table["router"] == router
+        fidelities = table["fidelity"][mask][np.argsort(table["index"][mask])]
+        if len(fidelities) <= max_points:
+            ax.bar(range(len(fidelities)), fidelities)
+        else:
+            starts, mean, low, high = bin_fidelities(fidelities, max_points)
+            ax.fill_between(starts, low, high, step="post", alpha=0.3, linewidth=0)
+            ax.step(starts, mean, where="post")
+        ax.plot([0, len(fidelities)], [raw_fidelity, raw_fidelity], "k--")
+        ax.plot([0, len(fidelities)], [0.9, 0.9], "k--")
+        ax.set_ylim(0.7, 1)
+        ax.set_xlabel("Memory Number")
+    axes[0][0].set_ylabel("Number of Entangled Memories")
+    axes[1][0].set_ylabel("Fidelity")
+    fig.tight_layout()
+    fig.savefig(path)
+    plt.close(fig)
+
+def _render(task: tuple) -> str:
+    from metrics import load_runs
+    source, path, routers, max_points = task
+    plot_memories(load_runs(source), path, routers, max_points=max_points)
+    return path
+
+def render_runs(source: str, directory: str, fmt: str = "png", routers: Optional[List[str]] = None,
+                max_points: int = MAX_POINTS, processes: Optional[int] = None,
+                overwrite: bool = False) -> List[str]:
+    """Draws ``plot_memories`` of every stored run on a pool of Agg processes.
+
+    Args:
+        source (str): Parquet file of one run, or a directory of them.
+        directory (str): where ``<run_id>.<fmt>`` files are written.
+        fmt (str): "png", "svg" or "pdf".
+        routers (List[str]): routers to draw (default: all).
+        max_points (int): memories of a router drawn individually; more are aggregated.
+        processes (int): pool size (default: all cores).
+        overwrite (bool): draw again figures newer than their run.
+
+    Returns:
+        List[str]: the figures written, in the order of the runs.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"fmt must be one of {FORMATS}")
+    if os.path.isdir(source):
+        sources = sorted(os.path.join(source, name) for name in os.listdir(source) if name.endswith(".parquet"))
+    else:
+        sources = [source]
+    os.makedirs(directory, exist_ok=True)
+    tasks = []
+    for run in sources:
+        path = os.path.join(directory, os.path.splitext(os.path.basename(run))[0] + "." + fmt)
+        if overwrite or not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(run):
+            tasks.append((run, path, routers, max_points))
+    if tasks:
+        processes = processes or os.cpu_count()
+        with ProcessPoolExecutor(max_workers=min(processes, len(tasks)), initializer=_use_agg) as executor:
+            for future in as_completed([executor.submit(_render, task) for task in tasks]):
+                future.result()
+    return [os.path.join(directory, os.path.splitext(os.path.basename(run))[0] + "." + fmt) for run in sources]
+
+
+if __name__ == '__main__':
+    import sys
+
+    # python figures.py MEMORIES_DIR FIGURES_DIR [png|svg|pdf]
+    for figure in render_runs(sys.argv[1], sys.argv[2], *sys.argv[3:4]):
+        print(figure)
@@ -0,0 +1,37 @@
+"""Hooks that watch a run through instance attributes of its objects.
+
+The dashboard stream, the termination conditions, the fidelity detector,
+the trace recorder, the reservation log and the link abstraction all wrap
+methods of the timeline, the routers and their managers by setting
+instance attributes over them. Several of them can watch the same run, so
+each one puts back what the instance held before it: another watcher's
+hook, or nothing, which uncovers the method again.
+"""
+
+from typing import Any, Optional
+
+
+class Hooks:
+    """Instance attributes set over the methods and attributes of simulation objects."""
+
+    def __init__(self):
+        self._saved = []
+
+    def install(self, owner: Any, attribute: str, value: Any) -> None:
+        """Sets ``owner.attribute`` to ``value``, remembering what the instance held before."""
+        self._saved.append((owner, attribute, owner.__dict__.get(attribute)))
+        setattr(owner, attribute, value)
+
+    def restore(self) -> None:
+        """Puts back what every install replaced, the last one first."""
+        for owner, attribute, value in reversed(self._saved):
+            if value is None:
+                delattr(owner, attribute)
+            else:
+                setattr(owner, attribute, value)
+        self._saved = []
+
+
+def counts_pair(name: str, remote: Optional[str]) -> bool:
+    """Whether the end ``name`` of a pair with ``remote`` counts it: both ends see it, the smaller name counts."""
+    return remote is not None and name < remote
@@ -0,0 +1,158 @@
+"""Crash-safe record of the finished tasks of a sweep, to resume it after a restart.
+
+A sweep of a few thousand points runs for hours; when the machine or the
+pool dies half way, ``run_sweep(..., journal="sweep.jsonl")`` started
+again skips every task already in the journal and runs only the rest. The
+journal is an append-only JSON-lines file with one line per finished task:
+its key (``result_cache.result_key``), the scenario function, every
+argument it ran with, seed included, and the metrics it returned. A line is
+written with a single ``write`` on a file opened for appending and synced
+to disk, so a crash leaves at most one torn last line, which is dropped
+when the journal is opened again. An unreadable line before the last one
+was not cut by a crash: it is skipped (its task runs again) and left in
+the file.
+
+Each task's ``seed`` is derived from the root seed and the point only (see
+``sweep.point_seed``), and the node, app and attack generators of the run
+are children of that seed (see ``scenario.seed_streams``), so a task gives
+the same result wherever it runs, and any of them can be run again alone::
+
+    journal = SweepJournal("sweep.jsonl")
+    journal.rerun(key)  # same metrics as the line of ``key``
+"""
+
+import importlib
+import json
+import os
+import time
+from typing import Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+
+
+def _jsonable(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+def _parse_line(line: bytes) -> Optional[dict]:
+    """The entry of a journal line, None if it lacks its newline or does not parse."""
+    if not line.endswith(b"\n"):
+        return None
+    try:
+        entry = json.loads(line)
+    except ValueError:
+        return None
+    return entry if isinstance(entry, dict) and "key" in entry else None
+
+def function_name(func: Callable) -> str:
+    return f"{func.__module__}.{func.__qualname__}"
+
+def resolve_function(name: str) -> Callable:
+    """The function of a journal line, imported from its module."""
+    module, _, qualname = name.rpartition(".")
+    func = importlib.import_module(module)
+    for attribute in qualname.split("."):
+        func = getattr(func, attribute)
+    return func
+
+
+class SweepJournal:
+    """Append-only journal of finished tasks, keyed like the result cache.
+
+    Attributes:
+        path (str): JSON-lines file of the journal.
+        entries (Dict[str, dict]): finished tasks by key, as written (key, func, params, result, time).
+        dropped (int): bytes of the torn or unreadable last line removed when opened.
+        skipped (List[int]): numbers (from 1) of the unreadable lines before the last one, left in the file.
+        sync (bool): whether every line is synced to disk before ``record`` returns.
+    """
+
+    def __init__(self, path: str, sync: bool = True):
+        self.path = path
+        self.sync = sync
+        self.entries: Dict[str, dict] = {}
+        self.dropped = 0
+        self.skipped: List[int] = []
+        self._load()
+        self._fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+    def _load(self) -> None:
+        try:
+            fh = open(self.path, "rb")
+        except FileNotFoundError:
+            return
+        with fh:
+            lines = fh.readlines()
+        size = 0
+        for number, line in enumerate(lines, 1):
+            entry = _parse_line(line)
+            if entry is not None:
+                self.entries[entry["key"]] = entry
+            elif number == len(lines):
+                # the write a crash interrupted
+                self.dropped = len(line)
+                os.truncate(self.path, size)
+            else:
+                self.skipped.append(number)
+            size += len(line)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.entries
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __iter__(self) -> Iterator[dict]:
+        return iter(self.entries.values())
+
+    def get(self, key: str) -> Optional[dict]:
+        """Metrics of a finished task, None if it has not finished."""
+        entry = self.entries.get(key)
+        return None if entry is None else entry["result"]
+
+    def record(self, key: str, func: Callable, params: dict, result: dict) -> None:
+        """Appends a finished task; it is on disk when this returns."""
+        entry = {"key": key, "func": function_name(func), "params": params, "result": result,
+                 "time": time.time()}
+        line = (json.dumps(entry, default=_jsonable, separators=(",", ":")) + "\n").encode()
+        os.write(self._fd, line)
+        if self.sync:
+            os.fsync(self._fd)
+        self.entries[key] = json.loads(line)
+
+    def task(self, key: str) -> tuple:
+        """(function, keyword arguments) of a finished task."""
+        entry = self.entries[key]
+        return resolve_function(entry["func"]), dict(entry["params"])
+
+    def rerun(self, key: str, **overrides) -> dict:
+        """Runs one finished task again in this process, optionally with some arguments changed."""
+        func, params = self.task(key)
+        return func(**{**params, **overrides})
+
+    def close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self) -> "SweepJournal":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+if __name__ == '__main__':
+    import sys
+
+    # python journal.py sweep.jsonl [key]: list the finished tasks, or run one of them again
+    journal = SweepJournal(sys.argv[1])
+    if len(sys.argv) > 2:
+        print(journal.rerun(sys.argv[2]))
+    else:
+        for entry in journal:
+            print(entry["key"][:12], entry["params"], entry["result"])
+    journal.close()
@@ -0,0 +1,97 @@
+"""Columnar snapshots of the routers' memory tables.
+
+``plotEntangleMemories`` and ``displayMemoryFidelity`` walk each memory
+manager in Python to feed matplotlib. ``memory_table`` instead reads every
+router's MemoryInfo entries once into NumPy columns (router, index, state,
+entangle_time, fidelity, remote_node), which can be written to Parquet per
+run and loaded back for thousands of runs at once with pyarrow.
+"""
+
+import json
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# fidelity of a freshly generated pair in the scenarios (memory raw_fidelity)
+RAW_FIDELITY = 0.85
+
+# MemoryInfo.state as a small integer
+STATES = ("RAW", "OCCUPIED", "ENTANGLED")
+STATE_CODES = {state: code for code, state in enumerate(STATES)}
+
+MEMORY_DTYPE = np.dtype([
+    ("index", np.int32),
+    ("state", np.int8),
+    ("entangle_time", np.float64),  # ps, -1 if never entangled
+    ("fidelity", np.float64),
+    ("remote_node", object),        # "" if not entangled
+])
+
+def memory_table(routers: List["QuantumRouter"]) -> Dict[str, np.ndarray]:
+    """One row per memory of every router, as a dict of NumPy columns."""
+    records, names = [], []
+    for router in routers:
+        infos = router.resource_manager.memory_manager.memory_map
+        records.append(np.array([(info.index, STATE_CODES[info.state], info.entangle_time, info.fidelity,
+                                  info.remote_node or "") for info in infos], dtype=MEMORY_DTYPE))
+        names.append(np.full(len(infos), router.name, dtype=object))
+    rows = np.concatenate(records) if records else np.empty(0, dtype=MEMORY_DTYPE)
+    table = {"router": np.concatenate(names) if names else np.empty(0, dtype=object)}
+    table.update({field: rows[field] for field in MEMORY_DTYPE.names})
+    return table
+
+def entangled_times(table: Dict[str, np.ndarray], router: str) -> np.ndarray:
+    """Sorted entanglement times (s) of one router, the data of plotEntangleMemories."""
+    mask = (table["router"] == router) & (table["entangle_time"] > 0)
+    return np.sort(table["entangle_time"][mask]) / 1e12
+
+def _arrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as error:
+        raise ImportError("writing memory tables needs pyarrow (pip install pyarrow)") from error
+    return pyarrow
+
+def write_table(table: Dict[str, np.ndarray], path: str, metadata: Optional[dict] = None) -> None:
+    """Writes a memory table to Parquet, ``metadata`` goes to the schema as JSON."""
+    pa = _arrow()
+    columns = {}
+    for name, column in table.items():
+        # names repeat a lot: store them dictionary-encoded
+        if column.dtype == object:
+            column = pa.array(column, type=pa.string()).dictionary_encode()
+        columns[name] = column
+    arrow_table = pa.table(columns)
+    if metadata is not None:
+        arrow_table = arrow_table.replace_schema_metadata({"run": json.dumps(metadata)})
+    pa.parquet.write_table(arrow_table, path)
+
+def save_run(routers: List["QuantumRouter"], directory: str, run_id: str, metadata: Optional[dict] = None) -> str:
+    """Snapshots the routers and writes ``<directory>/<run_id>.parquet``."""
+    os.makedirs(directory, exist_ok=True)
+    table = memory_table(routers)
+    table["run"] = np.full(len(table["index"]), run_id, dtype=object)
+    path = os.path.join(directory, run_id + ".parquet")
+    write_table(table, path, metadata)
+    return path
+
+def load_runs(path: str) -> Dict[str, np.ndarray]:
+    """Reads one Parquet file or a directory of them back into NumPy columns."""
+    pa = _arrow()
+    import pyarrow.dataset
+    arrow_table = pa.dataset.dataset(path, format="parquet").to_table()
+    columns = {}
+    for name in arrow_table.column_names:
+        column = arrow_table.column(name)
+        if pa.types.is_dictionary(column.type):
+            column = column.cast(pa.string())
+        columns[name] = column.to_numpy(zero_copy_only=False)
+    return columns
+
+def run_metadata(path: str) -> dict:
+    """Parameters stored by ``save_run`` in one Parquet file."""
+    pa = _arrow()
+    metadata = pa.parquet.read_schema(path).metadata or {}
+    return json.loads(metadata.get(b"run", b"{}"))
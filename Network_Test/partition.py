@@ -0,0 +1,668 @@
+"""One simulation split over several processes.
+
+``plan_partitions`` splits the routers of a network into partitions of
+about the same number of memories, cutting few links (recursive spectral
+bisection of the router graph; separate quantum networks are kept whole
+when that balances them), and puts the BSM node of a cut link with its
+first router. ``PartitionedRun`` runs each partition in its own forked
+process. The processes synchronize conservatively: all of them execute the
+events earlier than ``(earliest pending event anywhere) + lookahead``,
+where the lookahead is the shortest delay of a classical or quantum channel
+between two partitions, then exchange the messages and photons they sent
+each other and start the next window. What is sent in a window arrives at
+least one lookahead later, so it always lands in a later window.
+
+Every event is keyed by ``(time, priority, time it was scheduled at,
+partition that scheduled it, how many events that partition had
+scheduled)`` (``OrderedEventList``), so events of the same time run in the
+same order however the network is split. ``PartitionedRun.run_sequential`` runs the network
+in one process in that order; it matches a plain ``Timeline.run()`` unless
+two events tie on time and priority and their order matters.
+
+SeQUeNCe keeps the quantum states of all memories in one
+``QuantumManager``. A partition keeps the states of its own memories in its
+own copy (``SharedQuantumManager``); a state goes to a server process once
+it has to be acted on together with a state already there, and the
+memories whose photons reach the BSM node of a cut link are there from the
+start. A memory reset by its partition comes back when no state on the
+server still lists it. The server runs the calls of the partitions in the
+order of the events that make them, waiting until no partition can still
+make an earlier call in the window, so ``PartitionedRun.run`` gives the
+same results as ``run_sequential``, cut links included.
+"""
+
+import multiprocessing
+import os
+import time
+from collections import deque
+from heapq import heappop, heappush
+from multiprocessing.connection import wait
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components, laplacian
+
+# Importing sequence structures
+from sequence.kernel.event import Event
+from sequence.kernel.eventlist import EventList
+from sequence.kernel.process import Process
+
+from classical_channels import LazyChannelTable
+from metrics import memory_table
+from profiler import node_name
+from topology_builder import Network
+
+GLOBAL = -1  # partition of events whose owner is not a node (attacks, request drivers): run everywhere
+
+def router_graph(network: Network) -> csr_matrix:
+    """Symmetric adjacency matrix of the routers, one entry per quantum link."""
+    num_routers = len(network.routers)
+    edges = np.asarray(network.edges, dtype=np.int64).reshape(-1, 2)
+    graph = csr_matrix((np.ones(len(edges)), (edges[:, 0], edges[:, 1])), shape=(num_routers, num_routers))
+    return ((graph + graph.T) > 0).astype(float)
+
+def quantum_components(network: Network) -> np.ndarray:
+    """Component of every node (routers then BSM nodes) in the graph of quantum links."""
+    edges = np.asarray(network.edges, dtype=np.int64).reshape(-1, 2)
+    _, labels = connected_components(router_graph(network), directed=False)
+    return np.concatenate([labels, labels[edges[:, 0]]])
+
+def quantum_delays(network: Network, assignment: np.ndarray) -> tuple:
+    """Number and shortest delay (ps) of the quantum channels between two partitions."""
+    part = {node.name: part for node, part in zip(network.nodes, assignment.tolist())}
+    # QuantumChannel.init() sets the delay; the plan is made before tl.init()
+    delays = [round(qc.distance / qc.light_speed) for qc in network.qchannels
+              if part[qc.sender.name] != part[qc.receiver]]
+    return len(delays), min(delays, default=float("inf"))
+
+def classical_delays(network: Network, assignment: np.ndarray) -> tuple:
+    """Number and shortest delay (ps) of the classical channels between two partitions.
+
+    Channels a ``LazyChannelTable`` has not created yet count with the delay
+    they would get.
+    """
+    nodes = network.nodes
+    names = [node.name for node in nodes]
+    part = dict(zip(names, assignment.tolist()))
+    count, lookahead = 0, float("inf")
+    for node in nodes:
+        table = node.cchannels
+        if isinstance(table, LazyChannelTable):
+            delays = [table.delay_fn(node.name, dst) for dst in names
+                      if dst != node.name and part[dst] != part[node.name]]
+        else:
+            delays = [cc.delay for dst, cc in table.items() if part.get(dst, part[node.name]) != part[node.name]]
+        count += len(delays)
+        if delays:
+            lookahead = min(lookahead, min(delays))
+    return count, lookahead
+
+
+class PartitionPlan:
+    """Partition of every node of a network.
+
+    Attributes:
+        assignment (np.ndarray): partition of every node, routers then BSM nodes.
+        parts (int): number of partitions (at most the number of routers).
+        load (np.ndarray): memories (plus one per node) in every partition.
+        cut_classical (int): classical channels between partitions.
+        cut_quantum (int): quantum channels between partitions (one per cut link).
+        lookahead (float): shortest delay (ps) of the channels between partitions, inf without any.
+    """
+
+    def __init__(self, network: Network, assignment: np.ndarray):
+        self.assignment = np.asarray(assignment, dtype=np.int64)
+        self.parts = int(self.assignment.max()) + 1 if len(self.assignment) else 0
+        self.load = np.bincount(self.assignment, _node_load(network), minlength=self.parts)
+        self.cut_classical, classical = classical_delays(network, self.assignment)
+        self.cut_quantum, quantum = quantum_delays(network, self.assignment)
+        self.lookahead = min(classical, quantum)
+        self._part = {node.name: part for node, part in zip(network.nodes, self.assignment.tolist())}
+
+    def partition_of(self, name: str) -> int:
+        """Partition of a node, GLOBAL for names that are not nodes."""
+        return self._part.get(name, GLOBAL)
+
+def _node_load(network: Network) -> np.ndarray:
+    memories = [len(router.get_components_by_type("MemoryArray")[0].memories) for router in network.routers]
+    return np.array(memories + [0] * len(network.bsm_nodes), dtype=float) + 1
+
+def _pack_components(labels: np.ndarray, load: np.ndarray, share: float) -> Optional[np.ndarray]:
+    """Whole components on the first side, largest first, if that gets within 10% of ``share`` of the load."""
+    totals = np.bincount(labels, load)
+    target, side = share * totals.sum(), 0.0
+    first = np.zeros(len(totals), dtype=bool)
+    for component in np.argsort(-totals, kind="stable"):
+        if side + totals[component] <= target * 1.1:
+            first[component] = True
+            side += totals[component]
+    if not first.any() or first.all() or abs(side - target) > 0.1 * target:
+        return None
+    return first[labels]
+
+def _bisect(graph: csr_matrix, load: np.ndarray, share: float, first_min: int, second_min: int) -> np.ndarray:
+    """Mask of the nodes of the first side: about ``share`` of the load, few links between the sides."""
+    count, labels = connected_components(graph, directed=False)
+    if count > 1:
+        mask = _pack_components(labels, load, share)
+        if mask is not None and first_min <= mask.sum() <= len(mask) - second_min:
+            return mask
+    # order the nodes along the Fiedler vector and cut it where the load reaches the share
+    _, vectors = np.linalg.eigh(laplacian(graph).toarray())
+    order = np.argsort(vectors[:, 1], kind="stable")
+    cumulative = np.cumsum(load[order])
+    cut = int(np.searchsorted(cumulative, share * cumulative[-1])) + 1
+    cut = min(max(cut, first_min), len(order) - second_min)
+    mask = np.zeros(len(order), dtype=bool)
+    mask[order[:cut]] = True
+    return mask
+
+def _split(graph: csr_matrix, load: np.ndarray, nodes: np.ndarray, parts: int, first: int,
+           assignment: np.ndarray) -> None:
+    parts = min(parts, len(nodes))
+    if parts == 1:
+        assignment[nodes] = first
+        return
+    left = parts // 2
+    mask = _bisect(graph[nodes][:, nodes], load[nodes], left / parts, left, parts - left)
+    _split(graph, load, nodes[mask], left, first, assignment)
+    _split(graph, load, nodes[~mask], parts - left, first + left, assignment)
+
+def plan_partitions(network: Network, parts: int) -> PartitionPlan:
+    """Splits the routers of a network into ``parts`` partitions of about the same load.
+
+    Partitions are halved recursively: separate quantum networks go whole to
+    either half when that balances them, otherwise the routers are ordered
+    along the Fiedler vector of the router graph, which keeps neighbours
+    together. The BSM node of a link goes with its first router.
+    """
+    num_routers = len(network.routers)
+    load = _node_load(network)
+    assignment = np.zeros(num_routers, dtype=np.int64)
+    if num_routers:
+        _split(router_graph(network), load[:num_routers], np.arange(num_routers), max(parts, 1), 0, assignment)
+        # number the partitions from 0 without gaps
+        assignment = np.unique(assignment, return_inverse=True)[1]
+    edges = np.asarray(network.edges, dtype=np.int64).reshape(-1, 2)
+    return PartitionPlan(network, np.concatenate([assignment, assignment[edges[:, 0]]]))
+
+
+class OrderedEventList(EventList):
+    """Event list that breaks ties between events of the same time and priority deterministically.
+
+    Every event is keyed by ``(time, rank, sent, source, sequence)``: rank
+    0 for a finite priority and 1 for none, the time it was scheduled at,
+    the partition executing then and how many events that partition had
+    scheduled before. SeQUeNCe gives messages the timeline's schedule
+    counter as priority, so that the earlier sent is received first; each
+    process counts on its own, so ``sent`` stands in for it. Events
+    scheduled by GLOBAL events are counted per destination partition, as
+    every process runs those events but only keeps what they schedule for
+    its own nodes.
+    """
+
+    def __init__(self, plan: PartitionPlan, events: EventList, local: Optional[int] = None):
+        super().__init__()
+        self.plan = plan
+        self.local = local           # partition of this process, None when running everything
+        self.current = GLOBAL        # partition of the event being executed
+        self.current_key = None      # and its key
+        self.counters = {}
+        self.outbox = []             # events for other partitions, as (target, key, node name, activation, args, kwargs)
+        self._entries = {}
+        for event in events.data:
+            if not event.is_invalid():
+                self.push(event)
+
+    def owner_partition(self, event: Event) -> int:
+        return self.plan.partition_of(node_name(event.process.owner))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        return (entry[-1] for entry in self.data if self._entries.get(id(entry[-1])) is entry)
+
+    def push(self, event: Event) -> None:
+        target = self.owner_partition(event)
+        source = self.current if self.current != GLOBAL else -2 - target
+        sequence = self.counters.get(source, 0)
+        self.counters[source] = sequence + 1
+        sent = self.current_key[0] if self.current_key is not None else -1
+        entry = [event.time, 0 if event.priority < float("inf") else 1, sent, source, sequence, event]
+        if self.local is None or target in (self.local, GLOBAL):
+            if target == GLOBAL and self.current != GLOBAL and self.local is not None:
+                raise RuntimeError(f"{event.process.owner} is not a node and can not be scheduled from a partition")
+            self._entries[id(event)] = entry
+            heappush(self.data, entry)
+        elif self.current != GLOBAL:
+            process = event.process
+            # only what channels deliver to nodes (messages, photons) can be made again in another process
+            if getattr(process.owner, "name", None) != node_name(process.owner):
+                raise RuntimeError(f"{process.owner} is not a node and can not be scheduled in another partition")
+            self.outbox.append((target, entry[:-1], process.owner.name, process.activation,
+                                process.activation_args, process.activation_kwargs))
+        # events GLOBAL events schedule for other partitions are made there as well
+
+    def push_remote(self, key: list, owner: str, activation: str, args: list, kwargs: dict,
+                    timeline: "Timeline") -> None:
+        event = Event(key[0], Process(timeline.get_entity_by_name(owner), activation, args, kwargs))
+        entry = key + [event]
+        self._entries[id(event)] = entry
+        heappush(self.data, entry)
+
+    def _clean(self) -> None:
+        while self.data and self._entries.get(id(self.data[0][-1])) is not self.data[0]:
+            heappop(self.data)
+
+    def top(self) -> Event:
+        self._clean()
+        return self.data[0][-1]
+
+    def next_time(self) -> float:
+        self._clean()
+        return self.data[0][0] if self.data else float("inf")
+
+    def pop(self) -> Event:
+        self._clean()
+        entry = heappop(self.data)
+        event = entry[-1]
+        del self._entries[id(event)]
+        self.current = self.owner_partition(event)
+        self.current_key = entry[:-1]
+        return event
+
+    def update_event_time(self, event: Event, time: int) -> None:
+        entry = self._entries.get(id(event))
+        if entry is None or time == event.time:
+            event.time = time
+            return
+        event.time = time
+        moved = [time] + entry[1:]
+        self._entries[id(event)] = moved
+        heappush(self.data, moved)
+
+
+def quantum_keys(network: Network, plan: PartitionPlan) -> Tuple[Dict[int, int], Set[int]]:
+    """Partition of the quantum state of every memory, and the states shared from the start.
+
+    The memories of a router send their photons to the BSM nodes of its
+    links; those of a cut link's second router reach a BSM node of another
+    partition, which measures them with the first router's.
+    """
+    homes, shared = {}, set()
+    edges = np.asarray(network.edges, dtype=np.int64).reshape(-1, 2)
+    assignment = plan.assignment
+    reaching = set(edges[assignment[edges[:, 1]] != assignment[edges[:, 0]], 1].tolist())
+    for index, router in enumerate(network.routers):
+        for memory in router.get_components_by_type("MemoryArray")[0].memories:
+            homes[memory.qstate_key] = int(assignment[index])
+            if index in reaching:
+                shared.add(memory.qstate_key)
+    return homes, shared
+
+
+class SharedQuantumManager:
+    """Quantum manager of a partition process: its own states here, shared ones on the server.
+
+    ``manager`` holds the states of ``local``. A call on them only runs
+    here; any other call goes to the server, with the local states it
+    involves (and those they list), which stay there until a reset of all
+    the keys of a call brings them back.
+
+    Attributes:
+        manager (QuantumManager): this process's copy of the quantum manager.
+        local (Set[int]): keys whose state is here.
+        own (Set[int]): keys of the memories of this partition that may come back here.
+        remote_calls (int): calls made on the server.
+    """
+
+    def __init__(self, manager: "QuantumManager", conn, events: OrderedEventList, local: Set[int]):
+        self.manager = manager
+        self.conn = conn
+        self.events = events
+        self.local = set(local)
+        self.own = set(local)
+        self.formalism = manager.formalism
+        self.truncation = manager.truncation
+        self.dim = manager.dim
+        self.remote_calls = 0
+        self._event = None
+        self._calls = 0
+
+    def _call(self, name: str, args: tuple, uploads: Optional[dict] = None, release: bool = False):
+        # calls are ordered by the event making them, then by their order within it
+        key = self.events.current_key
+        if key is not self._event:
+            self._event, self._calls = key, 0
+        self._calls += 1
+        self.conn.send(("call", key + [self._calls], name, args, uploads, release))
+        ok, value = self.conn.recv()
+        self.remote_calls += 1
+        if not ok:
+            raise RuntimeError(f"quantum manager {name}: {value}")
+        return value
+
+    def _upload(self, keys: List[int]) -> dict:
+        """Hands the local states of ``keys``, and of the local keys they list, to the server."""
+        states = self.manager.states
+        moved = {}
+        todo = [key for key in keys if key in self.local]
+        while todo:
+            key = todo.pop()
+            if key not in moved:
+                moved[key] = states[key]
+                todo += [other for other in states[key].keys if other in self.local and other not in moved]
+        self.local.difference_update(moved)
+        return moved
+
+    def get(self, key: int) -> "State":
+        if key in self.local:
+            return self.manager.get(key)
+        return self._call("get", (key,))
+
+    def set(self, keys: List[int], amplitudes) -> None:
+        if self.local.issuperset(keys):
+            return self.manager.set(keys, amplitudes)
+        # the server gives keys of this partition back unless one of its states still lists them
+        if self._call("set", (keys, amplitudes), release=self.own.issuperset(keys)):
+            self.local.update(keys)
+            return self.manager.set(keys, amplitudes)
+        self.local.difference_update(keys)
+        return None
+
+    def set_to_zero(self, key: int) -> None:
+        self.set([key], [complex(1), complex(0)])
+
+    def set_to_one(self, key: int) -> None:
+        self.set([key], [complex(0), complex(1)])
+
+    def run_circuit(self, circuit: "Circuit", keys: List[int], meas_samp=None) -> Dict[int, int]:
+        states = self.manager.states
+        if all(key in self.local and self.local.issuperset(states[key].keys) for key in keys):
+            return self.manager.run_circuit(circuit, keys, meas_samp)
+        return self._call("run_circuit", (circuit, keys, meas_samp), self._upload(keys))
+
+    def __getattr__(self, name: str):
+        raise AttributeError(f"quantum manager method {name} is not available in a partitioned run")
+
+def _serve_quantum_manager(manager: "QuantumManager", shared: Set[int], conns: list, clients: list,
+                           report) -> None:
+    """Runs the calls of the partitions' managers on ``manager`` in event order, until every partition is gone.
+
+    A call runs once every other partition is waiting on a call of its own
+    or has finished the window, the earliest call first: a partition still
+    running could make an earlier one.
+    """
+    for conn in clients:
+        conn.close()
+    tick = time.process_time()
+    manager.states = {key: state for key, state in manager.states.items() if key in shared}
+    pending = [deque() for _ in conns]
+    running = set(range(len(conns)))  # partitions that have not sent their next message
+    closed = set()
+    calls = 0
+    circuits = {}  # a circuit arrives as a new copy every time; keep one that caches its matrix
+    while len(closed) < len(conns):
+        if running - closed:
+            for conn in wait([conns[i] for i in running - closed]):
+                i = conns.index(conn)
+                try:
+                    pending[i].append(conn.recv())
+                except EOFError:
+                    closed.add(i)
+                    continue
+                running.discard(i)
+            continue
+        heads = {i: queue[0] for i, queue in enumerate(pending) if queue}
+        calls_waiting = {i: message for i, message in heads.items() if message[0] == "call"}
+        if not calls_waiting:
+            # every partition finished the window
+            for i in heads:
+                pending[i].popleft()
+            running = set(range(len(conns))) - closed
+            continue
+        i = min(calls_waiting, key=lambda j: calls_waiting[j][1])
+        _, _, name, args, uploads, release = pending[i].popleft()
+        if not pending[i]:
+            running.add(i)
+        try:
+            if uploads:
+                manager.states.update(uploads)
+            if release:
+                keys = set(args[0])
+                listed = any(not keys.isdisjoint(state.keys) for key, state in manager.states.items()
+                             if key not in keys)
+                if listed:
+                    manager.set(*args)
+                else:
+                    for key in keys:
+                        manager.states.pop(key, None)
+                reply = (True, not listed)
+            else:
+                if name == "run_circuit":
+                    circuit = args[0]
+                    circuit = circuits.setdefault((circuit.size, repr(circuit.gates), repr(circuit.measured_qubits)),
+                                                  circuit)
+                    args = (circuit,) + args[1:]
+                reply = (True, getattr(manager, name)(*args))
+        except Exception as error:
+            reply = (False, repr(error))
+        conns[i].send(reply)
+        calls += 1
+    report.send((calls, time.process_time() - tick))
+    report.close()
+
+
+def _run_until(tl: "Timeline", events: OrderedEventList, bound: float) -> None:
+    """Timeline.run() up to (excluding) ``bound``."""
+    bound = min(bound, tl.stop_time)
+    while events.next_time() < bound:
+        event = events.pop()
+        if event.is_invalid():
+            continue
+        tl.time = event.time
+        event.process.run()
+        tl.run_counter += 1
+    events.current, events.current_key = GLOBAL, None
+
+
+def collect_memories(network: Network, plan: PartitionPlan, partition: Optional[int]) -> Dict[str, np.ndarray]:
+    """Memory table (see metrics.py) of the routers of one partition, of all with None."""
+    routers = [router for router in network.routers
+               if partition is None or plan.partition_of(router.name) == partition]
+    return memory_table(routers)
+
+def merge_tables(tables: List[Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+    return {name: np.concatenate([table[name] for table in tables]) for name in tables[0]}
+
+def _run_partition(network: Network, plan: PartitionPlan, partition: int, collect: Callable, conn,
+                   quantum, local: Optional[Set[int]]) -> None:
+    tl = network.tl
+    events = tl.events
+    events.local = partition
+    if quantum is not None:
+        tl.quantum_manager = SharedQuantumManager(tl.quantum_manager, quantum, events, local)
+    # drop what the parent scheduled for the other partitions
+    for entry in events.data:
+        if events.owner_partition(entry[-1]) not in (partition, GLOBAL):
+            events._entries.pop(id(entry[-1]), None)
+    tick = time.process_time()
+    try:
+        while True:
+            conn.send(("next", events.next_time(), events.outbox))
+            events.outbox = []
+            message = conn.recv()
+            if message[0] == "stop":
+                break
+            _, bound, inbox = message
+            for key, owner, activation, args, kwargs in inbox:
+                if key[0] < tl.now():
+                    raise RuntimeError(f"message for {owner} at {key[0]} arrived after {tl.now()}, lookahead too long")
+                events.push_remote(key, owner, activation, args, kwargs, tl)
+            _run_until(tl, events, bound)
+            if quantum is not None:
+                quantum.send(("idle",))
+        conn.send(("done", tl.run_counter, time.process_time() - tick, collect(network, plan, partition)))
+    except BaseException as error:
+        conn.send(("error", repr(error), None, None))
+    conn.close()
+    if quantum is not None:
+        quantum.close()
+
+
+class PartitionedRun:
+    """A network whose timeline runs partition by partition.
+
+    Create it right after the network is built, before ``tl.init()``, so
+    every event gets its deterministic key; then initialize, make the
+    requests and schedule the attacks as usual, and call ``run`` (or
+    ``run_sequential``) instead of ``tl.run()``.
+
+    Attributes:
+        network (Network): the network.
+        plan (PartitionPlan): its partitions.
+        windows (int): synchronization windows of the last parallel run.
+    """
+
+    def __init__(self, network: Network, plan: PartitionPlan):
+        self.network = network
+        self.plan = plan
+        self.windows = 0
+        network.tl.events = OrderedEventList(plan, network.tl.events)
+
+    def run_sequential(self, collect: Callable = collect_memories) -> dict:
+        """Runs every partition in this process; what ``collect`` returns for the whole network."""
+        tl = self.network.tl
+        tick = time.time()
+        _run_until(tl, tl.events, float("inf"))
+        return {"result": collect(self.network, self.plan, None), "events": tl.run_counter,
+                "run_time": time.time() - tick}
+
+    def run(self, collect: Callable = collect_memories, merge: Callable = merge_tables) -> dict:
+        """Runs each partition in a forked process; what ``collect`` returns, merged over partitions.
+
+        With cut links, the shared quantum states live in one more process
+        (see ``SharedQuantumManager``). The network of this process is left
+        as it was before the run. Besides the result, gives the CPU time of
+        every partition (``cpu_times``) and the calls the quantum server ran
+        (``server_calls``) in its CPU time (``server_cpu``).
+        """
+        tick = time.time()
+        context = multiprocessing.get_context("fork")
+        parts = self.plan.parts
+        quantum, server, report = [(None, None)] * parts, None, None
+        locals_ = [None] * parts
+        if self.plan.cut_quantum:
+            homes, shared = quantum_keys(self.network, self.plan)
+            locals_ = [{key for key, home in homes.items() if home == partition and key not in shared}
+                       for partition in range(parts)]
+            quantum = [context.Pipe() for _ in range(parts)]
+            report, report_end = context.Pipe(duplex=False)
+            server = context.Process(target=_serve_quantum_manager, args=(
+                self.network.tl.quantum_manager, shared, [end for end, _ in quantum], [end for _, end in quantum],
+                report_end))
+            server.start()
+            report_end.close()
+        pipes, processes = [], []
+        for partition in range(parts):
+            parent, child = context.Pipe()
+            process = context.Process(target=_run_partition, args=(self.network, self.plan, partition, collect, child,
+                                                                   quantum[partition][1], locals_[partition]))
+            process.start()
+            child.close()
+            pipes.append(parent)
+            processes.append(process)
+        # the server sees a partition leave once no process holds its end
+        for server_end, client_end in quantum:
+            if server_end is not None:
+                server_end.close()
+                client_end.close()
+
+        lookahead = self.plan.lookahead
+        stop_time = self.network.tl.stop_time
+        self.windows = 0
+        results = [None] * parts
+        cpu_times = [0.0] * parts
+        server_calls, server_cpu = 0, 0.0
+        events = 0
+        try:
+            while True:
+                nexts, inboxes = [], [[] for _ in pipes]
+                for conn in pipes:
+                    kind, next_time, outbox, *_ = conn.recv()
+                    if kind == "error":
+                        raise RuntimeError(f"partition failed: {next_time}")
+                    nexts.append(next_time)
+                    for target, key, owner, activation, args, kwargs in outbox:
+                        inboxes[target].append((key, owner, activation, args, kwargs))
+                earliest = min(nexts + [key[0] for inbox in inboxes for key, *_ in inbox])
+                if earliest >= stop_time:
+                    break
+                bound = earliest + lookahead
+                for conn, inbox in zip(pipes, inboxes):
+                    conn.send(("run", bound, inbox))
+                self.windows += 1
+            for conn in pipes:
+                conn.send(("stop",))
+            for partition, conn in enumerate(pipes):
+                kind, counter, cpu, result = conn.recv()
+                if kind == "error":
+                    raise RuntimeError(f"partition {partition} failed: {counter}")
+                events += counter - self.network.tl.run_counter
+                results[partition], cpu_times[partition] = result, cpu
+        finally:
+            for conn in pipes:
+                conn.close()
+            for process in processes:
+                process.join()
+            if server is not None:
+                if report.poll(10):
+                    server_calls, server_cpu = report.recv()
+                report.close()
+                server.join()
+        return {"result": merge(results), "events": events + self.network.tl.run_counter,
+                "run_time": time.time() - tick, "cpu_times": cpu_times, "server_calls": server_calls,
+                "server_cpu": server_cpu}
+
+
+if __name__ == '__main__':
+    from metrics import STATE_CODES
+    from scenario import mili_to_pico
+    from topology_builder import build_network, ring_edges
+    from sequence.kernel.timeline import Timeline
+
+    def build() -> PartitionedRun:
+        # one 16-router ring cut into 4 partitions of four routers; 20 km links give a 100 us lookahead.
+        # Four requests stay inside a partition, (3, 6) crosses a cut and shares its states through the server
+        tl = Timeline(mili_to_pico(1100))
+        network = build_network(tl, ring_edges(16), memo_size=10, cc_delay=mili_to_pico(0.1), qc_atten=1e-5,
+                                qc_dist=2e4)
+        partitioned = PartitionedRun(network, plan_partitions(network, 4))
+        tl.init()
+        for src, dst in ((6, 8), (10, 12), (2, 4), (14, 0), (3, 6)):
+            network.routers[src].network_manager.request(network.routers[dst].name, 1e12, 1e14, 5, 0.8)
+        return partitioned
+
+    partitioned = build()
+    plan = partitioned.plan
+    print("partitions %s, lookahead %g ps, %d quantum and %d classical channels cut" % (
+        plan.assignment[:16].tolist(), plan.lookahead, plan.cut_quantum, plan.cut_classical))
+    sequential = partitioned.run_sequential()
+    parallel = build().run()
+    for name, run in (("sequential", sequential), ("parallel", parallel)):
+        table = run["result"]
+        entangled = table["state"] == STATE_CODES["ENTANGLED"]
+        print("%-10s events %d, entangled %d, mean fidelity %.4f, time %.2f s" % (
+            name, run["events"], entangled.sum(), table["fidelity"][entangled].mean(), run["run_time"]))
+    # the partitions' tables are merged in partition order
+    tables = [run["result"] for run in (sequential, parallel)]
+    rows = [np.lexsort((table["index"], table["router"])) for table in tables]
+    print("identical:", all(np.array_equal(tables[0][name][rows[0]], tables[1][name][rows[1]]) for name in tables[0]))
+    # the wall time only drops with a core per partition; the busiest process bounds it
+    busiest = max(parallel["cpu_times"] + [parallel["server_cpu"]])
+    print("cpu per partition %s s, server %d calls in %.2f s" % (
+        ", ".join("%.2f" % cpu for cpu in parallel["cpu_times"]), parallel["server_calls"], parallel["server_cpu"]))
+    print("%d cores; with one per partition: %.2f s, %.1fx faster than sequential" % (
+        os.cpu_count(), busiest, sequential["run_time"] / busiest))
@@ -0,0 +1,183 @@
+"""Event counts and CPU time per protocol type and node.
+
+``ProtocolProfiler`` is switched on around one run::
+
+    with ProtocolProfiler() as profiler:
+        run_attack_scenario(sim_time=2000, swapping_success_rate=0.05)
+    print(profiler.table())
+    profiler.write_collapsed("attack.folded")
+
+While active it wraps ``Process.run`` (every event the timeline executes)
+and the entry points of the routing, RSVP, network manager, resource
+manager, generation, purification and swapping classes. Each call becomes
+a frame ``<Class>.<method>`` on a stack rooted at the node that owns the
+object, so the time of an event is split between the layers it goes
+through. ``table`` gives a flat table per (node, protocol) and
+``write_collapsed`` the collapsed stacks read by flamegraph.pl or
+speedscope.
+"""
+
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Sequence
+
+import pandas as pd
+
+# Importing sequence structures
+from sequence.entanglement_management.entanglement_protocol import EntanglementProtocol
+from sequence.kernel.process import Process
+from sequence.network_management.network_manager import NetworkManager
+from sequence.network_management.reservation import ResourceReservationProtocol
+from sequence.network_management.routing import StaticRoutingProtocol
+from sequence.resource_management.memory_manager import MemoryManager
+from sequence.resource_management.resource_manager import ResourceManager
+
+# classes whose methods (and those of their subclasses) become frames
+PROFILED = {
+    StaticRoutingProtocol: ("received_message", "push", "pop"),
+    ResourceReservationProtocol: ("received_message", "push", "pop"),
+    NetworkManager: ("received_message", "push", "pop", "request"),
+    EntanglementProtocol: ("start", "received_message"),  # generation, purification, swapping
+    ResourceManager: ("received_message", "update", "load", "expire"),
+    MemoryManager: ("update",),
+}
+
+def _subclasses(cls: type) -> List[type]:
+    classes = [cls]
+    for sub in cls.__subclasses__():
+        classes += _subclasses(sub)
+    return classes
+
+def node_name(obj) -> str:
+    """Name of the node an entity, component or protocol belongs to."""
+    owner = getattr(obj, "owner", None)
+    if owner is None and hasattr(obj, "resource_manager"):  # MemoryManager
+        owner = obj.resource_manager.owner
+    if owner is not None and hasattr(owner, "name"):
+        return owner.name
+    return getattr(obj, "name", type(obj).__name__)
+
+
+class ProtocolProfiler:
+    """Attributes events and CPU time to (node, protocol type).
+
+    Attributes:
+        profiled (Dict[type, Sequence[str]]): classes and methods to wrap.
+        clock (Callable): time source, CPU time of the process by default.
+        stacks (Dict[str, float]): self time (s) per collapsed stack ``node;frame;frame``.
+        stats (Dict[tuple, list]): events, calls, cumulative and self time per (node, protocol).
+    """
+
+    def __init__(self, profiled: Optional[Dict[type, Sequence[str]]] = None,
+                 clock: Callable[[], float] = time.process_time):
+        self.profiled = PROFILED if profiled is None else profiled
+        self.clock = clock
+        self.stacks = defaultdict(float)
+        self.stats = defaultdict(lambda: [0, 0, 0.0, 0.0])
+        self._stack = []
+        self._active = defaultdict(int)
+        self._patched = []
+
+    def _call(self, obj, owner, frame: str, is_event: bool, func: Callable, args: tuple, kwargs: dict):
+        node = node_name(owner)
+        key = (node, type(owner).__name__)
+        stack = self._stack
+        path = (stack[-1][0] if stack else node) + ";" + frame
+        # cumulative time counts only the outermost frame of a (node, protocol) on the stack
+        outer = self._active[key] == 0
+        self._active[key] += 1
+        entry = [path, self.clock(), 0.0]
+        stack.append(entry)
+        try:
+            return func(obj, *args, **kwargs)
+        finally:
+            elapsed = self.clock() - entry[1]
+            stack.pop()
+            if stack:
+                stack[-1][2] += elapsed
+            self.stacks[path] += elapsed - entry[2]
+            stats = self.stats[key]
+            stats[0] += is_event
+            stats[1] += 1
+            stats[3] += elapsed - entry[2]
+            if outer:
+                stats[2] += elapsed
+            self._active[key] -= 1
+
+    def _patch(self, cls: type, name: str, wrapper: Callable) -> None:
+        self._patched.append((cls, name, cls.__dict__[name]))
+        setattr(cls, name, wrapper)
+
+    def start(self) -> None:
+        profiler = self
+        run = Process.run
+
+        def profiled_run(process: Process):
+            owner = process.owner
+            frame = "%s.%s" % (type(owner).__name__, process.activation)
+            return profiler._call(process, owner, frame, True, run, (), {})
+
+        self._patch(Process, "run", profiled_run)
+        for base, methods in self.profiled.items():
+            for cls in _subclasses(base):
+                for name in methods:
+                    if name in cls.__dict__:
+                        self._patch(cls, name, self._wrap(cls.__dict__[name], name))
+
+    def _wrap(self, func: Callable, name: str) -> Callable:
+        profiler = self
+
+        def profiled(obj, *args, **kwargs):
+            frame = "%s.%s" % (type(obj).__name__, name)
+            return profiler._call(obj, obj, frame, False, func, args, kwargs)
+
+        profiled.__wrapped__ = func
+        return profiled
+
+    def stop(self) -> None:
+        for cls, name, original in reversed(self._patched):
+            setattr(cls, name, original)
+        self._patched = []
+
+    def __enter__(self) -> "ProtocolProfiler":
+        self.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def table(self) -> pd.DataFrame:
+        """One row per (node, protocol), slowest self time first.
+
+        ``events`` are timeline events owned by the protocol, ``calls`` every
+        profiled entry, ``cpu_time`` includes the layers called from it and
+        ``self_time`` excludes them (s).
+        """
+        rows = [{"node": node, "protocol": protocol, "events": events, "calls": calls,
+                 "cpu_time": cumulative, "self_time": own}
+                for (node, protocol), (events, calls, cumulative, own) in self.stats.items()]
+        table = pd.DataFrame.from_records(rows, columns=["node", "protocol", "events", "calls", "cpu_time", "self_time"])
+        return table.sort_values("self_time", ascending=False, ignore_index=True)
+
+    def by_protocol(self) -> pd.DataFrame:
+        """``table`` summed over nodes."""
+        return self.table().groupby("protocol")[["events", "calls", "self_time"]].sum() \
+                           .sort_values("self_time", ascending=False)
+
+    def write_collapsed(self, path: str) -> None:
+        """Collapsed stacks, one ``node;frame;... <self time in us>`` line each."""
+        with open(path, "w") as fh:
+            for stack, seconds in sorted(self.stacks.items()):
+                micros = round(seconds * 1e6)
+                if micros > 0:
+                    fh.write("%s %d\n" % (stack, micros))
+
+
+if __name__ == '__main__':
+    from scenario import run_attack_scenario
+
+    with ProtocolProfiler() as profiler:
+        run_attack_scenario(sim_time=1200, swapping_success_rate=0.05, memo_size=50, memory_size=25, seed=0)
+    print(profiler.by_protocol())
+    print(profiler.table().head(20))
+    profiler.write_collapsed("attack.folded")
@@ -1,26 +1,28 @@
-def choiceNode(nodes: list, choice_node: int = None) -> list:
+def choiceNode(nodes: list, choice_node: int = None, rng=None) -> list:
     """
         It will choose one of the network nodes according to the 
-        chosen and random number if it does not determine a node
+        chosen and random number if it does not determine a node.
+        The random number is drawn from rng (a numpy Generator) when given,
+        so the choice can be reproduced from a seed
     """
     choice_node = choice_node
     if choice_node == None:
-        from random import randint
-        choice_node = randint(0, len(nodes) - 1)
+        if rng is None:
+            from random import randint
+            choice_node = randint(0, len(nodes) - 1)
+        else:
+            choice_node = int(rng.integers(len(nodes)))
     
     if len(nodes) - choice_node == 2:
         aux = [nodes[choice_node], nodes[choice_node + 1], nodes[0]]
-        print(f"Caso == 2: {aux}")
         return aux
     elif len(nodes) - choice_node == 1:
         aux = [nodes[choice_node], nodes[0], nodes[1]]
-        print(f"Caso == 1: {aux}")
         return aux
     else:
         aux = [nodes[choice_node], nodes[choice_node+1], nodes[choice_node+2]]
-        print(f"Caso genérico: {aux}")
         return aux
 
 if __name__ == '__main__':
     nodes = ['r0', 'r1', 'r2', 'r3']
-    aux = choiceNode(nodes)
+    print(choiceNode(nodes))
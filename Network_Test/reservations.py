@@ -0,0 +1,349 @@
+"""Accepted and rejected reservations of a run, as arrays indexed by interval.
+
+random_request_network.ipynb builds its reservation table by walking every
+router's accepted reservations and appending to Python lists, and can only
+print it; SeQUeNCe keeps no record of rejected reservations at all.
+``ReservationLog`` hooks the RSVP protocol of every router and records
+one row per router for each reservation it approves (with the memories it
+holds for it, twice the requested size on intermediate routers) and one row
+for the router that rejects a reservation, plus the links of every approved
+path. ``ReservationTable`` answers the usual questions on those rows with
+NumPy: memories in use over time, overlapping reservations and capacity
+conflicts, rejection rates, and the load of every link.
+
+    log = ReservationLog(routers)
+    tl.init()
+    tl.run()
+    table = log.table()
+    table.utilization(np.linspace(0, tl.stop_time, 100))
+"""
+
+from typing import Dict, List, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+from hooks import Hooks
+
+# reservation status
+ACCEPTED = 0
+REJECTED = 1
+STATUSES = ("ACCEPTED", "REJECTED")
+
+RESERVATION_DTYPE = np.dtype([
+    ("node", np.int32),         # name code of the router of this row
+    ("initiator", np.int32),
+    ("responder", np.int32),
+    ("start_time", np.int64),   # ps
+    ("end_time", np.int64),     # ps
+    ("memory_size", np.int32),  # memories the router holds (accepted) or was asked for (rejected)
+    ("fidelity", np.float64),
+    ("time", np.int64),         # simulation time of the decision (ps), -1 if unknown
+    ("status", np.uint8),
+])
+
+LINK_DTYPE = np.dtype([
+    ("node1", np.int32),
+    ("node2", np.int32),
+    ("start_time", np.int64),
+    ("end_time", np.int64),
+    ("memory_size", np.int32),
+])
+
+CHUNK = 1 << 16
+
+def held_memories(router: str, reservation: "Reservation") -> int:
+    """Memories a router reserves for a reservation: one side of a pair at the ends, two in between."""
+    if router in (reservation.initiator, reservation.responder):
+        return reservation.memory_size
+    return 2 * reservation.memory_size
+
+def _groups(keys: np.ndarray) -> tuple:
+    """Order putting equal keys next to each other, with the (key, start, stop) of every run."""
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else np.array([], dtype=np.int64)
+    stops = np.append(starts[1:], len(keys))
+    return order, zip(keys[starts].tolist(), starts.tolist(), stops.tolist())
+
+
+def _sweep_order(keys: np.ndarray, time: np.ndarray, delta: np.ndarray) -> np.ndarray:
+    """Order of interval ends and starts by key, then time, ends before starts at the same time."""
+    order = np.argsort(time * 2 + (delta > 0), kind="stable")
+    return order[np.argsort(keys[order], kind="stable")]
+
+
+class ReservationLog:
+    """Records the reservations the RSVP protocols of a set of routers accept and reject.
+
+    Attributes:
+        names (List[str]): interned names, the code of a name is its position.
+    """
+
+    def __init__(self, routers: Sequence["QuantumRouter"] = ()):
+        self.names = []
+        self._codes = {}
+        self._rows, self._links = [], []
+        self._chunks, self._link_chunks = [], []
+        self._hooks = Hooks()
+        for router in routers:
+            self.log_router(router)
+
+    def code(self, name: str) -> int:
+        code = self._codes.get(name)
+        if code is None:
+            code = self._codes[name] = len(self.names)
+            self.names.append(name)
+        return code
+
+    def record(self, router: str, reservation: "Reservation", status: int, time: int) -> None:
+        size = held_memories(router, reservation) if status == ACCEPTED else reservation.memory_size
+        self._rows.append((self.code(router), self.code(reservation.initiator), self.code(reservation.responder),
+                           reservation.start_time, reservation.end_time, size, reservation.fidelity, time, status))
+        if len(self._rows) >= CHUNK:
+            self._chunks.append(np.array(self._rows, dtype=RESERVATION_DTYPE))
+            self._rows.clear()
+
+    def record_path(self, reservation: "Reservation") -> None:
+        path = reservation.path
+        for node1, node2 in zip(path[:-1], path[1:]):
+            self._links.append((self.code(node1), self.code(node2), reservation.start_time, reservation.end_time,
+                                reservation.memory_size))
+        if len(self._links) >= CHUNK:
+            self._link_chunks.append(np.array(self._links, dtype=LINK_DTYPE))
+            self._links.clear()
+
+    def log_router(self, router: "QuantumRouter") -> None:
+        rsvp = router.network_manager.protocol_stack[1]
+        schedule, load_rules = rsvp.schedule, rsvp.load_rules
+        timeline = router.timeline
+
+        def logged_schedule(reservation: "Reservation") -> bool:
+            scheduled = schedule(reservation)
+            if not scheduled:
+                self.record(router.name, reservation, REJECTED, timeline.now())
+            return scheduled
+
+        def logged_load_rules(rules: list, reservation: "Reservation") -> None:
+            load_rules(rules, reservation)
+            self.record(router.name, reservation, ACCEPTED, timeline.now())
+            if router.name == reservation.initiator:
+                self.record_path(reservation)
+
+        self._hooks.install(rsvp, "schedule", logged_schedule)
+        self._hooks.install(rsvp, "load_rules", logged_load_rules)
+
+    def close(self) -> None:
+        """Stops recording."""
+        self._hooks.restore()
+
+    def table(self) -> "ReservationTable":
+        """The rows recorded so far."""
+        rows = self._chunks + [np.array(self._rows, dtype=RESERVATION_DTYPE)]
+        links = self._link_chunks + [np.array(self._links, dtype=LINK_DTYPE)]
+        return ReservationTable(np.concatenate(rows), list(self.names), np.concatenate(links))
+
+def reservation_table(routers: Sequence["QuantumRouter"]) -> "ReservationTable":
+    """Table of the reservations the routers accepted, read after a run without a log (no rejections)."""
+    log = ReservationLog()
+    for router in routers:
+        for reservation in router.network_manager.protocol_stack[1].accepted_reservations:
+            log.record(router.name, reservation, ACCEPTED, -1)
+            if router.name == reservation.initiator:
+                log.record_path(reservation)
+    return log.table()
+
+
+class ReservationTable:
+    """Reservation rows and approved path links, with interval queries.
+
+    Attributes:
+        rows (np.ndarray): RESERVATION_DTYPE records.
+        names (List[str]): names of the codes in ``rows`` and ``links``.
+        links (np.ndarray): LINK_DTYPE records, one per link of every approved path.
+    """
+
+    def __init__(self, rows: np.ndarray, names: List[str], links: Optional[np.ndarray] = None):
+        self.rows = rows
+        self.names = names
+        self.links = np.empty(0, dtype=LINK_DTYPE) if links is None else links
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def _names(self, codes: np.ndarray) -> pd.Categorical:
+        return pd.Categorical.from_codes(codes, categories=pd.Index(self.names)) if self.names \
+            else pd.Categorical([])
+
+    def _code(self, name: str) -> int:
+        return self.names.index(name)
+
+    @property
+    def accepted(self) -> np.ndarray:
+        return self.rows[self.rows["status"] == ACCEPTED]
+
+    def to_frame(self) -> pd.DataFrame:
+        """The rows as a DataFrame (the notebook's table, plus fidelity, time and status)."""
+        rows = self.rows
+        return pd.DataFrame({
+            "Node": self._names(rows["node"]),
+            "Initiator": self._names(rows["initiator"]),
+            "Responder": self._names(rows["responder"]),
+            "Start_time": rows["start_time"],
+            "End_time": rows["end_time"],
+            "Memory_size": rows["memory_size"],
+            "Fidelity": rows["fidelity"],
+            "Time": rows["time"],
+            "Status": pd.Categorical.from_codes(rows["status"], categories=STATUSES),
+        })
+
+    def utilization(self, times: np.ndarray, nodes: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """Memories reserved on every router at the given times (ps), one column per router.
+
+        A reservation holds its memories from ``start_time`` (included) to
+        ``end_time`` (excluded).
+        """
+        times = np.asarray(times)
+        rows = self.accepted
+        codes = np.unique(rows["node"]) if nodes is None else np.array([self._code(name) for name in nodes])
+        wanted = set(codes.tolist())
+        columns = {}
+        order, groups = _groups(rows["node"])
+        rows = rows[order]
+        for code, lo, hi in groups:
+            if code not in wanted:
+                continue
+            starts, ends, sizes = rows["start_time"][lo:hi], rows["end_time"][lo:hi], rows["memory_size"][lo:hi]
+            by_start, by_end = np.argsort(starts), np.argsort(ends)
+            started = np.concatenate([[0], np.cumsum(sizes[by_start], dtype=np.int64)])
+            ended = np.concatenate([[0], np.cumsum(sizes[by_end], dtype=np.int64)])
+            columns[self.names[code]] = started[np.searchsorted(starts[by_start], times, side="right")] \
+                - ended[np.searchsorted(ends[by_end], times, side="right")]
+        return pd.DataFrame(columns, index=pd.Index(times, name="time"))
+
+    def _sweep(self) -> tuple:
+        """Memories in use after every start/end of an accepted reservation, grouped by router."""
+        rows = self.accepted
+        node = np.concatenate([rows["node"], rows["node"]])
+        time = np.concatenate([rows["start_time"], rows["end_time"]])
+        delta = np.concatenate([rows["memory_size"], -rows["memory_size"]]).astype(np.int64)
+        order = _sweep_order(node, time, delta)
+        node, time, delta = node[order], time[order], delta[order]
+        used = np.cumsum(delta)
+        first = np.flatnonzero(np.r_[True, node[1:] != node[:-1]])
+        before = np.repeat(used[first] - delta[first], np.diff(np.append(first, len(node))))
+        return node, time, used - before
+
+    def peak_utilization(self) -> pd.Series:
+        """Most memories any router had reserved at the same time."""
+        node, _, used = self._sweep()
+        if len(node) == 0:
+            return pd.Series(dtype=np.int64)
+        first = np.flatnonzero(np.r_[True, node[1:] != node[:-1]])
+        return pd.Series(np.maximum.reduceat(used, first), index=[self.names[code] for code in node[first]],
+                         name="peak_memories")
+
+    def conflicts(self, capacity: Union[int, Dict[str, int]]) -> pd.DataFrame:
+        """Intervals in which a router had more memories reserved than ``capacity`` (per router or for all).
+
+        RSVP never over-books a router's memory array, so rows here point to a
+        capacity smaller than the one simulated or to rows merged from runs.
+        """
+        node, time, used = self._sweep()
+        if isinstance(capacity, dict):
+            limit = np.array([capacity.get(name, np.iinfo(np.int64).max) for name in self.names])[node]
+        else:
+            limit = np.full(len(node), capacity)
+        over = np.flatnonzero(used > limit)
+        # a conflict lasts until the next change on the same router
+        following = np.minimum(over + 1, len(node) - 1)
+        end = np.where((over + 1 < len(node)) & (node[following] == node[over]), time[following], -1)
+        return pd.DataFrame({"node": self._names(node[over]), "start_time": time[over], "end_time": end,
+                             "memories": used[over], "capacity": limit[over]})
+
+    def overlaps(self) -> np.ndarray:
+        """For every accepted row, how many other accepted reservations of the same router overlap it."""
+        rows = self.accepted
+        result = np.zeros(len(rows), dtype=np.int64)
+        order, groups = _groups(rows["node"])
+        starts, ends = rows["start_time"][order], rows["end_time"][order]
+        for _, lo, hi in groups:
+            mine = order[lo:hi]
+            # started before my end, minus ended at or before my start, minus myself
+            result[mine] = np.searchsorted(np.sort(starts[lo:hi]), ends[lo:hi], side="left") \
+                - np.searchsorted(np.sort(ends[lo:hi]), starts[lo:hi], side="right") - 1
+        return result
+
+    def active(self, start_time: float, end_time: float, node: Optional[str] = None) -> pd.DataFrame:
+        """Accepted rows whose interval intersects [start_time, end_time)."""
+        rows = self.rows
+        mask = (rows["status"] == ACCEPTED) & (rows["start_time"] < end_time) & (rows["end_time"] > start_time)
+        if node is not None:
+            mask &= rows["node"] == self._code(node)
+        return self.to_frame()[mask]
+
+    def requests(self) -> np.ndarray:
+        """One row per request: its initiator's row if approved, the rejecting router's row otherwise."""
+        rows = self.rows
+        return rows[(rows["status"] == REJECTED) | (rows["node"] == rows["initiator"])]
+
+    def rejection_rate(self, by: Optional[str] = None, bins: Union[None, int, np.ndarray] = None) -> pd.DataFrame:
+        """Requests, rejections and their ratio, overall, per ``initiator`` / ``responder`` and / or time bin.
+
+        Args:
+            by (str): "initiator" or "responder" to split by router.
+            bins (int | np.ndarray): number of time bins, or their edges (ps), over the decision time.
+        """
+        requests = self.requests()
+        groups = {}
+        if by is not None:
+            if by not in ("initiator", "responder"):
+                raise ValueError("by must be 'initiator' or 'responder'")
+            groups[by] = requests[by]
+        if bins is not None:
+            edges = np.histogram_bin_edges(requests["time"], bins) if np.isscalar(bins) else np.asarray(bins)
+            groups["bin"] = np.clip(np.searchsorted(edges, requests["time"], side="right") - 1, 0, len(edges) - 2)
+        keys = np.zeros(len(requests), dtype=np.int64)
+        sizes = []
+        for values in groups.values():
+            size = int(values.max()) + 1 if len(values) else 1
+            keys = keys * size + values
+            sizes.append(size)
+        unique, inverse = np.unique(keys, return_inverse=True)
+        total = np.bincount(inverse, minlength=len(unique))
+        rejected = np.bincount(inverse, requests["status"] == REJECTED, minlength=len(unique)).astype(np.int64)
+        table = pd.DataFrame({"requests": total, "rejected": rejected, "rejection_rate": rejected / total})
+        for name, size in reversed(list(zip(groups, sizes))):
+            values, unique = unique % size, unique // size
+            if name == "bin":
+                table.insert(0, "bin_start", edges[values])
+            else:
+                table.insert(0, name, [self.names[code] for code in values.tolist()])
+        return table
+
+    def link_load(self) -> pd.DataFrame:
+        """Per link of the approved paths: reservations, memory-time (memory pairs x s) and peak pairs reserved."""
+        links = self.links
+        num_names = max(len(self.names), 1)
+        first, second = np.minimum(links["node1"], links["node2"]), np.maximum(links["node1"], links["node2"])
+        keys = first.astype(np.int64) * num_names + second
+        unique, inverse = np.unique(keys, return_inverse=True)
+        size = links["memory_size"].astype(np.int64)
+        duration = (links["end_time"] - links["start_time"]) * 1e-12
+        # peak: sweep over the starts and ends of every link
+        key2 = np.concatenate([inverse, inverse])
+        time2 = np.concatenate([links["start_time"], links["end_time"]])
+        delta = np.concatenate([size, -size])
+        order = _sweep_order(key2, time2, delta)
+        key2, delta = key2[order], delta[order]
+        used = np.cumsum(delta)
+        starts = np.flatnonzero(np.r_[True, key2[1:] != key2[:-1]]) if len(key2) else np.array([], dtype=np.int64)
+        used = used - np.repeat(used[starts] - delta[starts], np.diff(np.append(starts, len(key2))))
+        peak = np.maximum.reduceat(used, starts) if len(starts) else np.array([], dtype=np.int64)
+        return pd.DataFrame({
+            "node1": [self.names[code] for code in (unique // num_names).tolist()],
+            "node2": [self.names[code] for code in (unique % num_names).tolist()],
+            "reservations": np.bincount(inverse, minlength=len(unique)),
+            "memory_time": np.bincount(inverse, size * duration, minlength=len(unique)),
+            "peak_pairs": peak,
+        })
@@ -0,0 +1,164 @@
+"""Content-addressed on-disk cache of simulation results.
+
+A run is identified by the SHA-256 of its normalized configuration: the
+scenario function, every argument after defaults are filled in (topology,
+physical parameters, seed, ...), the installed SeQUeNCe version and
+``CACHE_FORMAT``. Each entry is a small JSON file named after its key.
+Reading an entry refreshes its modification time, and once the directory
+grows past ``max_bytes`` the least recently used entries are deleted.
+"""
+
+import hashlib
+import inspect
+import json
+import os
+import tempfile
+from importlib.metadata import PackageNotFoundError, version
+from typing import Any, Callable, Optional
+
+import numpy as np
+
+# bump to invalidate every entry written by an older layout of the results
+CACHE_FORMAT = 2  # 2: node, app and attack seeds from separate streams
+
+def sequence_version() -> str:
+    try:
+        return version("sequence")
+    except PackageNotFoundError:
+        return "unknown"
+
+def normalize(value: Any) -> Any:
+    """JSON-compatible, order-independent form of a configuration value."""
+    if isinstance(value, dict):
+        return {str(key): normalize(value[key]) for key in sorted(value, key=str)}
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [normalize(item) for item in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, float) and value.is_integer():
+        return int(value)  # 2000 and 2000.0 are the same configuration
+    return value
+
+def call_config(func: Callable, params: dict) -> dict:
+    """Every argument ``func`` would run with, defaults included."""
+    bound = inspect.signature(func).bind(**params)
+    bound.apply_defaults()
+    arguments = dict(bound.arguments)
+    arguments.update(arguments.pop("kwargs", {}))
+    return {"func": f"{func.__module__}.{func.__qualname__}", "params": arguments}
+
+def config_hash(config: Any) -> str:
+    text = json.dumps(normalize(config), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(text.encode()).hexdigest()
+
+def result_key(func: Callable, params: dict) -> str:
+    """Key of the result of ``func(**params)`` with the installed SeQUeNCe and ``CACHE_FORMAT``."""
+    config = call_config(func, params)
+    config["sequence"] = sequence_version()
+    config["format"] = CACHE_FORMAT
+    return config_hash(config)
+
+
+class ResultCache:
+    """Size-bounded LRU cache of metric dicts keyed by configuration hash.
+
+    Attributes:
+        directory (str): where entries are stored.
+        max_bytes (int): size the directory is trimmed back to after a write.
+        hits (int): lookups answered from disk.
+        misses (int): lookups that had to run the simulation.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 256 * 2 ** 20):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        self._size = self._scan()[1]
+
+    def key(self, func: Callable, params: dict) -> str:
+        return result_key(func, params)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ".json")
+
+    def get(self, key: str) -> Optional[dict]:
+        path = self._path(key)
+        try:
+            with open(path) as fh:
+                entry = json.load(fh)
+            os.utime(path)  # mark as recently used
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry["result"]
+
+    def put(self, key: str, result: dict, config: Optional[dict] = None) -> None:
+        entry = {"result": normalize(result), "config": normalize(config)}
+        # write to a temporary file first so readers never see half an entry
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as fh:
+            json.dump(entry, fh)
+        path = self._path(key)
+        try:
+            # an entry written again replaces the old file, whose bytes no longer count
+            self._size -= os.path.getsize(path)
+        except FileNotFoundError:
+            pass
+        self._size += os.path.getsize(tmp)
+        os.replace(tmp, path)
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def call(self, func: Callable[..., dict], **params) -> dict:
+        """``func(**params)``, answered from the cache when possible."""
+        key = self.key(func, params)
+        result = self.get(key)
+        if result is not None:
+            return result
+        result = func(**params)
+        self.put(key, result, call_config(func, params))
+        return result
+
+    def invalidate(self, func: Callable, **params) -> bool:
+        """Drops the entry of one configuration; returns whether it existed."""
+        path = self._path(self.key(func, params))
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except FileNotFoundError:
+            return False
+        self._size -= size
+        return True
+
+    def clear(self) -> None:
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                os.remove(os.path.join(self.directory, name))
+        self._size = 0
+
+    def _scan(self) -> tuple:
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith(".json"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries, sum(size for _, size, _ in entries)
+
+    def evict(self) -> None:
+        """Deletes least recently used entries until the cache fits in ``max_bytes``."""
+        # rescan: other processes may be writing to the same directory
+        entries, total = self._scan()
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._size = total
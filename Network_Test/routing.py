@@ -0,0 +1,290 @@
+"""Forwarding tables from link costs, kept up to date edge by edge.
+
+build_network routes on hop count unless given edge weights, and
+``Network.reroute`` recomputes every destination whose shortest-path tree
+crosses a changed edge, or all of them when a weight drops. ``link_costs``
+gives every edge a cost from its hardware: the expected number of
+generation attempts of one pair (memory and detector efficiencies, channel
+loss, swapping success) plus a fidelity term, ``-log`` of the raw fidelity
+times the swapping degradation, which adds up along a path as SeQUeNCe
+multiplies fidelities when swapping. ``DynamicRouting`` solves all pairs
+once, installs the tables in bulk and then, for every changed edge, repairs
+only the routes it affects: after an increase the routers whose route
+crossed the edge are re-attached to the rest of the tree, after a decrease
+the improvement is propagated from the edge outwards (Ramalingam-Reps).
+Attached to a network it replaces ``Network.reroute``, so attacks with
+``reroute`` use it::
+
+    routing = DynamicRouting(network, link_costs(network))
+    routing.attach()
+"""
+
+import heapq
+from typing import Optional
+
+import numpy as np
+
+from topology_builder import TIE_BREAK, Network, next_hop_matrix
+
+# relative change under which a route cost counts as unchanged (float sums in another order)
+TOLERANCE = 1e-12
+
+def _memory_params(router) -> tuple:
+    memory = router.get_components_by_type("MemoryArray")[0].memories[0]
+    return memory.efficiency, memory.raw_fidelity
+
+def link_costs(network: Network, fidelity_weight: float = 1.0) -> np.ndarray:
+    """Routing cost of every edge: expected attempts per pair plus ``fidelity_weight`` times the fidelity loss.
+
+    An attempt of the two-round (Barrett-Kok) generation succeeds with
+    probability ``1/2 * eta_u * eta_v``, where ``eta`` of an end is the
+    memory efficiency times the transmission of its channel times the
+    detector efficiency; the attempts are divided by the swapping success
+    rate of the ends. Attacks scale these costs as they scale attempts.
+
+    Args:
+        network (Network): network whose hardware parameters are read.
+        fidelity_weight (float): weight of ``-log(raw fidelity * swapping degradation)``.
+
+    Returns:
+        np.ndarray: one cost per edge, np.inf for edges that can never succeed.
+    """
+    costs = np.empty(len(network.edges))
+    for k, (u, v) in enumerate(network.edges.tolist()):
+        detectors = network.bsm_nodes[k].get_components_by_type("SingleAtomBSM")[0].detectors
+        detector = np.mean([detector.efficiency for detector in detectors])
+        probability, fidelity, swapping, degradation = 0.5, 1.0, 1.0, 1.0
+        for router, qc in zip((network.routers[u], network.routers[v]), network.edge_channels(k)):
+            efficiency, raw_fidelity = _memory_params(router)
+            transmission = 10 ** (qc.distance * qc.attenuation / -10)
+            probability *= efficiency * transmission * detector
+            fidelity = min(fidelity, raw_fidelity)
+            # each end swaps the pair on half of the routes through it
+            rsvp = router.network_manager.protocol_stack[1]
+            swapping *= np.sqrt(rsvp.es_succ_prob)
+            degradation *= np.sqrt(rsvp.es_degradation)
+        success = probability * swapping
+        if success <= 0 or fidelity <= 0:
+            costs[k] = np.inf
+        else:
+            costs[k] = 1 / success + fidelity_weight * -np.log(fidelity * degradation)
+    return costs
+
+
+class DynamicRouting:
+    """All-pairs routes of a network, repaired incrementally when edge weights change.
+
+    Every edge (u, v) is two arcs, u -> v at its weight and v -> u at its
+    weight times ``1 + TIE_BREAK``, as in ``next_hop_matrix``, so repaired
+    routes cost what a full solve gives. The next hops are only the same where
+    the shortest route is unique: with tied costs (hop count, or identical
+    hardware on every link) the repair keeps or picks any one of the equal
+    routes, whereas the full solve takes whichever Dijkstra settles first.
+    Forwarding stays loop-free either way, since every route follows a
+    shortest-path tree of the current weights.
+
+    Attributes:
+        network (Network): network whose ``weights`` and ``next_hop`` are kept current.
+        distance (np.ndarray): ``distance[i, j]`` cost of the route from router i to router j.
+        updated_destinations (int): destinations repaired so far.
+        updated_routers (int): (router, destination) routes recomputed so far.
+    """
+
+    def __init__(self, network: Network, weights: Optional[np.ndarray] = None):
+        self.network = network
+        num_routers = len(network.routers)
+        edges = network.edges
+        self._heads = np.concatenate([edges[:, 1], edges[:, 0]])
+        self._tails = np.concatenate([edges[:, 0], edges[:, 1]])
+        self._out = [[] for _ in range(num_routers)]  # router -> (head, arc) of the arcs leaving it
+        self._in = [[] for _ in range(num_routers)]   # router -> (tail, arc) of the arcs entering it
+        for arc, (tail, head) in enumerate(zip(self._tails.tolist(), self._heads.tolist())):
+            self._out[tail].append((head, arc))
+            self._in[head].append((tail, arc))
+        self.updated_destinations = 0
+        self.updated_routers = 0
+        self.install(network.weights if weights is None else weights)
+
+    def _arc_costs(self, weights: np.ndarray) -> np.ndarray:
+        return np.concatenate([weights, weights * (1 + TIE_BREAK)])
+
+    def install(self, weights: np.ndarray) -> None:
+        """Solves all pairs for ``weights`` and writes every forwarding table."""
+        network = self.network
+        network.weights = np.asarray(weights, dtype=float).copy()
+        next_hop, self.distance = next_hop_matrix(len(network.routers), network.edges, network.weights,
+                                                  return_distances=True)
+        self._cost = self._arc_costs(network.weights).tolist()
+        network.install_forwarding_tables(next_hop)
+
+    def attach(self) -> None:
+        """Makes ``network.reroute`` (used by attacks) go through this object."""
+        self.network.reroute = self.update
+
+    def detach(self) -> None:
+        del self.network.reroute
+
+    def update(self, weights: np.ndarray) -> int:
+        """Moves the routes to new edge weights, one changed edge at a time.
+
+        Entries towards destinations that became unreachable are left as they
+        were, as in ``Network.reroute``.
+
+        Returns:
+            int: number of forwarding entries changed.
+        """
+        network = self.network
+        weights = np.asarray(weights, dtype=float)
+        changed = np.flatnonzero(weights != network.weights)
+        if len(changed) == 0:
+            return 0
+        before = network.next_hop.copy()
+        num_edges = len(network.edges)
+        cost = self._arc_costs(weights).tolist()
+        for edge in changed.tolist():
+            for arc in (edge, edge + num_edges):
+                old, new = self._cost[arc], cost[arc]
+                self._cost[arc] = new
+                if new > old:
+                    self._increase(arc)
+                else:
+                    self._decrease(arc)
+        network.weights = weights.copy()
+
+        names = [router.name for router in network.routers]
+        sources, destinations = np.nonzero((network.next_hop != before) & (network.next_hop >= 0))
+        next_hop = network.next_hop
+        for i, j in zip(sources.tolist(), destinations.tolist()):
+            table = network.routers[i].network_manager.protocol_stack[0].forwarding_table
+            table[names[j]] = names[next_hop[i, j]]
+        return len(sources)
+
+    def _increase(self, arc: int) -> None:
+        """Routes through a worse arc tail -> head: re-attach the subtree hanging from it, per destination."""
+        tail, head = int(self._tails[arc]), int(self._heads[arc])
+        next_hop, distance = self.network.next_hop, self.distance
+        destinations = np.flatnonzero(next_hop[tail] == head)
+        if len(destinations) == 0:
+            return
+        # routers whose route reaches each destination through tail -> head, by pointer jumping on all at once
+        routers = np.arange(len(next_hop))[:, None]
+        pointer = next_hop[:, destinations]
+        pointer = np.where(pointer >= 0, pointer, routers)
+        hanging = np.zeros(pointer.shape, dtype=bool)
+        hanging[tail] = True
+        while True:
+            hanging |= np.take_along_axis(hanging, pointer, axis=0)
+            jumped = np.take_along_axis(pointer, pointer, axis=0)
+            if np.array_equal(jumped, pointer):
+                break
+            pointer = jumped
+        for column, destination in enumerate(destinations.tolist()):
+            hops, costs = next_hop[:, destination], distance[:, destination]
+            members = np.flatnonzero(hanging[:, column]).tolist()
+            member = set(members)
+            outside = {}
+            # best way out of the subtree for each of its routers, then Dijkstra inside it
+            heap = []
+            for router in members:
+                best, hop = np.inf, -1
+                for neighbour, out in self._out[router]:
+                    if neighbour not in member:
+                        if neighbour not in outside:
+                            outside[neighbour] = float(costs[neighbour])
+                        candidate = self._cost[out] + outside[neighbour]
+                        if candidate < best:
+                            best, hop = candidate, neighbour
+                heap.append((best, router, hop))
+            heap = [entry for entry in heap if entry[0] < np.inf]
+            heapq.heapify(heap)
+            settled = self._settle(heap, {router: np.inf for router in members})
+            costs[members], hops[members] = np.inf, -1
+            if settled:
+                changed = list(settled)
+                costs[changed] = [settled[router][0] for router in changed]
+                hops[changed] = [settled[router][1] for router in changed]
+            self.updated_destinations += 1
+            self.updated_routers += len(members)
+
+    def _decrease(self, arc: int) -> None:
+        """Routes through a better arc tail -> head: spread the improvement from tail, per destination."""
+        tail, head = int(self._tails[arc]), int(self._heads[arc])
+        next_hop, distance = self.network.next_hop, self.distance
+        improved = self._cost[arc] + distance[head] < distance[tail] * (1 - TOLERANCE)
+        improved[tail] = False
+        for destination in np.flatnonzero(improved).tolist():
+            hops, costs = next_hop[:, destination], distance[:, destination]
+            settled = self._settle([(self._cost[arc] + float(costs[head]), tail, head)], costs)
+            changed = list(settled)
+            costs[changed] = [settled[router][0] for router in changed]
+            hops[changed] = [settled[router][1] for router in changed]
+            self.updated_destinations += 1
+            self.updated_routers += len(changed)
+
+    def _settle(self, heap: list, costs) -> dict:
+        """Dijkstra towards one destination, from (cost, router, next hop) entries, along the arcs entering
+        settled routers. Only routers whose cost ``costs`` (array, or dict restricting the search) improves
+        are reached; returns their (cost, next hop)."""
+        within = costs if isinstance(costs, dict) else None
+        settled = {}
+        best = {}
+        while heap:
+            cost, router, hop = heapq.heappop(heap)
+            if router in settled:
+                continue
+            settled[router] = (cost, hop)
+            for previous, arc in self._in[router]:
+                if previous in settled:
+                    continue
+                if within is not None:
+                    if previous not in within:
+                        continue
+                    current = best.get(previous, within[previous])
+                else:
+                    current = best.get(previous)
+                    if current is None:
+                        current = float(costs[previous])
+                candidate = self._cost[arc] + cost
+                if candidate < current * (1 - TOLERANCE):
+                    best[previous] = candidate
+                    heapq.heappush(heap, (candidate, previous, router))
+        return settled
+
+    def set_edge(self, edge: int, weight: float) -> int:
+        """Changes the weight of one edge (np.inf removes it)."""
+        weights = self.network.weights.copy()
+        weights[edge] = weight
+        return self.update(weights)
+
+    def remove_router(self, index: int) -> int:
+        """Stops routing through a router by removing all its edges."""
+        weights = self.network.weights.copy()
+        weights[(self.network.edges == index).any(axis=1)] = np.inf
+        return self.update(weights)
+
+
+def install_routing(network: Network, fidelity_weight: float = 1.0) -> DynamicRouting:
+    """Routes a built network on ``link_costs`` and lets attacks repair the routes incrementally."""
+    routing = DynamicRouting(network, link_costs(network, fidelity_weight))
+    routing.attach()
+    return routing
+
+
+if __name__ == '__main__':
+    import time
+
+    from sequence.kernel.timeline import Timeline
+
+    from topology_builder import build_network, generate_edges
+
+    network = build_network(Timeline(), generate_edges("grid", 400), num_routers=400, memo_size=10)
+    routing = install_routing(network)
+    rng = np.random.default_rng(0)
+    tick = time.time()
+    for edge in rng.choice(len(network.edges), 20, replace=False).tolist():
+        routing.set_edge(edge, np.inf)
+    print("20 edge removals: %.3f s, %d destinations, %d routes repaired"
+          % (time.time() - tick, routing.updated_destinations, routing.updated_routers))
+    tick = time.time()
+    next_hop_matrix(len(network.routers), network.edges, network.weights)
+    print("one all-pairs solve: %.3f s" % (time.time() - tick))
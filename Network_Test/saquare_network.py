@@ -1,12 +1,10 @@
-from matplotlib import pyplot as plt
 import time
-from ipywidgets import interact
 
 # Importing sequence structures
 from sequence.kernel.timeline import Timeline
-from sequence.topology.node import QuantumRouter, BSMNode
-from sequence.components.optical_channel import (QuantumChannel,
-                                             ClassicalChannel)
+from sequence.topology.node import QuantumRouter
+
+from topology_builder import build_network, generate_edges
 
 def mili_to_pico(miliseconds: float) -> float:
     picoseconds = miliseconds * 1e9
@@ -54,6 +52,9 @@ def simulation(sim_time, cc_delay, qc_atten, qc_dist):
     qc_dist: distance of quantum channels (km)
     """
 
+    # plotting is only imported when a figure is drawn
+    from matplotlib import pyplot as plt
+
     # Convert units
     cc_delay = mili_to_pico(cc_delay)
     qc_distance = kilo_to_meter(qc_dist)
@@ -65,91 +66,12 @@ def simulation(sim_time, cc_delay, qc_atten, qc_dist):
 
     ## Create our quantum network
 
-    # Quantum routers
-    # Args: name, timeline, number of quantum memories
-    r0 = QuantumRouter('r0', tl, 50)
-    r1 = QuantumRouter('r1', tl, 100)
-    r2 = QuantumRouter('r2', tl, 50)
-    r3 = QuantumRouter('r3', tl, 100)
-
-    # Create BSM nodes
-    m0 = BSMNode('m0', tl, ['r0', 'r1'])
-    m1 = BSMNode('m1', tl, ['r1', 'r2'])
-    m2 = BSMNode('m2', tl, ['r2', 'r3'])
-    m3 = BSMNode('m3', tl, ['r3', 'r0'])
-
-    # Create connection between router and BSM
-    r0.add_bsm_node(m3.name, r3.name)
-    r0.add_bsm_node(m0.name, r1.name)
-    r1.add_bsm_node(m0.name, r0.name)
-    r1.add_bsm_node(m1.name, r2.name)
-    r2.add_bsm_node(m1.name, r1.name)
-    r2.add_bsm_node(m2.name, r3.name)
-    r3.add_bsm_node(m2.name, r2.name)
-    r3.add_bsm_node(m3.name, r0.name)
-
-    # set seeds for random generators
-    nodes = [r0, r1, r2, r3, m0, m1, m2, m3]
-    for i, node in enumerate(nodes):
-        node.set_seed(i)
-
-    for node in [r0, r1, r2, r3]:
-        memory_array = node.get_components_by_type("MemoryArray")[0]
-        # Update the coherence time (measured in seconds)
-        memory_array.update_memory_params("coherence_time", 10)
-        # Similarly update the fidelity of entanglement of the memories
-        memory_array.update_memory_params("raw_fidelity", raw_fidelity)
-
-    # create all-to-all classical connections
-    for node1 in nodes:
-      for node2 in nodes:
-        if node1 == node2:
-          continue
-        # construct a classical communication channel
-        # Args: name, timeline, length (in m), delay (in ps)
-        cc = ClassicalChannel("cc_%s_%s"%(node1.name, node2.name), tl, 1e3, delay=cc_delay)
-        cc.set_ends(node1, node2.name)
-
-    # Create quantum channels linking r0 and r1 to m0
-    qc0 = QuantumChannel("qc_r0_m0", tl, qc_atten, qc_dist)
-    qc1 = QuantumChannel('qc_r1_m0', tl, qc_atten, qc_dist)
-    qc0.set_ends(r0, m0.name)
-    qc1.set_ends(r1, m0.name)
-    # Create quantum channels linking r1 and r2 to m1
-    qc2 = QuantumChannel('qc_r1_m1', tl, qc_atten, qc_dist)
-    qc3 = QuantumChannel('qc_r2_m1', tl, qc_atten, qc_dist)
-    qc2.set_ends(r1, m1.name)
-    qc3.set_ends(r2, m1.name)
-    # Create quantum channels linking r2 and r3 to m2
-    qc4 = QuantumChannel('qc_r2_m2', tl, qc_atten, qc_dist)
-    qc5 = QuantumChannel('qc_r3_m2', tl, qc_atten, qc_dist)
-    qc4.set_ends(r2, m2.name)
-    qc5.set_ends(r3, m2.name)
-    # Create quantum channels linking r3 and r0 to m3
-    qc6 = QuantumChannel('qc_r3_m3', tl, qc_atten, qc_dist)
-    qc7 = QuantumChannel('qc_r0_m3', tl, qc_atten, qc_dist)
-    qc6.set_ends(r3, m3.name)
-    qc7.set_ends(r0, m3.name)
-
-    # Create routing table manually
-    # This table is based on quantum links
-    # Args: name of destination node and the next node
-    # Router0 routes
-    r0.network_manager.protocol_stack[0].add_forwarding_rule("r1", "r1")
-    r0.network_manager.protocol_stack[0].add_forwarding_rule("r2", "r1")
-    r0.network_manager.protocol_stack[0].add_forwarding_rule("r3", "r3")
-    # Router1 routes
-    r1.network_manager.protocol_stack[0].add_forwarding_rule("r2", "r2")
-    r1.network_manager.protocol_stack[0].add_forwarding_rule("r3", "r2")
-    r1.network_manager.protocol_stack[0].add_forwarding_rule("r0", "r0")
-    # Router2 routes
-    r2.network_manager.protocol_stack[0].add_forwarding_rule("r3", "r3")
-    r2.network_manager.protocol_stack[0].add_forwarding_rule("r0", "r3")
-    r2.network_manager.protocol_stack[0].add_forwarding_rule("r1", "r1")
-    # Router3 routes
-    r3.network_manager.protocol_stack[0].add_forwarding_rule("r0", "r0")
-    r3.network_manager.protocol_stack[0].add_forwarding_rule("r1", "r0")
-    r3.network_manager.protocol_stack[0].add_forwarding_rule("r2", "r2")
+    # Quantum routers, BSM nodes, channels and routing tables of a 4-router ring
+    # Args: timeline, router pairs linked by a BSM node, memories per router
+    network = build_network(tl, generate_edges("ring", 4), memo_size=[50, 100, 50, 100],
+                            cc_delay=cc_delay, qc_atten=qc_atten, qc_dist=qc_distance,
+                            raw_fidelity=raw_fidelity)
+    r0, r1, r2, r3 = network.routers
 
     ## Run simulation
     tl.init()
@@ -193,5 +115,8 @@ def simulation(sim_time, cc_delay, qc_atten, qc_dist):
 
     fig.tight_layout()
 
-interactive_plot = interact(simulation, sim_time=(2000, 4000, 500), cc_delay=(0.1, 1, 0.1), qc_atten=[1e-5, 2e-5, 3e-5], qc_dist=(1, 10, 1))
-interactive_plot
\ No newline at end of file
+if __name__ == '__main__':
+    from ipywidgets import interact
+
+    interactive_plot = interact(simulation, sim_time=(2000, 4000, 500), cc_delay=(0.1, 1, 0.1), qc_atten=[1e-5, 2e-5, 3e-5], qc_dist=(1, 10, 1))
+    interactive_plot
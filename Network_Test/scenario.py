@@ -0,0 +1,318 @@
+"""Headless version of the scenarios in the simulation scripts and notebook.
+
+``run_scenario`` builds the network, makes the entanglement request, runs
+the timeline and returns scalar metrics instead of drawing figures, so it
+can be called from worker processes by the sweep and campaign runners.
+``run_random_request_scenario`` does the same for the RandomRequestApp
+workload of random_request_network.ipynb.
+"""
+
+import os
+import time
+from typing import List, Optional, Union
+
+import numpy as np
+
+# Importing sequence structures
+from sequence.app.random_request import RandomRequestApp
+from sequence.kernel.timeline import Timeline
+from sequence.topology.router_net_topo import RouterNetTopo
+
+from abstraction import LinkAbstraction
+from anomaly import FidelityDetector
+from attacks import schedule_attacks
+from dashboard import stream_network
+from event_trace import TraceRecorder
+from metrics import RAW_FIDELITY, save_run
+from random_node import choiceNode
+from reservations import ReservationLog
+from result_cache import config_hash
+from termination import Termination
+from topology_builder import Network, build_network, generate_edges
+from topology_format import load_router_net_topo
+
+COHERENCE_TIME = 10
+
+STAR_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "Network_Test_ipynb",
+                           "Random_Request_Network", "star_network.json")
+
+# hardware of random_request_network.ipynb (set_parameters)
+MEMO_FREQ = 2e3
+MEMO_EXPIRE = 0
+MEMO_EFFICIENCY = 1
+MEMO_FIDELITY = 0.9349367588934053
+DETECTOR_EFFICIENCY = 0.9
+DETECTOR_COUNT_RATE = 5e7
+DETECTOR_RESOLUTION = 100
+SWAP_SUCC_PROB = 0.90
+SWAP_DEGRADATION = 0.99
+QC_FREQ = 1e11
+
+def mili_to_pico(miliseconds: float) -> float:
+    picoseconds = miliseconds * 1e9
+    return picoseconds
+
+def kilo_to_meter(kilometers: float) -> float:
+    meters = kilometers * 1e3
+    return meters
+
+# independent streams spawned from the root seed of a run, in this order
+SEED_STREAMS = ("node", "app", "attack")
+
+def seed_streams(seed: Optional[int]) -> dict:
+    """The node, app and attack SeedSequences of a run, children of its root ``seed``."""
+    return dict(zip(SEED_STREAMS, np.random.SeedSequence(seed).spawn(len(SEED_STREAMS))))
+
+def node_seeds(seed: Optional[int], num_nodes: int, stream: str = "node") -> list:
+    """Seeds for every node (or app): the index (as in the scripts) or drawn from the ``stream`` of ``seed``."""
+    if seed is None:
+        return list(range(num_nodes))
+    return seed_streams(seed)[stream].generate_state(num_nodes).tolist()
+
+def build_scenario(sim_time: float, cc_delay: float, qc_atten: float, qc_dist: float,
+                   swapping_success_rate: Optional[float] = None, topology: str = "ring",
+                   num_routers: int = 4, memo_size: int = 100, cc_mode: str = "full",
+                   seed: Optional[int] = None, raw_fidelity: float = RAW_FIDELITY,
+                   coherence_time: float = COHERENCE_TIME) -> Network:
+    """Builds the scenario network, in the units of the scripts' simulation().
+
+    Args:
+        sim_time (float): duration of simulation time (ms).
+        cc_delay (float): delay on classical channels (ms).
+        qc_atten (float): attenuation on quantum channels (dB/m).
+        qc_dist (float): distance of quantum channels (km).
+        swapping_success_rate (float): probability of swapping success (default: SeQUeNCe's).
+        topology (str): one of ``topology_builder.TOPOLOGIES``.
+        num_routers (int): number of routers.
+        memo_size (int): memories per router.
+        cc_mode (str): classical connectivity mode.
+        seed (int): root seed of the node generators (default: node index).
+
+    Returns:
+        Network: network attached to a fresh timeline.
+    """
+    tl = Timeline(mili_to_pico(sim_time))
+    edges = generate_edges(topology, num_routers)
+    num_nodes = num_routers + len(edges)
+    network = build_network(tl, edges, num_routers=num_routers, memo_size=memo_size,
+                            cc_delay=mili_to_pico(cc_delay), qc_atten=qc_atten,
+                            qc_dist=kilo_to_meter(qc_dist), raw_fidelity=raw_fidelity,
+                            coherence_time=coherence_time, seeds=node_seeds(seed, num_nodes),
+                            cc_mode=cc_mode)
+    if swapping_success_rate is not None:
+        for router in network.routers:
+            router.network_manager.protocol_stack[1].set_swapping_success_rate(swapping_success_rate)
+    return network
+
+def entanglement_metrics(network: Network, src: int, dst: int, start_time: float) -> dict:
+    """Entangled pairs between two routers, as seen from the source memories."""
+    dst_name = network.routers[dst].name
+    times, fidelities = [], []
+    for info in network.routers[src].resource_manager.memory_manager:
+        if info.state == "ENTANGLED" and info.remote_node == dst_name:
+            times.append(info.entangle_time)
+            fidelities.append(info.fidelity)
+    return {
+        "entangled_pairs": len(times),
+        "mean_fidelity": float(np.mean(fidelities)) if fidelities else float("nan"),
+        # time (s) from the start of the reservation to its first entangled pair
+        "latency": (min(times) - start_time) / 1e12 if times else float("nan"),
+    }
+
+def run_request(network: Network, src: int = 0, dst: int = 2, memory_size: int = 50, fidelity: float = 0.9,
+                start_time: float = 1e12, end_time: float = 1e14, attacks: Optional[List[dict]] = None,
+                termination: Optional[dict] = None, detector: Optional[dict] = None) -> dict:
+    """Makes one request on an initialized network, runs its timeline and measures the result.
+
+    ``termination`` holds the stop conditions of the run (arguments of
+    termination.Termination, e.g. ``{"resolved": True}``); the metrics then
+    say why and when it stopped. ``detector`` holds the arguments of an
+    anomaly.FidelityDetector; the metrics then count its alarms and give its
+    detection latency from the first attack.
+    """
+    tl = network.tl
+    scheduled = schedule_attacks(network, attacks) if attacks else []
+    stream = stream_network(tl, network.routers, [list(node.eg.others) for node in network.bsm_nodes])
+    watcher = Termination(tl, network.routers, **termination) if termination else None
+    anomalies = FidelityDetector(tl, network.routers, **detector) if detector is not None else None
+    metrics = {}
+    try:
+        network.routers[src].network_manager.request(network.routers[dst].name, start_time, end_time,
+                                                     memory_size, fidelity)
+        tick = time.time()
+        tl.run()
+        run_time = time.time() - tick
+        metrics = entanglement_metrics(network, src, dst, start_time)
+        metrics.update({"events": tl.run_counter, "run_time": run_time})
+        if watcher is not None:
+            report = watcher.report()
+            metrics.update({"stop_reason": report["stop_reason"], "stop_time": report["stop_time"]})
+        if anomalies is not None:
+            metrics.update(anomalies.report(min((attack.time for attack in scheduled), default=None)))
+    finally:
+        # each hook puts back what was installed before it, so they come off in reverse order; a run
+        # that raised still ends its stream, so the dashboard stops showing it as running
+        if anomalies is not None:
+            anomalies.close()
+        if watcher is not None:
+            watcher.close()
+        if stream is not None:
+            stream.close(metrics)
+    return metrics
+
+def run_scenario(sim_time: float = 2000, cc_delay: float = 0.1, qc_atten: float = 3e-5, qc_dist: float = 1,
+                 swapping_success_rate: Optional[float] = None, topology: str = "ring", num_routers: int = 4,
+                 memo_size: int = 100, cc_mode: str = "full", src: int = 0, dst: int = 2,
+                 memory_size: int = 50, fidelity: float = 0.9, start_time: float = 1e12,
+                 end_time: float = 1e14, seed: Optional[int] = None,
+                 attacks: Optional[List[dict]] = None, termination: Optional[dict] = None,
+                 detector: Optional[dict] = None, abstraction: Union[str, List[int], None] = None,
+                 memories_dir: Optional[str] = None, trace_dir: Optional[str] = None) -> dict:
+    """Runs one request from router ``src`` to router ``dst`` and returns scalar metrics.
+
+    Units follow simulation(): ms for times and delays, km for distances;
+    start_time and end_time of the reservation are in ps as in
+    ``network_manager.request``. ``attacks`` are attack specs scheduled on
+    the network (see attacks.py) and ``termination`` the conditions that end
+    the run before ``sim_time`` (see termination.py). ``detector`` watches
+    the fidelities for the attacks while the run goes (see anomaly.py). ``abstraction`` ("all"
+    or a list of edge indices) generates the pairs of those links at link
+    level instead of photon by photon (see abstraction.py). With ``memories_dir`` the final memory
+    table of every router is also saved there as ``<config hash>.parquet``,
+    and with ``trace_dir`` the run is recorded to ``<config hash>.trace``
+    (see event_trace.py).
+    """
+    config = {name: value for name, value in locals().items() if name not in ("memories_dir", "trace_dir")}
+    run_id = config_hash(config)
+    tick = time.time()
+    network = build_scenario(sim_time, cc_delay, qc_atten, qc_dist, swapping_success_rate, topology,
+                             num_routers, memo_size, cc_mode, seed)
+    build_time = time.time() - tick
+
+    network.tl.init()
+    links = None
+    if abstraction is not None:
+        links = LinkAbstraction(network, None if abstraction == "all" else abstraction)
+    recorder = None
+    if trace_dir is not None:
+        os.makedirs(trace_dir, exist_ok=True)
+        recorder = TraceRecorder(os.path.join(trace_dir, run_id + ".trace"), network.tl, network.routers)
+    try:
+        metrics = run_request(network, src, dst, memory_size, fidelity, start_time, end_time, attacks,
+                              termination, detector)
+    finally:
+        if recorder is not None:
+            recorder.close()
+        if links is not None:
+            links.close()
+    metrics["build_time"] = build_time
+    if memories_dir is not None:
+        save_run(network.routers, memories_dir, run_id, config)
+    if memories_dir is not None or trace_dir is not None:
+        metrics["run_id"] = run_id  # name of the files written for this run
+    return metrics
+
+def run_attack_scenario(swapping_success_rate: float = 0.05, choice_node: Optional[int] = None,
+                        num_routers: int = 4, seed: Optional[int] = None, **kwargs) -> dict:
+    """The radom_network_attack.py scenario: a request across three consecutive routers.
+
+    ``choiceNode`` picks the attacked triple; the first router requests
+    entanglement with the third one through the middle one. Without an
+    explicit ``choice_node`` the triple is drawn from the attack stream of ``seed``.
+    """
+    rng = np.random.default_rng(seed_streams(seed)["attack"])
+    nodes = list(range(num_routers))
+    src, _, dst = choiceNode(nodes, choice_node, rng)
+    metrics = run_scenario(swapping_success_rate=swapping_success_rate, num_routers=num_routers,
+                           src=src, dst=dst, seed=seed, **kwargs)
+    metrics["choice_node"] = nodes.index(src)
+    return metrics
+
+def set_parameters(routers: list, bsm_nodes: list, qchannels: list, attenuation: float) -> None:
+    """The notebook's set_parameters() for any list of routers, BSM nodes and quantum channels."""
+    for node in routers:
+        memory_array = node.get_components_by_type("MemoryArray")[0]
+        memory_array.update_memory_params("frequency", MEMO_FREQ)
+        memory_array.update_memory_params("coherence_time", MEMO_EXPIRE)
+        memory_array.update_memory_params("efficiency", MEMO_EFFICIENCY)
+        memory_array.update_memory_params("raw_fidelity", MEMO_FIDELITY)
+        node.network_manager.protocol_stack[1].set_swapping_success_rate(SWAP_SUCC_PROB)
+        node.network_manager.protocol_stack[1].set_swapping_degradation(SWAP_DEGRADATION)
+    for node in bsm_nodes:
+        bsm = node.get_components_by_type("SingleAtomBSM")[0]
+        bsm.update_detectors_params("efficiency", DETECTOR_EFFICIENCY)
+        bsm.update_detectors_params("count_rate", DETECTOR_COUNT_RATE)
+        bsm.update_detectors_params("time_resolution", DETECTOR_RESOLUTION)
+    for qc in qchannels:
+        qc.attenuation = attenuation
+        qc.frequency = QC_FREQ
+
+def run_random_request_scenario(sim_time: float = 50e3, qc_atten: float = 1e-5, config: Optional[str] = STAR_CONFIG,
+                                topology: str = "star", num_routers: int = 5, memo_size: int = 50,
+                                seed: Optional[int] = None) -> dict:
+    """The notebook's test(): every router runs a RandomRequestApp towards the others.
+
+    Args:
+        sim_time (float): duration of simulation time (ms).
+        qc_atten (float): attenuation on quantum channels (dB/m).
+        config (str): RouterNetTopo JSON file, or compact topology file (see
+            topology_format.py); with None a ``topology`` network of
+            ``num_routers`` routers with ``memo_size`` memories is built instead.
+        seed (int): root seed of the applications (default: router index, as in the notebook).
+
+    Returns:
+        dict: reservations made and accepted, rate of rejected requests, mean throughput and wait
+        time, events and times.
+    """
+    tick = time.time()
+    if config is not None:
+        topo = load_router_net_topo(config)
+        tl = topo.get_timeline()
+        routers = topo.get_nodes_by_type(RouterNetTopo.QUANTUM_ROUTER)
+        bsm_nodes = topo.get_nodes_by_type(RouterNetTopo.BSM_NODE)
+        qchannels = topo.qchannels
+    else:
+        tl = Timeline()
+        edges = generate_edges(topology, num_routers)
+        network = build_network(tl, edges, num_routers=num_routers, memo_size=memo_size,
+                                seeds=node_seeds(seed, num_routers + len(edges)))
+        routers, bsm_nodes, qchannels = network.routers, network.bsm_nodes, network.qchannels
+    tl.stop_time = mili_to_pico(sim_time)
+    set_parameters(routers, bsm_nodes, qchannels, qc_atten)
+
+    names = [router.name for router in routers]
+    app_seeds = node_seeds(seed, len(routers), "app")
+    apps = []
+    for name, router, app_seed in zip(names, routers, app_seeds):
+        others = [other for other in names if other != name]
+        app = RandomRequestApp(router, others, app_seed,
+                               min_dur=1e13, max_dur=2e13, min_size=10,
+                               max_size=25, min_fidelity=0.8, max_fidelity=1.0)
+        apps.append(app)
+        app.start()
+    log = ReservationLog(routers)
+    build_time = time.time() - tick
+
+    tl.init()
+    stream = stream_network(tl, routers, [list(node.eg.others) for node in bsm_nodes])
+    tick = time.time()
+    tl.run()
+    run_time = time.time() - tick
+    log.close()
+    rejections = log.table().rejection_rate()
+
+    throughputs = [app.get_throughput() for app in apps]
+    wait_times = [wait for app in apps for wait in app.get_wait_time()]
+    metrics = {
+        "reservations": sum(len(app.reserves) for app in apps),
+        "accepted": sum(len(router.network_manager.protocol_stack[1].accepted_reservations) for router in routers),
+        "rejection_rate": float(rejections["rejection_rate"].iloc[0]) if len(rejections) else float("nan"),
+        "mean_throughput": float(np.mean(throughputs)),
+        "mean_wait_time": float(np.mean(wait_times)) if wait_times else float("nan"),
+        "events": tl.run_counter,
+        "build_time": build_time,
+        "run_time": run_time,
+    }
+    if stream is not None:
+        stream.close(metrics)
+    return metrics
@@ -0,0 +1,143 @@
+"""Build and initialize a network once, then run many replicas from it.
+
+Building a scenario (routers, BSM nodes, every classical and quantum
+channel, memory parameters) and ``tl.init()`` cost more than a short run.
+``NetworkSnapshot`` keeps one initialized network in the parent process and
+forks a child per replica: the child starts with the network already in
+memory, shared copy-on-write with the parent, reseeds the node generators,
+makes its own request (and attacks) and sends its metrics back. The parent
+network is never run, so every replica starts from the same state::
+
+    snapshot = NetworkSnapshot.build(sim_time=2000, cc_delay=0.1, qc_atten=3e-5, qc_dist=1)
+    results = snapshot.replicate(run_request, replicas=20, seed=0, dst=2, fidelity=0.9)
+
+A fresh process per replica (instead of a pool) is what keeps the snapshot
+clean: a worker that ran one replica holds a used network. Forking needs a
+POSIX system; a replica run with seed ``s`` gives the same metrics as
+``run_scenario(seed=s)`` with the same parameters.
+"""
+
+import multiprocessing
+import os
+import time
+import traceback
+from multiprocessing.connection import wait
+from typing import Callable, List, Optional, Sequence
+
+import numpy as np
+
+from scenario import build_scenario, node_seeds, run_request
+from topology_builder import Network
+
+def reseed(network: Network, seed: Optional[int]) -> None:
+    """Gives every node of the network the generator build_scenario would have given it for ``seed``."""
+    for node, node_seed in zip(network.nodes, node_seeds(seed, len(network.nodes))):
+        node.set_seed(node_seed)
+
+def replica_seeds(replicas: int, seed: Optional[int] = None) -> List[int]:
+    """Independent root seeds for ``replicas`` runs, spawned from ``seed``."""
+    children = np.random.SeedSequence(seed).spawn(replicas)
+    return [int(child.generate_state(1)[0]) for child in children]
+
+def _run_replica(network: Network, func: Callable, seed: Optional[int], kwargs: dict, conn) -> None:
+    try:
+        reseed(network, seed)
+        result = ("ok", func(network, **kwargs))
+    except BaseException:
+        result = ("error", traceback.format_exc())
+    conn.send(result)
+    conn.close()
+
+
+class NetworkSnapshot:
+    """An initialized network replicas are forked from.
+
+    Attributes:
+        network (Network): the network, ``tl.init()`` already called.
+        setup_time (float): wall time (s) spent building and initializing it.
+    """
+
+    def __init__(self, network: Network, setup_time: float = 0.0):
+        self.network = network
+        self.setup_time = setup_time
+        self._context = multiprocessing.get_context("fork")
+
+    @classmethod
+    def build(cls, **params) -> "NetworkSnapshot":
+        """Snapshot of ``build_scenario(**params)`` after ``tl.init()``."""
+        tick = time.time()
+        network = build_scenario(**params)
+        network.tl.init()
+        return cls(network, time.time() - tick)
+
+    def replicate(self, func: Callable = run_request, seeds: Optional[Sequence[int]] = None,
+                  replicas: Optional[int] = None, seed: Optional[int] = None,
+                  processes: Optional[int] = None, **kwargs) -> List[dict]:
+        """Runs ``func(network, **kwargs)`` once per seed, each in a child forked from the snapshot.
+
+        Args:
+            func (Callable): what a replica does with its network, ``run_request`` by default.
+            seeds (Sequence[int]): root seed of each replica (see node_seeds).
+            replicas (int): number of replicas when ``seeds`` is not given;
+                their seeds are spawned from ``seed``.
+            seed (int): root of the spawned seeds.
+            processes (int): replicas running at once (default: number of CPUs).
+            kwargs: arguments of ``func``, e.g. the request and ``attacks``.
+
+        Returns:
+            List[dict]: what ``func`` returned, in the order of the seeds, with
+            the replica's ``seed`` and ``fork_time`` (s) added when it is a dict.
+        """
+        if seeds is None:
+            if replicas is None:
+                raise ValueError("give either seeds or replicas")
+            seeds = replica_seeds(replicas, seed)
+        seeds = list(seeds)
+        processes = processes or os.cpu_count() or 1
+        results = [None] * len(seeds)
+        running = {}  # connection -> (replica, process, fork time)
+        pending = iter(enumerate(seeds))
+        errors = []
+
+        def start(replica: int, replica_seed: int) -> None:
+            receiver, sender = self._context.Pipe(duplex=False)
+            tick = time.time()
+            process = self._context.Process(target=_run_replica,
+                                            args=(self.network, func, replica_seed, kwargs, sender))
+            process.start()
+            sender.close()
+            running[receiver] = (replica, process, time.time() - tick)
+
+        for replica, replica_seed in pending:
+            start(replica, replica_seed)
+            if len(running) >= processes:
+                break
+        while running:
+            for conn in wait(list(running)):
+                replica, process, fork_time = running.pop(conn)
+                try:
+                    status, value = conn.recv()
+                except EOFError:
+                    status, value = "error", "replica exited with code %s" % process.exitcode
+                conn.close()
+                process.join()
+                if status == "ok":
+                    if isinstance(value, dict):
+                        value = {**value, "seed": seeds[replica], "fork_time": fork_time}
+                    results[replica] = value
+                else:
+                    errors.append((seeds[replica], value))
+                following = next(pending, None)
+                if following is not None:
+                    start(*following)
+        if errors:
+            seed, message = errors[0]
+            raise RuntimeError("%d replicas failed, first (seed %s):\n%s" % (len(errors), seed, message))
+        return results
+
+
+if __name__ == '__main__':
+    snapshot = NetworkSnapshot.build(sim_time=1500, cc_delay=0.1, qc_atten=3e-5, qc_dist=1, memo_size=50)
+    print("setup: %.3f s" % snapshot.setup_time)
+    for result in snapshot.replicate(replicas=4, seed=0, memory_size=25):
+        print(result)
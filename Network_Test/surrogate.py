@@ -0,0 +1,223 @@
+"""Closed-form estimate of what ``run_scenario`` will produce, for thousands of points at once.
+
+The model follows the rules SeQUeNCe's RSVP installs along a path:
+
+* every link generates pairs at ``raw_fidelity``; an attempt succeeds when
+  both rounds of the two-round protocol detect a photon
+  (``(efficiency * transmissivity * detector_efficiency) ** 2 / 2``) and
+  takes two round trips of photon and classical message;
+* pairs below the requested fidelity are purified with BBPSSW, which keeps
+  one of two pairs with probability ``purification_success(F)``;
+* intermediate routers swap purified segments with ``swapping_success_rate``
+  and ``f1 * f2 * degradation``, and the result is purified again;
+* a waiting pair is lost when its memory expires (``coherence_time``); in
+  SeQUeNCe 0.6.4 memories expire but do not lose fidelity, so decoherence
+  only lowers the rate.
+
+Only ratios between configurations are meant to be right: ``Surrogate.calibrate``
+fits the rate scale against real runs (sweep tables), after which ``screen``
+drops or reorders sweep points before any DES time is spent on them.
+"""
+
+import inspect
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from scenario import COHERENCE_TIME, RAW_FIDELITY, run_scenario
+from topology_builder import generate_edges, next_hop_matrix
+
+# SeQUeNCe defaults of the hardware build_network does not configure
+MEMORY_EFFICIENCY = 1
+MEMORY_FREQUENCY = 8e7
+DETECTOR_EFFICIENCY = 0.9
+LIGHT_SPEED = 2e8                # m/s in fiber
+SWAPPING_DEGRADATION = 0.95
+MAX_PURIFICATION_ROUNDS = 16
+# run_scenario arguments that decide the route of the request
+ROUTE_ARGUMENTS = ("topology", "num_routers", "src", "dst")
+
+def improved_fidelity(fidelity: np.ndarray) -> np.ndarray:
+    """BBPSSW output fidelity of two pairs of the same fidelity (as in SeQUeNCe)."""
+    f, e = fidelity, (1 - fidelity) / 3
+    return (f ** 2 + e ** 2) / purification_success(fidelity)
+
+def purification_success(fidelity: np.ndarray) -> np.ndarray:
+    f, e = fidelity, (1 - fidelity) / 3
+    return f ** 2 + 2 * f * e + 5 * e ** 2
+
+def purify(fidelity: np.ndarray, cost: np.ndarray, target: np.ndarray) -> tuple:
+    """Purifies until ``target`` is reached, multiplying the cost in raw pairs.
+
+    Pairs that can not reach the target (BBPSSW only improves F > 0.5) get
+    an infinite cost and keep their fidelity.
+    """
+    fidelity, cost = fidelity.copy(), cost.copy()
+    for _ in range(MAX_PURIFICATION_ROUNDS):
+        below = fidelity < target
+        if not below.any():
+            break
+        improved = improved_fidelity(fidelity)
+        useful = below & (improved > fidelity)
+        cost = np.where(useful, 2 * cost / purification_success(fidelity), cost)
+        cost = np.where(below & ~useful, np.inf, cost)
+        fidelity = np.where(useful, improved, fidelity)
+    return fidelity, np.where(fidelity < target, np.inf, cost)
+
+def predict(qc_atten=3e-5, qc_dist=1, cc_delay=0.1, hops=2, swapping_success_rate=1.0,
+            swapping_degradation=SWAPPING_DEGRADATION, raw_fidelity=RAW_FIDELITY, coherence_time=COHERENCE_TIME,
+            memory_size=50, fidelity=0.9, window=1e3, detector_efficiency=DETECTOR_EFFICIENCY,
+            memory_efficiency=MEMORY_EFFICIENCY, memory_frequency=MEMORY_FREQUENCY,
+            rate_scale=1.0) -> Dict[str, np.ndarray]:
+    """Predicted rate and fidelity of end-to-end pairs; every argument may be an array.
+
+    Args follow run_scenario (ms, km, dB/m, s); ``hops`` is the number of
+    links between the two routers (np.inf when they are not connected), ``fidelity`` the requested fidelity and
+    ``window`` the time (ms) between the reservation start and the end of the
+    simulation.
+
+    Returns:
+        Dict[str, np.ndarray]: ``rate`` (pairs/s), ``fidelity`` of the delivered
+        pairs, ``pairs`` expected at the end of the window (at most
+        ``memory_size``) and ``latency`` (s) of the first pair.
+    """
+    args = np.broadcast_arrays(*(np.asarray(value, dtype=float) for value in (
+        qc_atten, qc_dist, cc_delay, hops, swapping_success_rate, swapping_degradation, raw_fidelity,
+        coherence_time, memory_size, fidelity, window, detector_efficiency, memory_efficiency,
+        memory_frequency, rate_scale)))
+    (atten, dist, cc, hops, q, degradation, raw, coherence, size, target, window, det_eff, mem_eff,
+     frequency, rate_scale) = args
+    connected = np.isfinite(hops)
+    hops = np.where(connected, hops, 1)
+
+    # one link: router -> BSM node -> router, qc_dist on each side
+    distance = dist * 1e3
+    transmissivity = 10 ** (-atten * distance / 10)
+    p_round = mem_eff * transmissivity * det_eff
+    p_attempt = p_round ** 2 / 2
+    attempt_time = 2 * (distance / LIGHT_SPEED + cc * 1e-3) + 2 / frequency
+    link_rate = size * p_attempt / attempt_time * rate_scale  # raw pairs/s on one link
+
+    # memories of a pair waiting for the next one expire after coherence_time
+    wait = 1 / np.maximum(link_rate, 1e-300)
+    survival = np.where(coherence > 0, np.exp(-wait / np.where(coherence > 0, coherence, 1)), 1.0)
+    link_rate = link_rate * survival
+
+    link_fidelity, link_cost = purify(raw, np.where(connected, 1.0, np.inf), target)
+    seg_fidelity, seg_cost = link_fidelity, link_cost
+    for hop in range(2, int(hops.max()) + 1):
+        longer = hops >= hop
+        swapped_fidelity = seg_fidelity * link_fidelity * degradation
+        swapped_cost = (seg_cost + link_cost) / np.maximum(q, 1e-300)
+        swapped_fidelity, swapped_cost = purify(swapped_fidelity, swapped_cost, target)
+        seg_fidelity = np.where(longer, swapped_fidelity, seg_fidelity)
+        seg_cost = np.where(longer, swapped_cost, seg_cost)
+
+    # links work in parallel, each supplies its share of the raw pairs
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        rate = np.where(np.isfinite(seg_cost), link_rate * np.maximum(hops, 1) / seg_cost, 0.0)
+        latency = np.where(rate > 0, 1 / rate, np.inf)
+    pairs = np.minimum(size, rate * window * 1e-3)
+    return {"rate": rate, "fidelity": seg_fidelity, "pairs": pairs, "latency": latency}
+
+def route_hops(points: pd.DataFrame) -> np.ndarray:
+    """Links on the shortest route from ``src`` to ``dst`` of every point, in its ``topology``.
+
+    Columns the points do not have take run_scenario's defaults; routers that
+    are not connected get np.inf.
+    """
+    defaults = inspect.signature(run_scenario).parameters
+    routes = pd.DataFrame({name: points[name].fillna(defaults[name].default) if name in points
+                           else defaults[name].default for name in ROUTE_ARGUMENTS}, index=points.index)
+    hops = np.empty(len(routes))
+    for (topology, num_routers, src, dst), rows in routes.groupby(list(ROUTE_ARGUMENTS), sort=False).indices.items():
+        num_routers = int(num_routers)
+        _, distance = next_hop_matrix(num_routers, generate_edges(topology, num_routers),
+                                      destinations=np.array([int(dst)]), return_distances=True)
+        # the reverse direction of an edge costs 1 + TIE_BREAK
+        hops[rows] = np.round(distance[int(src), 0])
+    return hops
+
+
+class Surrogate:
+    """``predict`` with calibrated parameters and the fixed arguments of a sweep.
+
+    Attributes:
+        fixed (dict): arguments of ``predict`` shared by every point.
+        rate_scale (float): factor on the link rate fitted by ``calibrate``.
+        calibration_error (float): median |log10| error of the calibrated latency.
+    """
+
+    def __init__(self, fixed: Optional[dict] = None, rate_scale: float = 1.0):
+        self.fixed = fixed or {}
+        self.rate_scale = rate_scale
+        self.calibration_error = float("nan")
+
+    def predict(self, points: pd.DataFrame) -> pd.DataFrame:
+        # sweep points override the fixed arguments; arguments predict() does not model are ignored
+        fixed = {name: value for name, value in self.fixed.items() if name not in points and np.isscalar(value)}
+        points = points.assign(**fixed)
+        params = {"rate_scale": self.rate_scale}
+        defaults = inspect.signature(predict).parameters
+        for name in points.columns:
+            if name in defaults:
+                # None (e.g. swapping_success_rate) means the default value
+                params[name] = pd.to_numeric(points[name]).fillna(defaults[name].default).to_numpy(dtype=float)
+        if "hops" not in params:
+            params["hops"] = route_hops(points)
+        if "sim_time" in points and "window" not in params:
+            # run_scenario reserves from 1 s (start_time=1e12 ps) to the end of the simulation
+            params["window"] = np.maximum(points["sim_time"].to_numpy(dtype=float) - 1e3, 0)
+        predicted = predict(**params)
+        return pd.DataFrame({"predicted_" + name: np.broadcast_to(value, (len(points),))
+                             for name, value in predicted.items()}, index=points.index)
+
+    def calibrate(self, runs: pd.DataFrame) -> "Surrogate":
+        """Fits ``rate_scale`` so predicted first-pair latencies match the runs.
+
+        ``runs`` is a sweep table (parameters plus run_scenario metrics); rows
+        without an entangled pair carry no latency and are ignored.
+        """
+        observed = runs["latency"].to_numpy(dtype=float)
+        self.rate_scale = 1.0
+        predicted = self.predict(runs)["predicted_latency"].to_numpy()
+        usable = np.isfinite(observed) & (observed > 0) & np.isfinite(predicted) & (predicted > 0)
+        if not usable.any():
+            raise ValueError("no run with an entangled pair to calibrate against")
+        log_ratio = np.log10(predicted[usable] / observed[usable])
+        self.rate_scale = float(10 ** np.median(log_ratio))
+        self.calibration_error = float(np.median(np.abs(log_ratio - np.median(log_ratio))))
+        return self
+
+    def screen(self, points: List[dict], min_pairs: float = 1, min_fidelity: float = 0.9,
+               order: str = "boundary") -> pd.DataFrame:
+        """Predictions for sweep points, with a ``keep`` column and the most useful points first.
+
+        Args:
+            points (List[dict]): sweep points.
+            min_pairs (float): points predicted to end with fewer pairs are dropped.
+            min_fidelity (float): points predicted to deliver lower fidelity are dropped.
+            order (str): "boundary" puts the kept points closest to ``min_pairs``
+                first (where the threshold is decided), "rate" the fastest first.
+
+        Returns:
+            pd.DataFrame: the points and their predictions, sorted.
+        """
+        table = pd.DataFrame.from_records(points)
+        table = table.join(self.predict(table))
+        table["keep"] = (table["predicted_pairs"] >= min_pairs) & (table["predicted_fidelity"] >= min_fidelity)
+        if order == "boundary":
+            distance = np.abs(np.log10(np.maximum(table["predicted_pairs"], 1e-12) / min_pairs))
+        elif order == "rate":
+            distance = -table["predicted_rate"]
+        else:
+            raise ValueError("order must be 'boundary' or 'rate'")
+        table["priority"] = distance
+        return table.sort_values(["keep", "priority"], ascending=[False, True], kind="stable")
+
+    def prune(self, points: List[dict], **kwargs) -> List[dict]:
+        """The points ``screen`` keeps, in priority order."""
+        table = self.screen(points, **kwargs)
+        names = list(pd.DataFrame.from_records(points).columns)
+        return table.loc[table["keep"], names].to_dict("records")
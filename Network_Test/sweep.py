@@ -0,0 +1,139 @@
+"""Headless parameter sweeps over ``scenario.run_scenario``.
+
+Replaces clicking through the ``interact(...)`` sliders of
+saquare_network.py: a grid (or a random / Latin-hypercube sample) of
+parameter points is run across a process pool, every point with its own
+seed, and the scalar results are collected into one table with a column
+per parameter and per metric. With a ``journal`` the finished points are
+recorded as they complete and a restarted sweep only runs the others.
+"""
+
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+import dashboard
+from journal import SweepJournal
+from result_cache import ResultCache, call_config, config_hash, result_key
+from scenario import run_scenario
+
+# the ranges explored by the interact() call in saquare_network.py
+SQUARE_GRID = {
+    "sim_time": list(range(2000, 4001, 500)),
+    "cc_delay": [round(0.1 * i, 1) for i in range(1, 11)],
+    "qc_atten": [1e-5, 2e-5, 3e-5],
+    "qc_dist": list(range(1, 11)),
+}
+
+def expand_grid(grid: Dict[str, Sequence]) -> List[dict]:
+    """Every combination of the values in ``grid``, last key varying fastest."""
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+def random_points(bounds: Dict[str, Tuple[float, float]], n: int, seed: Optional[int] = None) -> List[dict]:
+    """``n`` points drawn uniformly inside ``bounds`` ({name: (low, high)})."""
+    rng = np.random.default_rng(seed)
+    names = list(bounds)
+    low, high = np.array([bounds[name] for name in names], dtype=float).T
+    samples = low + rng.random((n, len(names))) * (high - low)
+    return [dict(zip(names, row.tolist())) for row in samples]
+
+def latin_hypercube(bounds: Dict[str, Tuple[float, float]], n: int, seed: Optional[int] = None) -> List[dict]:
+    """``n`` points with exactly one point in each of the n strata of every parameter."""
+    rng = np.random.default_rng(seed)
+    names = list(bounds)
+    low, high = np.array([bounds[name] for name in names], dtype=float).T
+    strata = np.argsort(rng.random((n, len(names))), axis=0)
+    unit = (strata + rng.random((n, len(names)))) / n
+    samples = low + unit * (high - low)
+    return [dict(zip(names, row.tolist())) for row in samples]
+
+def point_seed(seed: Optional[int], point: dict) -> int:
+    """Seed of one sweep point, derived from the root seed and the point itself.
+
+    Points keep their seed when the grid is reordered or extended, so cached
+    results stay valid for every point that did not change.
+    """
+    entropy = np.random.SeedSequence(seed).entropy
+    return int(np.random.SeedSequence([entropy, int(config_hash(point)[:16], 16)]).generate_state(1)[0])
+
+def run_point(task: Tuple[Callable, dict]) -> dict:
+    func, params = task
+    if dashboard.connected():
+        dashboard.set_label(", ".join("%s=%s" % (name, value) for name, value in params.items()
+                                      if name != "seed" and np.isscalar(value)))
+    try:
+        results = func(**params)
+    except Exception as error:  # one broken point must not take the whole sweep down
+        return {"error": repr(error)}
+    return {name: value for name, value in results.items() if np.isscalar(value)}
+
+def run_sweep(points: List[dict], func: Callable[..., dict] = run_scenario, processes: Optional[int] = None,
+              seed: Optional[int] = 0, fixed: Optional[dict] = None,
+              cache: Optional[ResultCache] = None, monitor=None,
+              journal: Union[str, SweepJournal, None] = None) -> pd.DataFrame:
+    """Runs ``func`` at every point across a process pool.
+
+    Args:
+        points (List[dict]): keyword arguments of each run.
+        func (Callable): picklable function returning a dict of metrics.
+        processes (int): pool size (default: all cores).
+        seed (int): root seed; each point gets its own derived ``seed`` argument.
+        fixed (dict): keyword arguments shared by every point.
+        cache (ResultCache): answer known points from disk and store the new ones.
+        monitor (multiprocessing.Queue): stream the runs to a dashboard reading this queue (see dashboard.py).
+        journal (str | SweepJournal): skip the points it holds and record every point as it finishes
+            (see journal.py); points that raised are not recorded, so they run again.
+
+    Returns:
+        pd.DataFrame: one row per point, parameter columns followed by metric columns.
+    """
+    fixed = fixed or {}
+    tasks = [(func, {**fixed, **point, "seed": point_seed(seed, point)}) for point in points]
+    results = [None] * len(tasks)
+    keys = [None] * len(tasks)
+    own_journal = isinstance(journal, str)
+    if own_journal:
+        journal = SweepJournal(journal)
+    if cache is not None or journal is not None:
+        for i, (_, params) in enumerate(tasks):
+            keys[i] = result_key(func, params)
+            if journal is not None:
+                results[i] = journal.get(keys[i])
+            if results[i] is None and cache is not None:
+                results[i] = cache.get(keys[i])
+                if results[i] is not None and journal is not None:
+                    journal.record(keys[i], func, tasks[i][1], results[i])
+    missing = [i for i, result in enumerate(results) if result is None]
+    try:
+        if missing:
+            processes = processes or os.cpu_count()
+            initializer, initargs = (dashboard.connect, (monitor,)) if monitor is not None else (None, ())
+            with ProcessPoolExecutor(max_workers=min(processes, len(missing)), initializer=initializer,
+                                     initargs=initargs) as executor:
+                futures = {executor.submit(run_point, tasks[i]): i for i in missing}
+                # record points as they finish, not in order, so a crash loses only the running ones
+                for future in as_completed(futures):
+                    i = futures[future]
+                    result = results[i] = future.result()
+                    if "error" in result:
+                        continue
+                    if journal is not None:
+                        journal.record(keys[i], func, tasks[i][1], result)
+                    if cache is not None:
+                        cache.put(keys[i], result, call_config(func, tasks[i][1]))
+    finally:
+        if own_journal:
+            journal.close()
+    rows = [{**params, **result} for (_, params), result in zip(tasks, results)]
+    return pd.DataFrame.from_records(rows)
+
+
+if __name__ == '__main__':
+    table = run_sweep(expand_grid(SQUARE_GRID), fixed={"memo_size": [50, 100, 50, 100]})
+    table.to_csv("square_sweep.csv", index=False)
+    print(table)
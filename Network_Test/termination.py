@@ -0,0 +1,246 @@
+"""Ending a run as soon as there is nothing left to learn from it.
+
+The scripts run every timeline to a fixed ``stop_time`` of 2000-3000 ms,
+long after the single request has been served. ``Termination`` watches a
+timeline and its routers and stops the run when the first of its
+conditions holds:
+
+* ``resolved``: every request made has been rejected or its reservation has ended,
+* ``metric``: the confidence interval of the mean fidelity of the entangled
+  memories ("fidelity") or of the time between entanglements ("interval")
+  is narrower than ``rel_width`` of the mean,
+* ``quiescence``: no memory changed state for that many ps (a reservation
+  approved for later counts as activity at its start),
+* ``wall_clock``: that many seconds of wall time have passed.
+
+It wraps the event list, like event_trace.TracedEventList, and ends the run
+by moving ``stop_time`` to the first event past the condition, so
+``tl.run()`` returns normally; ``report()`` says why and when::
+
+    termination = Termination(tl, routers, resolved=True, quiescence=1e11, wall_clock=60)
+    tl.run()
+    termination.report()  # {"stop_reason": "resolved", "stop_time": ..., ...}
+
+With ``RandomRequestApp`` the applications make new requests forever, so
+only the other conditions apply.
+"""
+
+import math
+import time
+from typing import List, Optional
+
+# Importing sequence structures
+from sequence.kernel.eventlist import EventList
+
+from hooks import Hooks
+
+METRICS = ("fidelity", "interval")
+
+# reasons a run ends for without a condition
+STOP_TIME = "stop_time"
+NO_EVENTS = "no_events"
+
+
+class TerminationEventList(EventList):
+    """Event list of a watched timeline: checks the conditions as events are popped."""
+
+    def __init__(self, termination: "Termination", events: EventList, check_every: int):
+        super().__init__()
+        self.data = events.data
+        self.inner = events
+        self.termination = termination
+        self.check_every = check_every
+        self.popped = 0
+
+    def push(self, event: "Event") -> None:
+        self.inner.push(event)
+
+    def pop(self) -> "Event":
+        event = self.inner.pop()
+        # the deadline comparison is all most events cost; the wall clock is read every check_every events
+        if event.time > self.termination.deadline or not self.popped % self.check_every:
+            self.termination.check(event)
+        self.popped += 1
+        return event
+
+    def top(self) -> "Event":
+        return self.inner.top()
+
+    def remove(self, event: "Event") -> None:
+        self.inner.remove(event)
+
+    def update_event_time(self, event: "Event", time: int) -> None:
+        self.inner.update_event_time(event, time)
+
+
+class Termination:
+    """Stop conditions of one run and why it stopped.
+
+    Attributes:
+        timeline (Timeline): watched timeline.
+        reason (str): condition that ended the run, None while it runs.
+        stop_time (int): simulation time (ps) the condition was met at.
+        deadline (float): next simulation time at which a condition may hold.
+        requests (int): requests made by the watched routers.
+        resolved (int): of those, rejected or approved so far.
+        stats (RunningStats): running mean and variance of the metric.
+    """
+
+    def __init__(self, timeline: "Timeline", routers: List["QuantumRouter"] = (), resolved: bool = False,
+                 metric: Optional[str] = None, rel_width: float = 0.05, confidence: float = 0.95,
+                 min_samples: int = 30,
+                 quiescence: Optional[float] = None, wall_clock: Optional[float] = None, driver=None,
+                 check_every: int = 1024):
+        """
+        Args:
+            timeline (Timeline): timeline to watch, before ``tl.run()``.
+            routers (List[QuantumRouter]): routers whose requests and memories are watched.
+            resolved (bool): stop once every request is resolved.
+            metric (str): "fidelity" or "interval", stop once its mean has converged.
+            rel_width (float): half-width of the confidence interval, relative to the mean.
+            confidence (float): confidence level of the interval.
+            min_samples (int): samples needed before the interval is trusted.
+            quiescence (float): stop after this many ps without a memory state change.
+            wall_clock (float): stop after this many seconds of wall time.
+            driver (RequestDriver): with ``resolved``, also wait until its trace is exhausted.
+            check_every (int): events between two readings of the wall clock.
+        """
+        # campaign imports scenario, which imports this module
+        from campaign import RunningStats
+
+        if metric is not None and metric not in METRICS:
+            raise ValueError(f"metric must be one of {METRICS}")
+        self.timeline = timeline
+        self.resolve = resolved
+        self.metric = metric
+        self.rel_width = rel_width
+        self.confidence = confidence
+        self.min_samples = min_samples
+        self.quiescence = quiescence
+        self.wall_clock = wall_clock
+        self.driver = driver
+        self.reason = None
+        self.stop_time = None
+        self.deadline = math.inf
+        self.requests = 0
+        self.resolved = 0
+        self.stats = RunningStats()
+        self._converged = None  # time the metric converged at
+        self._last_entangled = None
+        self._active_until = timeline.now()  # time of the last activity
+        self._ends = timeline.now()          # end of the last approved reservation
+        self._tick = None
+        self._hooks = Hooks()
+        self._hooks.install(timeline, "events", TerminationEventList(self, timeline.events, check_every))
+        for router in routers:
+            self.watch_router(router)
+        self._update_deadline()
+
+    def watch_router(self, router: "QuantumRouter") -> None:
+        """Follows the requests and memory state changes of one router."""
+        memory_manager = router.resource_manager.memory_manager
+        network_manager = router.network_manager
+        update, request, get_reservation_result = (memory_manager.update, network_manager.request,
+                                                   router.get_reservation_result)
+
+        def watched_update(memory: "Memory", state: str) -> None:
+            update(memory, state)
+            now = self.timeline.now()
+            self._active_until = max(self._active_until, now)
+            if state == "ENTANGLED" and self.metric is not None:
+                if self.metric == "fidelity":
+                    self.sample(memory.fidelity, now)
+                elif self._last_entangled is not None:
+                    self.sample(now - self._last_entangled, now)
+                self._last_entangled = now
+            self._update_deadline()
+
+        def watched_request(*args, **kwargs) -> None:
+            self.requests += 1
+            self._active_until = max(self._active_until, self.timeline.now())
+            self._update_deadline()
+            request(*args, **kwargs)
+
+        def watched_result(reservation: "Reservation", result: bool) -> None:
+            self.resolved += 1
+            if result:
+                self._active_until = max(self._active_until, reservation.start_time)
+                self._ends = max(self._ends, reservation.end_time)
+            self._update_deadline()
+            get_reservation_result(reservation, result)
+
+        self._hooks.install(memory_manager, "update", watched_update)
+        self._hooks.install(network_manager, "request", watched_request)
+        self._hooks.install(router, "get_reservation_result", watched_result)
+
+    def sample(self, value: float, now: int) -> None:
+        """Adds a value of the metric and checks whether its mean has converged."""
+        stats = self.stats
+        stats.update(value)
+        if self._converged is None and stats.n >= self.min_samples \
+                and stats.ci_halfwidth(self.confidence) <= self.rel_width * abs(stats.mean):
+            self._converged = now
+
+    def _deadlines(self) -> dict:
+        deadlines = {}
+        if self.resolve and self.requests and self.resolved >= self.requests \
+                and (self.driver is None or self.driver.exhausted):
+            deadlines["resolved"] = self._ends
+        if self._converged is not None:
+            deadlines["converged"] = self._converged
+        if self.quiescence is not None and self.resolved >= self.requests:
+            # a request waiting for its result is activity too
+            deadlines["quiescence"] = self._active_until + self.quiescence
+        return deadlines
+
+    def _update_deadline(self) -> None:
+        self.deadline = min(self._deadlines().values(), default=math.inf)
+
+    def check(self, event: "Event") -> None:
+        """Stops the timeline before ``event`` if a condition holds."""
+        if self.reason is not None:
+            return
+        if self._tick is None:
+            self._tick = time.time()
+        if self.wall_clock is not None and time.time() - self._tick > self.wall_clock:
+            self._stop("wall_clock", self.timeline.now(), event)
+        elif event.time > self.deadline:
+            reason, deadline = min(self._deadlines().items(), key=lambda item: item[1])
+            self._stop(reason, deadline, event)
+
+    def _stop(self, reason: str, stop_time: float, event: "Event") -> None:
+        self.reason = reason
+        self.stop_time = stop_time
+        # Timeline.run() puts the event back and returns
+        self.timeline.stop_time = event.time
+
+    def close(self) -> None:
+        """Stops watching; a run ended by a condition can be continued after resetting ``stop_time``."""
+        self._hooks.restore()
+
+    def report(self) -> dict:
+        """Why and when the run stopped, and the state of the conditions."""
+        reason, stop_time = self.reason, self.stop_time
+        if reason is None:
+            if any(not event.is_invalid() for event in self.timeline.events):
+                reason, stop_time = STOP_TIME, self.timeline.stop_time
+            else:
+                reason, stop_time = NO_EVENTS, self.timeline.now()
+        return {
+            "stop_reason": reason,
+            "stop_time": stop_time,
+            "wall_time": time.time() - self._tick if self._tick is not None else 0.0,
+            "requests": self.requests,
+            "resolved": self.resolved,
+            "samples": self.stats.n,
+            "mean": self.stats.mean if self.stats.n else math.nan,
+            "half_width": self.stats.ci_halfwidth(self.confidence),
+        }
+
+
+if __name__ == '__main__':
+    from scenario import run_scenario
+
+    # the reservation ends at 100 ms of the 2000 ms of simulation time
+    print(run_scenario(sim_time=2000, start_time=1e10, end_time=1e11, memory_size=10,
+                       termination={"resolved": True, "wall_clock": 60}))
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the modules of Network_Test import each other by name, as when run from that directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,19 @@
+import os
+
+from abstraction import pair_samples
+from event_trace import load_trace
+from scenario import run_scenario
+
+# one memory per link, so the photon-level memories do not blind the detectors to each other
+REQUEST = dict(sim_time=1050, memo_size=10, memory_size=1, fidelity=0.6, qc_dist=10, seed=1)
+
+
+def test_link_level_pairs_without_rejected_requests(tmp_path):
+    full = run_scenario(**REQUEST, trace_dir=str(tmp_path))
+    link = run_scenario(**REQUEST, abstraction="all", trace_dir=str(tmp_path))
+    assert full["entangled_pairs"] == link["entangled_pairs"] == 1
+    # the initiators no longer ask busy responders again every round trip
+    assert link["events"] < full["events"] / 5
+    pairs = [pair_samples(load_trace(os.path.join(str(tmp_path), run["run_id"] + ".trace")), 1e12)
+             for run in (full, link)]
+    assert all(len(samples) > 0 and (samples["time_to_pair"] > 0).all() for samples in pairs)
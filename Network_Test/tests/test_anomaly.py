@@ -0,0 +1,24 @@
+import numpy as np
+import pytest
+
+from anomaly import P2Quantile
+
+
+@pytest.mark.parametrize("q", [0.05, 0.5, 0.95])
+def test_p2_estimate_close_to_sample_quantile(q):
+    samples = np.random.default_rng(0).normal(0.9, 0.02, 5000)
+    estimate = P2Quantile(q)
+    for value in samples:
+        estimate.update(value)
+    assert estimate.n == len(samples)
+    # within half a percentile of the exact sample quantile
+    low, high = np.quantile(samples, [max(q - 0.005, 0), min(q + 0.005, 1)])
+    assert low <= estimate.value <= high
+
+
+def test_p2_exact_up_to_five_samples():
+    estimate = P2Quantile(0.5)
+    assert np.isnan(estimate.value)
+    for value in [3.0, 1.0, 2.0]:
+        estimate.update(value)
+    assert estimate.value == 2.0
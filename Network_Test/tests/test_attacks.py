@@ -0,0 +1,14 @@
+import pytest
+
+from scenario import run_scenario
+
+# fast request: no purification, all pairs within a few ms of the reservation start (1 s)
+REQUEST = dict(sim_time=1100, memo_size=10, memory_size=5, fidelity=0.5, seed=1)
+
+
+@pytest.mark.parametrize("time", [5e11, 1.001e12], ids=["rules pending", "rules loaded"])
+def test_node_compromise_hits_approved_request(time):
+    baseline = run_scenario(**REQUEST)
+    attacked = run_scenario(**REQUEST, attacks=[{"kind": "node_compromise", "time": time, "router": "r1"}])
+    assert baseline["entangled_pairs"] > 0
+    assert attacked["entangled_pairs"] < baseline["entangled_pairs"]
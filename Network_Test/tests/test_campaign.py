@@ -0,0 +1,27 @@
+import math
+
+from campaign import run_campaign
+
+
+def no_fidelity(seed: int) -> dict:
+    return {"entangled_pairs": seed % 5, "mean_fidelity": math.nan}
+
+
+def broken(seed: int) -> dict:
+    raise RuntimeError("no route")
+
+
+def test_metric_without_samples_stops_after_min_replicas():
+    result = run_campaign(0.1, func=no_fidelity, metrics=("entangled_pairs", "mean_fidelity"),
+                          min_replicas=5, processes=1)
+    assert not result.converged and result.unestimable == ["mean_fidelity"]
+    assert len(result.replicas) == 5 and result.errors == 0
+    assert result.summary.loc["mean_fidelity", "missing"] == 5
+
+
+def test_errors_are_not_missing_values():
+    result = run_campaign(0.1, func=broken, metrics=("entangled_pairs",), min_replicas=3, processes=1)
+    assert result.errors == 3 and len(result.replicas) == 3
+    assert result.unestimable == ["entangled_pairs"]
+    assert result.summary.loc["entangled_pairs", "missing"] == 0
+    assert math.isnan(result.summary.loc["entangled_pairs", "mean"])
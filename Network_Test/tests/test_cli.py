@@ -0,0 +1,10 @@
+import pytest
+
+from cli import main
+
+
+@pytest.mark.parametrize("option", ["--plot", "--profile"])
+def test_campaign_rejects_single_run_options(option, tmp_path):
+    with pytest.raises(SystemExit, match="--campaign"):
+        main(["attack", "--campaign", "0.1", option, str(tmp_path / "out")])
+    assert not (tmp_path / "out").exists()
@@ -0,0 +1,26 @@
+from sequence.kernel.event import Event
+from sequence.kernel.process import Process
+from sequence.kernel.timeline import Timeline
+
+from event_trace import EVENT, TraceRecorder, load_trace
+
+
+class Ticker:
+    name = "ticker"
+
+    def tick(self) -> None:
+        pass
+
+
+def test_delayed_event_recorded_once_at_its_new_time(tmp_path):
+    path = str(tmp_path / "run.trace")
+    tl = Timeline(100)
+    with TraceRecorder(path, tl):
+        early = Event(5, Process(Ticker(), "tick", []))
+        delayed = Event(10, Process(Ticker(), "tick", []))
+        tl.schedule(early)
+        tl.schedule(delayed)
+        tl.update_event_time(delayed, 20)
+        tl.init()
+        tl.run()
+    assert load_trace(path).select(EVENT)["time"].tolist() == [5, 20]
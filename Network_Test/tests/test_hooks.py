@@ -0,0 +1,22 @@
+from hooks import Hooks, counts_pair
+
+
+class Manager:
+    def update(self) -> str:
+        return "method"
+
+
+def test_restore_puts_back_the_earlier_hook():
+    manager = Manager()
+    first, second = Hooks(), Hooks()
+    first.install(manager, "update", lambda: "first")
+    second.install(manager, "update", lambda: "second")
+    assert manager.update() == "second"
+    second.restore()
+    assert manager.update() == "first"
+    first.restore()
+    assert manager.update() == "method" and "update" not in manager.__dict__
+
+
+def test_pair_counted_at_one_end():
+    assert counts_pair("r0", "r1") and not counts_pair("r1", "r0") and not counts_pair("r0", None)
@@ -0,0 +1,35 @@
+import json
+
+from journal import SweepJournal
+
+
+def write_lines(path, lines):
+    with open(path, "wb") as fh:
+        fh.write(b"".join(lines))
+
+
+def entry_line(key: str) -> bytes:
+    return (json.dumps({"key": key, "func": "scenario.run_scenario", "params": {}, "result": {"pairs": 1}})
+            + "\n").encode()
+
+
+def test_unreadable_middle_line_is_skipped_not_truncated(tmp_path):
+    path = str(tmp_path / "sweep.jsonl")
+    lines = [entry_line("a"), b"{not json\n", entry_line("b")]
+    write_lines(path, lines)
+    with SweepJournal(path) as journal:
+        assert set(journal.entries) == {"a", "b"}
+        assert journal.skipped == [2] and journal.dropped == 0
+    with open(path, "rb") as fh:
+        assert fh.read() == b"".join(lines)
+
+
+def test_torn_last_line_is_truncated(tmp_path):
+    path = str(tmp_path / "sweep.jsonl")
+    torn = entry_line("b")[:-10]
+    write_lines(path, [entry_line("a"), torn])
+    with SweepJournal(path) as journal:
+        assert set(journal.entries) == {"a"}
+        assert journal.dropped == len(torn) and journal.skipped == []
+    with open(path, "rb") as fh:
+        assert fh.read() == entry_line("a")
@@ -0,0 +1,42 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from reservations import ACCEPTED, REJECTED, ReservationLog
+
+ROUTERS = ["r0", "r1", "r2"]
+
+
+def random_table(seed: int, num_requests: int = 60):
+    rng = np.random.default_rng(seed)
+    log = ReservationLog()
+    for _ in range(num_requests):
+        start = int(rng.integers(0, 100))
+        reservation = SimpleNamespace(initiator="r0", responder="r2", start_time=start,
+                                      end_time=start + int(rng.integers(1, 30)),
+                                      memory_size=int(rng.integers(1, 4)), fidelity=0.8,
+                                      path=ROUTERS)
+        for router in ROUTERS:
+            log.record(router, reservation, ACCEPTED if rng.random() < 0.8 else REJECTED, start)
+    return log.table()
+
+
+def test_utilization_counts_reservations_holding_each_time():
+    table = random_table(0)
+    times = np.arange(-1, 135)
+    utilization = table.utilization(times)
+    rows = table.accepted
+    for code, name in enumerate(table.names):
+        mine = rows[rows["node"] == code]
+        held = (mine["start_time"][:, None] <= times) & (times < mine["end_time"][:, None])
+        np.testing.assert_array_equal(utilization[name].to_numpy(), (mine["memory_size"][:, None] * held).sum(axis=0))
+    peak = table.peak_utilization()
+    assert all(peak[name] == utilization[name].max() for name in table.names)
+
+
+def test_overlaps_counts_other_reservations_of_the_same_router():
+    table = random_table(1)
+    rows = table.accepted
+    same = rows["node"][:, None] == rows["node"]
+    intersect = (rows["start_time"][:, None] < rows["end_time"]) & (rows["start_time"] < rows["end_time"][:, None])
+    np.testing.assert_array_equal(table.overlaps(), (same & intersect).sum(axis=1) - 1)
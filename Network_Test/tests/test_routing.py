@@ -0,0 +1,39 @@
+import numpy as np
+from sequence.kernel.timeline import Timeline
+
+from routing import DynamicRouting
+from topology_builder import build_network, next_hop_matrix, waxman_edges
+
+NUM_ROUTERS = 12
+
+
+def reaches_without_loops(next_hop: np.ndarray) -> bool:
+    num_routers = len(next_hop)
+    for destination in range(num_routers):
+        for source in range(num_routers):
+            router, hops = source, 0
+            while router != destination:
+                router = next_hop[router, destination]
+                hops += 1
+                if router < 0 or hops > num_routers:
+                    return False
+    return True
+
+
+def test_repaired_routes_match_full_solve():
+    edges = waxman_edges(NUM_ROUTERS, alpha=0.6, beta=0.6, seed=3)
+    network = build_network(Timeline(), edges, NUM_ROUTERS, memo_size=1)
+    rng = np.random.default_rng(0)
+    routing = DynamicRouting(network, rng.uniform(1, 10, len(edges)))
+    for _ in range(30):
+        weights = network.weights.copy()
+        edge = rng.integers(len(edges))
+        weights[edge] = rng.uniform(1, 10) if rng.random() < 0.8 else weights[edge] * 3
+        routing.update(weights)
+        _, distance = next_hop_matrix(NUM_ROUTERS, edges, weights, return_distances=True)
+        np.testing.assert_allclose(routing.distance, distance)
+        assert reaches_without_loops(network.next_hop)
+        names = [router.name for router in network.routers]
+        for i, router in enumerate(network.routers):
+            table = router.network_manager.protocol_stack[0].forwarding_table
+            assert all(table[names[j]] == names[network.next_hop[i, j]] for j in range(NUM_ROUTERS) if j != i)
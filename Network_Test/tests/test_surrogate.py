@@ -0,0 +1,12 @@
+import pandas as pd
+
+from surrogate import Surrogate, route_hops
+
+
+def test_hops_follow_the_route_of_each_point():
+    points = pd.DataFrame([{"topology": "ring", "num_routers": 8, "src": 0, "dst": 4},
+                           {"topology": "line", "num_routers": 6, "src": 5, "dst": 0},
+                           {"src": 0, "dst": 1}])
+    assert route_hops(points).tolist() == [4, 5, 1]
+    rates = Surrogate().predict(points)["predicted_rate"]
+    assert rates[2] > rates[0] > rates[1]
@@ -0,0 +1,374 @@
+"""Locating the parameter values at which a request stops being satisfied.
+
+A grid spends most of its runs far from the boundary between the
+configurations that serve the 0.9-fidelity, 50-memory request and those
+that do not. The drivers here choose each next batch of ``run_scenario``
+configurations where the outcome is least certain and run the batch in
+parallel through ``run_sweep`` (so ``cache`` and ``journal`` work as in a
+sweep, and every point keeps the seed ``point_seed`` gives it):
+
+* ``bisect_threshold`` brackets the threshold of one parameter
+  (``swapping_success_rate``, ``qc_atten``, ``qc_dist``, ...): a batch of
+  ``b`` runs splits the bracket into ``b + 1`` parts, until it is narrower
+  than ``tol`` (or ``rtol`` on a log scale);
+* ``find_boundary`` learns the boundary over several parameters with a
+  Gaussian process fitted to the outcomes: each batch goes to the
+  candidates whose side of the boundary is most uncertain (straddle
+  heuristic), and it stops once the predicted side of the box stops moving
+  between rounds.
+
+    result = bisect_threshold("swapping_success_rate", 0.01, 1.0, rtol=0.05, log=True)
+    result.threshold, result.runs, result.grid_runs
+"""
+
+import copy
+import math
+import os
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from journal import SweepJournal
+from result_cache import ResultCache
+from scenario import run_scenario
+from sweep import latin_hypercube, run_sweep
+
+# quantile of the outcome probability still counted as undecided
+STRADDLE_Z = 1.96
+
+def satisfied(result: dict, min_pairs: int = 1, min_fidelity: float = 0.9) -> bool:
+    """Whether a run served its request: enough entangled pairs, at the requested fidelity."""
+    if "error" in result and isinstance(result["error"], str):
+        raise RuntimeError("run failed: " + result["error"])
+    return bool(result["entangled_pairs"] >= min_pairs and result["mean_fidelity"] >= min_fidelity)
+
+def _run_batch(points: List[dict], func: Callable, fixed: Optional[dict], criterion: Callable[[dict], bool],
+               processes: Optional[int], seed: Optional[int], cache: Optional[ResultCache],
+               journal: Optional[SweepJournal]) -> pd.DataFrame:
+    table = run_sweep(points, func, processes=processes, seed=seed, fixed=fixed, cache=cache, journal=journal)
+    table["satisfied"] = [criterion(row) for row in table.to_dict("records")]
+    return table
+
+
+class ThresholdResult:
+    """Bracket of the threshold of one parameter.
+
+    Attributes:
+        param (str): searched parameter.
+        lower, upper (float): the threshold lies between these values.
+        satisfied_below (bool): which side of the bracket serves the request; None without a threshold.
+        runs (pd.DataFrame): every run made, with its ``satisfied`` outcome and search ``round``.
+        grid_runs (int): runs a uniform grid with the same resolution would take.
+    """
+
+    def __init__(self, param: str, lower: float, upper: float, satisfied_below: Optional[bool],
+                 runs: pd.DataFrame, log: bool, grid_runs: int):
+        self.param = param
+        self.lower = lower
+        self.upper = upper
+        self.satisfied_below = satisfied_below
+        self.runs = runs
+        self.log = log
+        self.grid_runs = grid_runs
+
+    @property
+    def found(self) -> bool:
+        """False when both ends of the range gave the same outcome."""
+        return self.satisfied_below is not None
+
+    @property
+    def threshold(self) -> float:
+        """Centre of the bracket (geometric on a log scale), NaN without a threshold."""
+        if not self.found:
+            return math.nan
+        return math.sqrt(self.lower * self.upper) if self.log else (self.lower + self.upper) / 2
+
+    def __repr__(self) -> str:
+        return "ThresholdResult(%s in [%g, %g], %d runs, grid: %d)" % (
+            self.param, self.lower, self.upper, len(self.runs), self.grid_runs)
+
+
+def bisect_threshold(param: str, low: float, high: float, func: Callable[..., dict] = run_scenario,
+                     fixed: Optional[dict] = None, tol: Optional[float] = None, rtol: float = 0.05,
+                     log: bool = False, batch: Optional[int] = None, max_rounds: int = 50,
+                     criterion: Callable[[dict], bool] = satisfied, processes: Optional[int] = None,
+                     seed: Optional[int] = 0, cache: Optional[ResultCache] = None,
+                     journal: Union[str, SweepJournal, None] = None) -> ThresholdResult:
+    """Brackets the value of ``param`` at which ``criterion`` changes, assuming it changes once in [low, high].
+
+    Args:
+        param (str): argument of ``func`` to search.
+        low, high (float): range of the search; both ends are run first.
+        func (Callable): picklable scenario returning metrics.
+        fixed (dict): other arguments of every run.
+        tol (float): linear scale, stop when the bracket is narrower than this.
+        rtol (float): stop when upper / lower - 1 (log scale) or, without
+            ``tol``, the width relative to the range (linear scale) is below this.
+        log (bool): split the bracket evenly in log scale (attenuations, rates).
+        batch (int): runs per round, default the pool size.
+        max_rounds (int): hard limit on rounds after the two ends.
+        criterion (Callable): whether a run's metrics serve the request.
+        processes (int): pool size (default: all cores).
+        seed (int): root seed of the runs, see sweep.point_seed.
+        cache (ResultCache): reuse results of earlier searches and sweeps.
+        journal (str | SweepJournal): record the runs and skip them when the search is started again.
+
+    Returns:
+        ThresholdResult: the final bracket and every run.
+    """
+    if not 0 < low < high if log else not low < high:
+        raise ValueError("need low < high (and low > 0 on a log scale)")
+    batch = batch or processes or os.cpu_count()
+    own_journal = isinstance(journal, str)
+    if own_journal:
+        journal = SweepJournal(journal)
+    scale = math.log if log else float
+    # resolution as a fraction of the (scaled) range
+    if log:
+        width = math.log1p(rtol) / (scale(high) - scale(low))
+    else:
+        width = rtol if tol is None else tol / (high - low)
+    grid_runs = int(math.ceil(1 / width)) + 1
+
+    def run(values: Sequence[float], round_: int) -> pd.DataFrame:
+        table = _run_batch([{param: value} for value in values], func, fixed, criterion, processes, seed,
+                           cache, journal)
+        table["round"] = round_
+        return table
+
+    try:
+        tables = [run([low, high], 0)]
+        low_ok, high_ok = tables[0]["satisfied"].tolist()
+        if low_ok == high_ok:
+            return ThresholdResult(param, low, high, None, pd.concat(tables, ignore_index=True), log, grid_runs)
+        lower, upper = low, high
+        for round_ in range(1, max_rounds + 1):
+            if (scale(upper) - scale(lower)) <= width * (scale(high) - scale(low)):
+                break
+            fractions = np.arange(1, batch + 1) / (batch + 1)
+            if log:
+                values = np.exp(np.log(lower) + fractions * (np.log(upper) - np.log(lower)))
+            else:
+                values = lower + fractions * (upper - lower)
+            table = run(values.tolist(), round_)
+            tables.append(table)
+            # the bracket ends at the first split whose outcome differs from the lower end
+            outcomes = table["satisfied"].tolist()
+            edges = [lower] + values.tolist() + [upper]
+            flips = [k for k, outcome in enumerate(outcomes) if outcome != low_ok]
+            k = flips[0] if flips else len(outcomes)
+            lower, upper = edges[k], edges[k + 1]
+    finally:
+        if own_journal:
+            journal.close()
+    return ThresholdResult(param, lower, upper, low_ok, pd.concat(tables, ignore_index=True), log, grid_runs)
+
+
+class GaussianProcess:
+    """GP regression of outcomes in the unit cube, squared-exponential kernel.
+
+    The length scale is picked from ``length_scales`` by marginal likelihood
+    at every ``fit``; ``condition`` adds points without refitting it.
+    """
+
+    def __init__(self, length_scales: Sequence[float] = (0.05, 0.1, 0.2, 0.4, 0.8), variance: float = 0.25,
+                 noise: float = 0.05, prior: float = 0.5):
+        self.length_scales = length_scales
+        self.variance = variance
+        self.noise = noise
+        self.prior = prior
+        self.length_scale = length_scales[0]
+
+    def _kernel(self, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        sq = (a ** 2).sum(1)[:, None] + (b ** 2).sum(1)[None, :] - 2 * a @ b.T
+        return self.variance * np.exp(-np.maximum(sq, 0) / (2 * self.length_scale ** 2))
+
+    def _factor(self) -> float:
+        k = self._kernel(self.x, self.x) + self.noise * np.eye(len(self.x))
+        self._chol = np.linalg.cholesky(k)
+        self._alpha = np.linalg.solve(self._chol.T, np.linalg.solve(self._chol, self.y - self.prior))
+        # log marginal likelihood, without the constant
+        return -0.5 * (self.y - self.prior) @ self._alpha - np.log(np.diag(self._chol)).sum()
+
+    def fit(self, x: np.ndarray, y: np.ndarray) -> "GaussianProcess":
+        self.x, self.y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+        best = None
+        for length_scale in self.length_scales:
+            self.length_scale = length_scale
+            likelihood = self._factor()
+            if best is None or likelihood > best[0]:
+                best = (likelihood, length_scale)
+        self.length_scale = best[1]
+        self._factor()
+        return self
+
+    def condition(self, x: np.ndarray, y: np.ndarray) -> "GaussianProcess":
+        self.x, self.y = np.vstack([self.x, x]), np.concatenate([self.y, y])
+        self._factor()
+        return self
+
+    def predict(self, x: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Mean and standard deviation of the outcome at ``x``."""
+        cross = self._kernel(np.asarray(x, dtype=float), self.x)
+        mean = self.prior + cross @ self._alpha
+        v = np.linalg.solve(self._chol, cross.T)
+        std = np.sqrt(np.maximum(self.variance - (v ** 2).sum(0), 0))
+        return mean, std
+
+
+def straddle(mean: np.ndarray, std: np.ndarray) -> np.ndarray:
+    """Positive where a point's side of the 0.5 boundary is undecided, largest where most."""
+    return STRADDLE_Z * std - np.abs(mean - 0.5)
+
+
+class BoundaryResult:
+    """Boundary between satisfied and unsatisfied configurations, learned by a GP.
+
+    Attributes:
+        bounds (Dict[str, Tuple[float, float]]): searched box.
+        runs (pd.DataFrame): every run made, with its ``satisfied`` outcome and ``round``.
+        model (GaussianProcess): GP fitted to the outcomes in unit coordinates.
+        undecided (float): fraction of the last candidates whose side was still uncertain.
+        moved (float): fraction of the box whose predicted side changed in the last round.
+        converged (bool): whether the boundary stopped moving before ``max_runs``.
+    """
+
+    def __init__(self, bounds: dict, log: Sequence[str], runs: pd.DataFrame, model: GaussianProcess,
+                 undecided: float, moved: float, converged: bool):
+        self.bounds = bounds
+        self.log = tuple(log)
+        self.runs = runs
+        self.model = model
+        self.undecided = undecided
+        self.moved = moved
+        self.converged = converged
+
+    def predict(self, points: pd.DataFrame) -> pd.DataFrame:
+        """Probability-like score that each point serves the request, and its uncertainty."""
+        mean, std = self.model.predict(to_unit(points, self.bounds, self.log))
+        return pd.DataFrame({"satisfied": np.clip(mean, 0, 1), "std": std,
+                             "undecided": straddle(mean, std) > 0}, index=points.index)
+
+
+def to_unit(points: pd.DataFrame, bounds: dict, log: Sequence[str]) -> np.ndarray:
+    columns = []
+    for name, (low, high) in bounds.items():
+        values = points[name].to_numpy(dtype=float)
+        if name in log:
+            values, low, high = np.log(values), math.log(low), math.log(high)
+        columns.append((values - low) / (high - low))
+    return np.column_stack(columns)
+
+def from_unit(unit: np.ndarray, bounds: dict, log: Sequence[str]) -> List[dict]:
+    columns = {}
+    for k, (name, (low, high)) in enumerate(bounds.items()):
+        if name in log:
+            columns[name] = np.exp(math.log(low) + unit[:, k] * (math.log(high) - math.log(low)))
+        else:
+            columns[name] = low + unit[:, k] * (high - low)
+    return pd.DataFrame(columns).to_dict("records")
+
+
+def find_boundary(bounds: Dict[str, Tuple[float, float]], func: Callable[..., dict] = run_scenario,
+                  fixed: Optional[dict] = None, log: Sequence[str] = (), initial: Optional[int] = None,
+                  batch: Optional[int] = None, max_runs: int = 200, resolution: float = 0.01,
+                  patience: int = 2, candidates: int = 2000, model: Optional[GaussianProcess] = None,
+                  criterion: Callable[[dict], bool] = satisfied, processes: Optional[int] = None,
+                  seed: Optional[int] = 0, cache: Optional[ResultCache] = None,
+                  journal: Union[str, SweepJournal, None] = None) -> BoundaryResult:
+    """Learns where ``criterion`` changes in the box ``bounds`` with batches of active learning.
+
+    Every round refits the GP to the outcomes (1 satisfied, 0 not), draws
+    ``candidates`` Latin-hypercube points and runs the ``batch`` with the
+    largest straddle score; after each pick the GP is conditioned on its own
+    prediction there (kriging believer), so a batch spreads along the
+    boundary instead of piling up on one spot.
+
+    The search stops on the resolution of the boundary, not on the GP's
+    uncertainty, which stays wide near a sharp boundary however many runs
+    sit on it: the predicted sides of a fixed set of ``candidates`` points
+    are compared after every round, and once less than ``resolution`` of
+    them changed side ``patience`` rounds in a row the boundary is taken as
+    found. For a boundary crossing the box once, the fraction that changes
+    side is about how far the boundary moved, in unit coordinates.
+
+    Args:
+        bounds (Dict[str, Tuple[float, float]]): {parameter: (low, high)} of ``func``.
+        func (Callable): picklable scenario returning metrics.
+        fixed (dict): other arguments of every run.
+        log (Sequence[str]): parameters explored on a log scale.
+        initial (int): size of the first, space-filling batch (default 5 per parameter, at least a batch).
+        batch (int): runs per round, default the pool size.
+        max_runs (int): hard limit on runs.
+        resolution (float): fraction of the box changing side in a round under which the boundary counts as found.
+        patience (int): rounds in a row the boundary has to stay under ``resolution``.
+        candidates (int): points scored per round.
+        model (GaussianProcess): GP to fit (default settings otherwise).
+        criterion (Callable): whether a run's metrics serve the request.
+        processes (int): pool size (default: all cores).
+        seed (int): root seed of the runs and of the candidate draws.
+        cache (ResultCache): reuse results of earlier searches and sweeps.
+        journal (str | SweepJournal): record the runs and skip them when the search is started again.
+
+    Returns:
+        BoundaryResult: the fitted model and every run.
+    """
+    names = list(bounds)
+    unit_bounds = {name: (0.0, 1.0) for name in names}
+    batch = batch or processes or os.cpu_count()
+    initial = max(initial or 5 * len(names), batch)
+    model = model or GaussianProcess()
+    rng = np.random.default_rng(np.random.SeedSequence(seed).spawn(1)[0])
+    own_journal = isinstance(journal, str)
+    if own_journal:
+        journal = SweepJournal(journal)
+
+    def run(unit: np.ndarray, round_: int) -> pd.DataFrame:
+        table = _run_batch(from_unit(unit, bounds, log), func, fixed, criterion, processes, seed, cache, journal)
+        table["round"] = round_
+        return table
+
+    def draw(n: int) -> np.ndarray:
+        points = latin_hypercube(unit_bounds, n, seed=int(rng.integers(2 ** 32)))
+        return pd.DataFrame(points)[names].to_numpy()
+
+    checks = draw(candidates)  # where the predicted sides are compared between rounds
+    try:
+        tables = [run(draw(min(initial, max_runs)), 0)]
+        round_ = 0
+        sides, steady = None, 0
+        while True:
+            runs = pd.concat(tables, ignore_index=True)
+            model.fit(to_unit(runs, bounds, log), runs["satisfied"].to_numpy(dtype=float))
+            previous, sides = sides, model.predict(checks)[0] > 0.5
+            moved = 1.0 if previous is None else float((sides != previous).mean())
+            steady = steady + 1 if moved < resolution else 0
+            converged = steady >= patience
+            pool = draw(candidates)
+            mean, std = model.predict(pool)
+            fraction = float((straddle(mean, std) > 0).mean())
+            if converged or len(runs) >= max_runs:
+                break
+            picks = []
+            believer = copy.copy(model)
+            for _ in range(min(batch, max_runs - len(runs))):
+                score = straddle(*believer.predict(pool))
+                best = int(np.argmax(score))
+                picks.append(pool[best])
+                believer.condition(pool[best:best + 1], believer.predict(pool[best:best + 1])[0])
+                pool = np.delete(pool, best, axis=0)
+            round_ += 1
+            tables.append(run(np.array(picks), round_))
+    finally:
+        if own_journal:
+            journal.close()
+    return BoundaryResult(bounds, log, runs, model, fraction, moved, converged)
+
+
+if __name__ == '__main__':
+    # swapping attack: below which success rate is the 0.9-fidelity, 50-memory request no longer served?
+    print(bisect_threshold("swapping_success_rate", 0.01, 1.0, rtol=0.1, log=True))
+    boundary = find_boundary({"qc_atten": (1e-5, 1e-3), "qc_dist": (1, 20)}, log=("qc_atten",), max_runs=60)
+    print("%d runs, converged: %s, %.1f%% of the box moved in the last round"
+          % (len(boundary.runs), boundary.converged, 100 * boundary.moved))
@@ -0,0 +1,301 @@
+"""Parametric construction of quantum router networks.
+
+The simulation scripts used to hand-write every router (r0..r3), BSM node
+(m0..m3), quantum channel (qc0..qc7) and forwarding rule of a 4-router ring.
+Here a topology is just an edge list between router indices: routers are
+named ``r<i>``, the BSM node of edge ``k`` is ``m<k>`` and its quantum
+channels are ``qc_r<i>_m<k>``, so the 4-router ring reproduces the names the
+scripts always used. Forwarding tables for every router come from a single
+all-pairs shortest-path pass.
+"""
+
+from typing import Callable, List, Optional, Sequence, Union
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import shortest_path
+
+# Importing sequence structures
+from sequence.topology.node import QuantumRouter, BSMNode
+from sequence.components.optical_channel import QuantumChannel
+
+from classical_channels import connect_classical
+
+
+def ring_edges(num_routers: int) -> np.ndarray:
+    """r0 - r1 - ... - r(n-1) - r0"""
+    if num_routers < 3:
+        raise ValueError("a ring needs at least 3 routers")
+    src = np.arange(num_routers)
+    return np.stack([src, (src + 1) % num_routers], axis=1)
+
+def line_edges(num_routers: int) -> np.ndarray:
+    """r0 - r1 - ... - r(n-1)"""
+    if num_routers < 2:
+        raise ValueError("a line needs at least 2 routers")
+    src = np.arange(num_routers - 1)
+    return np.stack([src, src + 1], axis=1)
+
+def star_edges(num_routers: int) -> np.ndarray:
+    """r0 is the center, every other router is a leaf"""
+    if num_routers < 2:
+        raise ValueError("a star needs at least 2 routers")
+    leaves = np.arange(1, num_routers)
+    return np.stack([np.zeros_like(leaves), leaves], axis=1)
+
+def grid_edges(num_routers: int, rows: Optional[int] = None) -> np.ndarray:
+    """rows x cols mesh, routers numbered row by row"""
+    if rows is None:
+        rows = max(int(np.sqrt(num_routers)), 1)
+        while num_routers % rows:
+            rows -= 1
+    if num_routers % rows:
+        raise ValueError(f"{num_routers} routers do not fill a grid with {rows} rows")
+    cols = num_routers // rows
+    index = np.arange(num_routers).reshape(rows, cols)
+    horizontal = np.stack([index[:, :-1].ravel(), index[:, 1:].ravel()], axis=1)
+    vertical = np.stack([index[:-1, :].ravel(), index[1:, :].ravel()], axis=1)
+    return np.concatenate([horizontal, vertical])
+
+def waxman_edges(num_routers: int, alpha: float = 0.4, beta: float = 0.4, seed: Optional[int] = None) -> np.ndarray:
+    """Waxman graph on the unit square: P(u, v) = beta * exp(-d(u, v) / (alpha * L))"""
+    rng = np.random.default_rng(seed)
+    positions = rng.random((num_routers, 2))
+    src, dst = np.triu_indices(num_routers, k=1)
+    dist = np.linalg.norm(positions[src] - positions[dst], axis=1)
+    longest = dist.max() if len(dist) else 1.0
+    keep = rng.random(len(dist)) < beta * np.exp(-dist / (alpha * longest))
+    return np.stack([src[keep], dst[keep]], axis=1)
+
+def erdos_renyi_edges(num_routers: int, p: float = 0.1, seed: Optional[int] = None) -> np.ndarray:
+    """G(n, p): every router pair is linked independently with probability p"""
+    rng = np.random.default_rng(seed)
+    src, dst = np.triu_indices(num_routers, k=1)
+    keep = rng.random(len(src)) < p
+    return np.stack([src[keep], dst[keep]], axis=1)
+
+# relative extra cost of crossing an edge against its listed direction
+TIE_BREAK = 1e-6
+
+TOPOLOGIES = {
+    "ring": ring_edges,
+    "line": line_edges,
+    "star": star_edges,
+    "grid": grid_edges,
+    "waxman": waxman_edges,
+    "erdos_renyi": erdos_renyi_edges,
+}
+
+def generate_edges(kind: str, num_routers: int, **kwargs) -> np.ndarray:
+    """Edge list (E x 2 array of router indices) for one of the TOPOLOGIES."""
+    if kind not in TOPOLOGIES:
+        raise ValueError(f"unknown topology '{kind}', expected one of {sorted(TOPOLOGIES)}")
+    return TOPOLOGIES[kind](num_routers, **kwargs).astype(np.int64)
+
+
+def next_hop_matrix(num_routers: int, edges: np.ndarray, weights: Optional[np.ndarray] = None,
+                    destinations: Optional[np.ndarray] = None, return_distances: bool = False):
+    """All-pairs next hops for an undirected router graph.
+
+    ``next_hop[i, j]`` is the neighbour of router i on a shortest path to
+    router j (-1 on the diagonal and for unreachable pairs). Reading the
+    predecessors of the reversed graph transposed gives, for each destination
+    j, the shortest-path tree rooted at j, so hop-by-hop forwarding always
+    stays on that tree and never loops. Ties are broken in favour of crossing
+    edges in the direction they are listed, which is how the hand-written ring
+    tables were laid out (r0 reaches r2 through r1, r2 reaches r0 through r3).
+
+    Args:
+        num_routers (int): number of routers in the graph.
+        edges (np.ndarray): E x 2 array of router indices.
+        weights (np.ndarray): cost of each edge (default: hop count), np.inf disables an edge.
+        destinations (np.ndarray): only compute the columns of these routers.
+        return_distances (bool): also return the cost of every route.
+
+    Returns:
+        np.ndarray: num_routers x num_routers matrix of router indices
+        (num_routers x len(destinations) with ``destinations``), and with
+        ``return_distances`` the matching matrix of route costs (np.inf when unreachable).
+    """
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    cost = np.ones(len(edges)) if weights is None else np.asarray(weights, dtype=float)
+    usable = np.isfinite(cost)
+    edges, cost = edges[usable], cost[usable]
+    rows = np.concatenate([edges[:, 1], edges[:, 0]])
+    cols = np.concatenate([edges[:, 0], edges[:, 1]])
+    data = np.concatenate([cost, cost * (1 + TIE_BREAK)])
+    # reversed graph: an entry (v, u) stands for the link u -> v
+    reverse = csr_matrix((data, (rows, cols)), shape=(num_routers, num_routers))
+    distances, predecessors = shortest_path(reverse, method="D", directed=True, return_predecessors=True,
+                                            indices=destinations)
+    next_hop = np.atleast_2d(predecessors).T.astype(np.int64)
+    next_hop[next_hop < 0] = -1
+    if return_distances:
+        return next_hop, np.atleast_2d(distances).T
+    return next_hop
+
+
+class Network:
+    """Routers, BSM nodes and channels created by ``build_network``.
+
+    Attributes:
+        tl (Timeline): timeline every entity is attached to.
+        routers (List[QuantumRouter]): routers, indexed like the edge list.
+        bsm_nodes (List[BSMNode]): one BSM node per edge.
+        qchannels (List[QuantumChannel]): two quantum channels per edge.
+        cchannels (List[ClassicalChannel]): classical channels created so far.
+        edges (np.ndarray): E x 2 array of router indices.
+        weights (np.ndarray): routing cost of each edge, np.inf for disabled edges.
+        next_hop (np.ndarray): all-pairs next hop matrix used for the forwarding tables.
+    """
+
+    def __init__(self, tl: "Timeline", routers: List[QuantumRouter], bsm_nodes: List[BSMNode], edges: np.ndarray):
+        self.tl = tl
+        self.routers = routers
+        self.bsm_nodes = bsm_nodes
+        self.edges = edges
+        self.weights = np.ones(len(edges))
+        self.qchannels = []
+        self.cchannels = []
+        self.next_hop = None
+        self._index = {router.name: i for i, router in enumerate(routers)}
+
+    @property
+    def nodes(self) -> list:
+        return self.routers + self.bsm_nodes
+
+    def router_index(self, name: str) -> int:
+        return self._index[name]
+
+    def get_router(self, name: str) -> QuantumRouter:
+        return self.routers[self._index[name]]
+
+    def install_forwarding_tables(self, next_hop: np.ndarray) -> None:
+        """Writes every router's StaticRoutingProtocol table in bulk."""
+        self.next_hop = next_hop
+        names = np.array([router.name for router in self.routers], dtype=object)
+        for i, router in enumerate(self.routers):
+            row = next_hop[i]
+            destinations = np.flatnonzero(row >= 0)
+            table = router.network_manager.protocol_stack[0].forwarding_table
+            table.update(zip(names[destinations].tolist(), names[row[destinations]].tolist()))
+
+    def edge_channels(self, edge: int) -> list:
+        """The two quantum channels (router -> BSM node) of one edge."""
+        return self.qchannels[2 * edge:2 * edge + 2]
+
+    def reroute(self, weights: np.ndarray) -> int:
+        """Moves the forwarding tables to new edge weights, touching only what changes.
+
+        When weights only grow (an edge gets worse or is disabled), only the
+        destinations whose shortest-path tree crosses a changed edge are
+        recomputed; otherwise every destination is. Of those, only the
+        forwarding entries that differ are written. Entries towards
+        destinations that became unreachable are left as they were:
+        StaticRoutingProtocol raises on unknown destinations, and messages
+        already in flight still have to go somewhere.
+
+        Returns:
+            int: number of forwarding entries changed.
+        """
+        weights = np.asarray(weights, dtype=float)
+        changed = np.flatnonzero(weights != self.weights)
+        if len(changed) == 0:
+            return 0
+        num_routers = len(self.routers)
+        if np.all(weights[changed] > self.weights[changed]):
+            affected = np.zeros(num_routers, dtype=bool)
+            for u, v in self.edges[changed].tolist():
+                affected |= (self.next_hop[u] == v) | (self.next_hop[v] == u)
+            destinations = np.flatnonzero(affected)
+        else:
+            destinations = np.arange(num_routers)
+        self.weights = weights
+        if len(destinations) == 0:
+            return 0
+
+        columns = next_hop_matrix(num_routers, self.edges, weights, destinations)
+        old = self.next_hop[:, destinations]
+        self.next_hop[:, destinations] = columns
+        names = [router.name for router in self.routers]
+        sources, cols = np.nonzero((columns != old) & (columns >= 0))
+        for i, k in zip(sources.tolist(), cols.tolist()):
+            table = self.routers[i].network_manager.protocol_stack[0].forwarding_table
+            table[names[destinations[k]]] = names[columns[i, k]]
+        return len(sources)
+
+
+def build_network(tl: "Timeline", edges: np.ndarray, num_routers: Optional[int] = None,
+                  memo_size: Union[int, Sequence[int]] = 100, cc_delay: float = 1e8,
+                  qc_atten: float = 1e-5, qc_dist: float = 1e3, raw_fidelity: float = 0.85,
+                  coherence_time: float = 10, weights: Optional[np.ndarray] = None,
+                  seeds: Optional[Sequence[int]] = None, cc_mode: str = "full",
+                  manager_factory: Optional[Callable[[QuantumRouter, str], "NetworkManager"]] = None) -> Network:
+    """Creates a quantum router network from an edge list.
+
+    Args:
+        tl (Timeline): simulation timeline.
+        edges (np.ndarray): E x 2 array of router indices, one BSM node per edge.
+        num_routers (int): number of routers (default: largest index in edges + 1).
+        memo_size (int | Sequence[int]): memories per router, or one value per router.
+        cc_delay (float): delay on classical channels (ps).
+        qc_atten (float): attenuation on quantum channels (dB/m).
+        qc_dist (float): length of each router-BSM quantum channel (m).
+        raw_fidelity (float): raw fidelity of the memories.
+        coherence_time (float): coherence time of the memories (s).
+        weights (np.ndarray): routing cost of each edge (default: hop count).
+        seeds (Sequence[int]): seed of every node, routers first (default: node index).
+        cc_mode (str): classical connectivity, one of ``classical_channels.CC_MODES``.
+        manager_factory (Callable): builds a replacement network manager from (router, memory array name).
+
+    Returns:
+        Network: the created entities, ready for ``tl.init()``.
+    """
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    if num_routers is None:
+        num_routers = int(edges.max()) + 1 if len(edges) else 0
+    if np.isscalar(memo_size):
+        memo_size = [memo_size] * num_routers
+
+    # Quantum routers
+    # Args: name, timeline, number of quantum memories
+    routers = [QuantumRouter(f"r{i}", tl, memo_size[i]) for i in range(num_routers)]
+    if manager_factory is not None:
+        for router in routers:
+            router.set_network_manager(manager_factory(router, router.memo_arr_name))
+
+    # One BSM node in the middle of every edge
+    bsm_nodes = []
+    for k, (u, v) in enumerate(edges.tolist()):
+        r_u, r_v = routers[u], routers[v]
+        bsm = BSMNode(f"m{k}", tl, [r_u.name, r_v.name])
+        r_u.add_bsm_node(bsm.name, r_v.name)
+        r_v.add_bsm_node(bsm.name, r_u.name)
+        bsm_nodes.append(bsm)
+
+    network = Network(tl, routers, bsm_nodes, edges)
+
+    # set seeds for random generators
+    if seeds is None:
+        seeds = range(len(network.nodes))
+    for seed, node in zip(seeds, network.nodes):
+        node.set_seed(seed)
+
+    for router in routers:
+        memory_array = router.get_components_by_type("MemoryArray")[0]
+        memory_array.update_memory_params("coherence_time", coherence_time)
+        memory_array.update_memory_params("raw_fidelity", raw_fidelity)
+
+    connect_classical(network, cc_delay, cc_mode)
+
+    # Quantum channels linking both routers of an edge to its BSM node
+    for bsm, (u, v) in zip(bsm_nodes, edges.tolist()):
+        for router in (routers[u], routers[v]):
+            qc = QuantumChannel(f"qc_{router.name}_{bsm.name}", tl, qc_atten, qc_dist)
+            qc.set_ends(router, bsm.name)
+            network.qchannels.append(qc)
+
+    if weights is not None:
+        network.weights = np.asarray(weights, dtype=float)
+    network.install_forwarding_tables(next_hop_matrix(num_routers, edges, network.weights))
+    return network
@@ -0,0 +1,439 @@
+"""Compact topology files for RouterNetTopo networks.
+
+A RouterNetTopo JSON file such as star_network.json lists every node and
+every classical connection, so a full classical mesh of N routers needs
+N * (N - 1) / 2 entries and RouterNetTopo matches every quantum connection
+against all of them. The compact format describes the same network with
+generators, per-class defaults and array-encoded edge lists::
+
+    {
+      "format": "compact", "version": 1, "stop_time": 2e12,
+      "defaults": {"QuantumRouter": {"memo_size": 50},
+                   "qconnection": {"attenuation": 2e-4, "distance": 500},
+                   "cconnection": {"delay": 5e8}},
+      "routers": {"names": ["center", "router1", "router2", "router3", "router4"]},
+      "qconnections": {"generator": "star"},
+      "cconnections": {"generator": "full_mesh"}
+    }
+
+* ``routers`` gives ``names`` or a ``count`` and a ``name`` pattern
+  (``"r{}"``); ``memo_size``, ``seed`` and ``template`` are a scalar or one
+  value per router (seeds default to the router index, as in the notebook).
+* ``qconnections`` is a ``generator`` of ``topology_builder.TOPOLOGIES``
+  (with ``args``) or two arrays ``node1`` / ``node2`` of router indices or
+  names; ``attenuation``, ``distance``, ``seed`` (of the BSM node) and
+  ``template`` are scalars or arrays along the edges.
+* any array may also be given as ``{"dtype": "<i4", "base64": ...}`` (see
+  ``encode_array``), which is smaller and faster to parse for large lists.
+* ``cconnections`` is ``full_mesh`` (every pair of routers),
+  ``qconnections`` (along the quantum connections) or ``node1`` / ``node2``
+  arrays; ``delay`` and ``distance`` are scalars or arrays.
+
+``load_topology`` validates a file into arrays without creating any
+SeQUeNCe object; ``CompactRouterNetTopo`` builds from it the same nodes and
+channels (same names, seeds and delays) RouterNetTopo builds from the
+expanded file, and ``CompactTopology.to_config`` writes that expanded file.
+"""
+
+import base64
+import json
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+
+# Importing sequence structures
+from sequence.components.optical_channel import ClassicalChannel, QuantumChannel
+from sequence.kernel.timeline import Timeline
+from sequence.topology.node import BSMNode, QuantumRouter
+from sequence.topology.router_net_topo import RouterNetTopo
+
+from classical_channels import LazyChannelTable
+from topology_builder import TOPOLOGIES, Network, next_hop_matrix
+
+FORMAT = "compact"
+FORMAT_VERSION = 1
+CC_GENERATORS = ("full_mesh", "qconnections")
+DEFAULTS = {
+    "QuantumRouter": {"memo_size": 0, "template": None},
+    "BSMNode": {"seed": 0, "template": None},
+    "qconnection": {"type": RouterNetTopo.MEET_IN_THE_MID},
+    "cconnection": {"distance": 1000},
+}
+
+
+class TopologyFormatError(ValueError):
+    """A compact topology file that does not follow the format."""
+
+
+def encode_array(values) -> dict:
+    """Base64 form of a numeric array for compact files."""
+    values = np.ascontiguousarray(values)
+    return {"dtype": values.dtype.str, "base64": base64.b64encode(values.tobytes()).decode("ascii")}
+
+def _decode(value, where: str):
+    """Lists and scalars as they are, base64 arrays as NumPy arrays."""
+    if not isinstance(value, dict):
+        return value
+    try:
+        return np.frombuffer(base64.b64decode(value["base64"]), dtype=np.dtype(value["dtype"]))
+    except (KeyError, TypeError, ValueError) as error:
+        raise TopologyFormatError(f"{where}: bad base64 array ({error})") from None
+
+def _array(section: dict, key: str, count: int, default, dtype, where: str) -> np.ndarray:
+    """A per-element value: a scalar for every element or a list of ``count`` values."""
+    value = _decode(section.get(key, default), f"{where}.{key}")
+    if value is None:
+        raise TopologyFormatError(f"{where}.{key} is required")
+    try:
+        if isinstance(value, (list, np.ndarray)):
+            if len(value) != count:
+                raise TopologyFormatError(f"{where}.{key} has {len(value)} values, expected {count}")
+            return np.asarray(value, dtype=dtype)
+        return np.full(count, value, dtype=dtype)
+    except (TypeError, ValueError) as error:
+        if isinstance(error, TopologyFormatError):
+            raise
+        raise TopologyFormatError(f"{where}.{key}: {error}") from None
+
+def _templates(section: dict, count: int, default: Optional[str], templates: dict, where: str) -> List[Optional[str]]:
+    value = section.get("template", default)
+    names = value if isinstance(value, list) else [value] * count
+    if len(names) != count:
+        raise TopologyFormatError(f"{where}.template has {len(names)} values, expected {count}")
+    unknown = set(names) - set(templates) - {None}
+    if unknown:
+        raise TopologyFormatError(f"{where}.template: unknown templates {sorted(unknown)}")
+    return names
+
+def _endpoints(section: dict, index: Dict[str, int], where: str) -> np.ndarray:
+    columns = []
+    for key in ("node1", "node2"):
+        values = _decode(section.get(key), f"{where}.{key}")
+        if not isinstance(values, (list, np.ndarray)):
+            raise TopologyFormatError(f"{where} needs a 'generator' or '{key}' arrays")
+        try:
+            if isinstance(values, list) and any(isinstance(v, str) for v in values):
+                values = [index[v] if isinstance(v, str) else v for v in values]
+            columns.append(np.asarray(values, dtype=np.int64))
+        except KeyError as error:
+            raise TopologyFormatError(f"{where}.{key}: unknown router {error}") from None
+    if len(columns[0]) != len(columns[1]):
+        raise TopologyFormatError(f"{where}: node1 and node2 have different lengths")
+    edges = np.stack(columns, axis=1) if len(columns[0]) else np.zeros((0, 2), dtype=np.int64)
+    if len(edges) and (edges.min() < 0 or edges.max() >= len(index)):
+        raise TopologyFormatError(f"{where}: router index out of range")
+    if np.any(edges[:, 0] == edges[:, 1]):
+        raise TopologyFormatError(f"{where}: a router can not be connected to itself")
+    return edges
+
+
+class CompactTopology:
+    """A validated compact topology, as arrays.
+
+    Attributes:
+        stop_time (float): stop time of the timeline (ps).
+        templates (dict): component templates, as in RouterNetTopo files.
+        names (List[str]): router names.
+        memo_size (np.ndarray): memories of every router.
+        seeds (np.ndarray): seed of every router.
+        router_templates (List[str]): template of every router (or None).
+        edges (np.ndarray): E x 2 router indices of the quantum connections.
+        attenuation (np.ndarray): attenuation (dB/m) of every quantum connection.
+        distance (np.ndarray): length (m) of every quantum connection, router to router.
+        bsm_seeds (np.ndarray): seed of the BSM node of every quantum connection.
+        bsm_templates (List[str]): template of every BSM node (or None).
+        cc_edges (np.ndarray): C x 2 router indices of the classical connections, None for a full mesh.
+        cc_delay (np.ndarray): delay (ps) of every classical connection (one value for a full mesh).
+        cc_distance (np.ndarray): length (m) of every classical connection (one value for a full mesh).
+    """
+
+    def __init__(self, config: dict):
+        if config.get("format") != FORMAT:
+            raise TopologyFormatError(f"not a compact topology (format must be '{FORMAT}')")
+        if config.get("version", FORMAT_VERSION) != FORMAT_VERSION:
+            raise TopologyFormatError(f"unsupported version {config.get('version')}")
+        if config.get(RouterNetTopo.IS_PARALLEL, False):
+            raise TopologyFormatError("parallel topologies are not supported")
+        unknown = set(config) - {"format", "version", "stop_time", "is_parallel", "templates", "defaults",
+                                 "routers", "qconnections", "cconnections"}
+        if unknown:
+            raise TopologyFormatError(f"unknown keys {sorted(unknown)}")
+        self.stop_time = float(config.get("stop_time", float("inf")))
+        self.templates = config.get("templates", {})
+        defaults = {cls: {**values, **config.get("defaults", {}).get(cls, {})} for cls, values in DEFAULTS.items()}
+
+        routers = config.get("routers")
+        if not isinstance(routers, dict):
+            raise TopologyFormatError("routers is required")
+        if "names" in routers:
+            self.names = [str(name) for name in routers["names"]]
+        elif "count" in routers:
+            self.names = [routers.get("name", "r{}").format(i) for i in range(int(routers["count"]))]
+        else:
+            raise TopologyFormatError("routers needs 'names' or 'count'")
+        count = len(self.names)
+        index = {name: i for i, name in enumerate(self.names)}
+        if len(index) != count:
+            raise TopologyFormatError("router names are not unique")
+        router_defaults = defaults["QuantumRouter"]
+        self.memo_size = _array(routers, "memo_size", count, router_defaults["memo_size"], np.int64, "routers")
+        if "seed" in routers or "seed" in router_defaults:
+            self.seeds = _array(routers, "seed", count, router_defaults.get("seed"), np.int64, "routers")
+        else:
+            self.seeds = np.arange(count)
+        if np.any(self.memo_size < 0):
+            raise TopologyFormatError("routers.memo_size must not be negative")
+        self.router_templates = _templates(routers, count, router_defaults["template"], self.templates, "routers")
+
+        q = config.get("qconnections", {})
+        q_defaults = defaults["qconnection"]
+        if "generator" in q:
+            if q["generator"] not in TOPOLOGIES:
+                raise TopologyFormatError(f"qconnections.generator must be one of {sorted(TOPOLOGIES)}")
+            try:
+                self.edges = TOPOLOGIES[q["generator"]](count, **q.get("args", {})).astype(np.int64).reshape(-1, 2)
+            except (TypeError, ValueError) as error:
+                raise TopologyFormatError(f"qconnections: {error}") from None
+        else:
+            self.edges = _endpoints(q, index, "qconnections")
+        if q.get("type", q_defaults["type"]) != RouterNetTopo.MEET_IN_THE_MID:
+            raise TopologyFormatError(f"qconnections.type must be '{RouterNetTopo.MEET_IN_THE_MID}'")
+        num_edges = len(self.edges)
+        self.attenuation = _array(q, "attenuation", num_edges, q_defaults.get("attenuation"), float, "qconnections")
+        self.distance = _array(q, "distance", num_edges, q_defaults.get("distance"), float, "qconnections")
+        if np.any(self.attenuation < 0) or np.any(self.distance <= 0):
+            raise TopologyFormatError("qconnections need attenuation >= 0 and distance > 0")
+        bsm_defaults = defaults["BSMNode"]
+        self.bsm_seeds = _array(q, "seed", num_edges, bsm_defaults["seed"], np.int64, "qconnections")
+        self.bsm_templates = _templates(q, num_edges, bsm_defaults["template"], self.templates, "qconnections")
+
+        c = config.get("cconnections", {})
+        c_defaults = defaults["cconnection"]
+        generator = c.get("generator")
+        if generator == "full_mesh":
+            self.cc_edges = None
+            size = 1
+        elif generator == "qconnections":
+            self.cc_edges = self.edges
+            size = num_edges
+        elif generator is None:
+            self.cc_edges = _endpoints(c, index, "cconnections")
+            size = len(self.cc_edges)
+        else:
+            raise TopologyFormatError(f"cconnections.generator must be one of {CC_GENERATORS}")
+        self.cc_delay = _array(c, "delay", size, c_defaults.get("delay"), float, "cconnections")
+        self.cc_distance = _array(c, "distance", size, c_defaults["distance"], float, "cconnections")
+        if np.any(self.cc_delay < 0):
+            raise TopologyFormatError("cconnections.delay must not be negative")
+        self.bsm_cc_delay = self._bsm_delays()
+
+    def _bsm_delays(self) -> np.ndarray:
+        """Delay of the channels between a BSM node and its routers: half the routers' mean delay."""
+        if self.cc_edges is None:
+            return np.full(len(self.edges), self.cc_delay[0] // 2)
+        num_routers = len(self.names)
+        keys = np.sort(self.cc_edges, axis=1) @ np.array([num_routers, 1])
+        unique, inverse = np.unique(keys, return_inverse=True)
+        mean = np.bincount(inverse, self.cc_delay) / np.bincount(inverse)
+        wanted = np.sort(self.edges, axis=1) @ np.array([num_routers, 1])
+        position = np.searchsorted(unique, wanted)
+        found = (position < len(unique)) & (unique[np.minimum(position, len(unique) - 1)] == wanted)
+        if not np.all(found):
+            u, v = self.edges[np.argmin(found)]
+            raise TopologyFormatError(f"no classical connection between {self.names[u]} and {self.names[v]}")
+        return mean[position] // 2
+
+    @property
+    def bsm_names(self) -> List[str]:
+        return ["BSM.{}.{}.auto".format(self.names[u], self.names[v]) for u, v in self.edges.tolist()]
+
+    def classical_pairs(self) -> np.ndarray:
+        """C x 2 router indices of the classical connections (full meshes expanded)."""
+        if self.cc_edges is not None:
+            return self.cc_edges
+        return np.stack(np.triu_indices(len(self.names), 1), axis=1)
+
+    def to_config(self) -> dict:
+        """The equivalent RouterNetTopo configuration (quadratic in size for full meshes)."""
+        nodes = []
+        for name, memo_size, seed, template in zip(self.names, self.memo_size.tolist(), self.seeds.tolist(),
+                                                   self.router_templates):
+            node = {"name": name, "type": RouterNetTopo.QUANTUM_ROUTER, "seed": seed, "memo_size": memo_size}
+            if template is not None:
+                node["template"] = template
+            nodes.append(node)
+        qconnections = []
+        for (u, v), attenuation, distance, seed, template in zip(self.edges.tolist(), self.attenuation.tolist(),
+                                                                  self.distance.tolist(), self.bsm_seeds.tolist(),
+                                                                  self.bsm_templates):
+            qconnection = {"node1": self.names[u], "node2": self.names[v], "attenuation": attenuation,
+                           "distance": distance, "type": RouterNetTopo.MEET_IN_THE_MID, "seed": seed}
+            if template is not None:
+                qconnection["template"] = template
+            qconnections.append(qconnection)
+        pairs = self.classical_pairs()
+        delay = np.broadcast_to(self.cc_delay, len(pairs)).tolist()
+        distance = np.broadcast_to(self.cc_distance, len(pairs)).tolist()
+        cconnections = [{"node1": self.names[u], "node2": self.names[v], "delay": d, "distance": length}
+                        for (u, v), d, length in zip(pairs.tolist(), delay, distance)]
+        config = {"nodes": nodes, "qconnections": qconnections, "is_parallel": False,
+                  "stop_time": self.stop_time, "cconnections": cconnections}
+        if self.templates:
+            config["templates"] = self.templates
+        return config
+
+
+def _compact(values: list):
+    """One value when they are all the same, the list otherwise."""
+    return values[0] if values and all(value == values[0] for value in values) else values
+
+def from_config(config: dict) -> dict:
+    """Compact form of a RouterNetTopo configuration made of nodes, qconnections and cconnections."""
+    if config.get("qchannels") or config.get("cchannels") or config.get(RouterNetTopo.IS_PARALLEL):
+        raise TopologyFormatError("only sequential configurations of qconnections and cconnections are supported")
+    routers = [node for node in config["nodes"] if node["type"] == RouterNetTopo.QUANTUM_ROUTER]
+    if len(routers) != len(config["nodes"]):
+        raise TopologyFormatError("only QuantumRouter nodes are supported, BSM nodes are generated")
+    names = [node["name"] for node in routers]
+    compact = {"format": FORMAT, "version": FORMAT_VERSION, "stop_time": config.get("stop_time", float("inf")),
+               "routers": {"names": names, "memo_size": _compact([node.get("memo_size", 0) for node in routers])}}
+    seeds = [node["seed"] for node in routers]
+    if seeds != list(range(len(routers))):
+        compact["routers"]["seed"] = _compact(seeds)
+    if any("template" in node for node in routers):
+        compact["routers"]["template"] = _compact([node.get("template") for node in routers])
+    if config.get("templates"):
+        compact["templates"] = config["templates"]
+
+    q = config.get("qconnections", [])
+    compact["qconnections"] = {"node1": [c["node1"] for c in q], "node2": [c["node2"] for c in q],
+                               "attenuation": _compact([c["attenuation"] for c in q]),
+                               "distance": _compact([c["distance"] for c in q]),
+                               "seed": _compact([c.get("seed", 0) for c in q])}
+    if any("template" in c for c in q):
+        compact["qconnections"]["template"] = _compact([c.get("template") for c in q])
+
+    c = config.get("cconnections", [])
+    delays = _compact([cc.get("delay") for cc in c])
+    distances = _compact([cc.get("distance", 1000) for cc in c])
+    pairs = {frozenset((cc["node1"], cc["node2"])) for cc in c}
+    if not isinstance(delays, list) and not isinstance(distances, list) and len(c) == len(pairs) \
+            and len(pairs) == len(names) * (len(names) - 1) // 2:
+        compact["cconnections"] = {"generator": "full_mesh", "delay": delays, "distance": distances}
+    else:
+        compact["cconnections"] = {"node1": [cc["node1"] for cc in c], "node2": [cc["node2"] for cc in c],
+                                   "delay": delays, "distance": distances}
+    return compact
+
+def load_topology(path: str) -> CompactTopology:
+    with open(path) as fh:
+        return CompactTopology(json.load(fh))
+
+def is_compact(path: str) -> bool:
+    """Whether a topology file is in the compact format (RouterNetTopo's otherwise)."""
+    with open(path) as fh:
+        head = fh.read(4096)
+    return '"format"' in head and '"%s"' % FORMAT in head
+
+
+class CompactRouterNetTopo(RouterNetTopo):
+    """RouterNetTopo built from a compact topology.
+
+    Nodes and channels are created straight from the arrays, with the names,
+    seeds and delays RouterNetTopo gives them, and the forwarding tables come
+    from one shortest-path pass over the quantum connections weighted by
+    length (ties may break differently than RouterNetTopo's networkx paths).
+    ``network`` exposes the result as a ``topology_builder.Network`` so
+    attacks and rerouting work on it.
+
+    Args:
+        topology (str | CompactTopology): compact file or loaded topology.
+        lazy_classical (bool): with a full classical mesh, create router to router
+            channels on first use instead of all N * (N - 1) up front.
+    """
+
+    def __init__(self, topology: Union[str, CompactTopology], lazy_classical: bool = False):
+        self.compact = load_topology(topology) if isinstance(topology, str) else topology
+        self.lazy_classical = lazy_classical
+        self.network = None
+        super().__init__("")
+
+    def _load(self, filename: str):
+        compact = self.compact
+        self.tl = Timeline(compact.stop_time)
+        routers = []
+        for name, memo_size, seed, template in zip(compact.names, compact.memo_size.tolist(),
+                                                   compact.seeds.tolist(), compact.router_templates):
+            router = QuantumRouter(name, self.tl, memo_size, component_templates=self.templates_of(template))
+            router.set_seed(seed)
+            routers.append(router)
+        bsm_nodes = []
+        for bsm_name, (u, v), seed, template in zip(compact.bsm_names, compact.edges.tolist(),
+                                                    compact.bsm_seeds.tolist(), compact.bsm_templates):
+            pair = [compact.names[u], compact.names[v]]
+            bsm = BSMNode(bsm_name, self.tl, pair, component_templates=self.templates_of(template))
+            bsm.set_seed(seed)
+            routers[u].add_bsm_node(bsm_name, pair[1])
+            routers[v].add_bsm_node(bsm_name, pair[0])
+            self.bsm_to_router_map[bsm_name] = pair
+            bsm_nodes.append(bsm)
+        self.templates = compact.templates
+        self.nodes[self.QUANTUM_ROUTER] = routers
+        self.nodes[self.BSM_NODE] = bsm_nodes
+        network = Network(self.tl, routers, bsm_nodes, compact.edges)
+
+        # two quantum channels and two classical connections to the BSM node per edge
+        half = compact.distance // 2
+        for bsm, (u, v), attenuation, distance, delay in zip(bsm_nodes, compact.edges.tolist(),
+                                                             compact.attenuation.tolist(), half.tolist(),
+                                                             compact.bsm_cc_delay.tolist()):
+            for router in (routers[u], routers[v]):
+                qc = QuantumChannel("QC.{}.{}".format(router.name, bsm.name), self.tl, attenuation, distance)
+                qc.set_ends(router, bsm.name)
+                self.qchannels.append(qc)
+            for router in (routers[u], routers[v]):
+                for src, dst in ((router, bsm), (bsm, router)):
+                    cc = ClassicalChannel("CC.{}.{}".format(src.name, dst.name), self.tl, distance, delay)
+                    cc.set_ends(src, dst.name)
+                    self.cchannels.append(cc)
+        network.qchannels = self.qchannels
+        network.cchannels = self.cchannels
+
+        if compact.cc_edges is None and self.lazy_classical:
+            delay = float(compact.cc_delay[0])
+            for router in routers:
+                router.cchannels = LazyChannelTable(router, lambda src, dst: delay, self.cchannels)
+        else:
+            pairs = compact.classical_pairs()
+            delays = np.broadcast_to(compact.cc_delay, len(pairs)).tolist()
+            distances = np.broadcast_to(compact.cc_distance, len(pairs)).tolist()
+            for (u, v), delay, distance in zip(pairs.tolist(), delays, distances):
+                for src, dst in ((routers[u], routers[v]), (routers[v], routers[u])):
+                    cc = ClassicalChannel("cc.{}.{}".format(src.name, dst.name), self.tl, distance, delay)
+                    cc.set_ends(src, dst.name)
+                    self.cchannels.append(cc)
+
+        network.weights = 2 * half
+        network.install_forwarding_tables(next_hop_matrix(len(routers), compact.edges, network.weights))
+        self.network = network
+
+    def templates_of(self, template: Optional[str]) -> dict:
+        return self.compact.templates.get(template, {}) if template is not None else {}
+
+
+def load_router_net_topo(path: str, **kwargs) -> RouterNetTopo:
+    """RouterNetTopo of a topology file in either format."""
+    if is_compact(path):
+        return CompactRouterNetTopo(path, **kwargs)
+    return RouterNetTopo(path)
+
+
+if __name__ == '__main__':
+    import sys
+
+    # python topology_format.py star_network.json star_network.compact.json
+    with open(sys.argv[1]) as fh:
+        compact = from_config(json.load(fh))
+    CompactTopology(compact)
+    with open(sys.argv[2], "w") as fh:
+        json.dump(compact, fh, indent=2)
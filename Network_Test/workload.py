@@ -0,0 +1,202 @@
+"""Entanglement requests replayed from a trace file.
+
+The scripts make one hard-coded ``network_manager.request`` and the notebook
+lets ``RandomRequestApp`` draw its requests. ``RequestDriver`` instead reads
+requests from a file and issues them on the timeline, one request per line
+of a JSONL file::
+
+    {"time": 0, "src": 0, "dst": "r2", "start_time": 1e12, "end_time": 2e12, "memory_size": 25, "fidelity": 0.9}
+
+or one ``REQUEST_DTYPE`` record of a ``.npy`` file (see ``write_requests``).
+Times are in ps as in ``network_manager.request``; ``time`` is when the
+source router makes the request and defaults to ``start_time - lead``.
+Routers are indices in ``network.routers`` or, in JSONL, names.
+
+The file is read lazily and must be sorted by issue time. Only the requests
+issued within ``window`` ps of the current simulation time are on the event
+list; when the timeline reaches the end of the window the driver reads the
+next ones. Memory use is bounded by the window, not by the length of the
+trace, so traces of millions of requests can be replayed.
+"""
+
+import json
+import time
+from itertools import islice
+from typing import Iterable, Iterator, Optional, Union
+
+import numpy as np
+
+# Importing sequence structures
+from sequence.kernel.event import Event
+from sequence.kernel.process import Process
+
+from topology_builder import Network
+
+REQUEST_DTYPE = np.dtype([
+    ("time", np.int64),         # issue time (ps)
+    ("src", np.int32),          # index of the requesting router
+    ("dst", np.int32),          # index of the responding router
+    ("start_time", np.int64),   # reservation start (ps)
+    ("end_time", np.int64),     # reservation end (ps)
+    ("memory_size", np.int32),
+    ("fidelity", np.float64),
+])
+
+CHUNK = 65536  # records read from a binary trace at a time
+
+def read_jsonl(path: str, lead: float = 1e9) -> Iterator[tuple]:
+    """``(time, src, dst, start_time, end_time, memory_size, fidelity)`` of every line of a JSONL trace."""
+    with open(path) as fh:
+        for number, line in enumerate(fh, 1):
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+                start_time = int(request["start_time"])
+                yield (int(request.get("time", start_time - lead)), request["src"], request["dst"], start_time,
+                       int(request["end_time"]), int(request["memory_size"]), float(request["fidelity"]))
+            except (KeyError, TypeError, ValueError) as error:
+                raise ValueError(f"{path}:{number}: bad request ({error})") from None
+
+def read_binary(path: str, chunk: int = CHUNK) -> Iterator[tuple]:
+    """Requests of a ``.npy`` trace, mapped read-only and converted ``chunk`` records at a time."""
+    records = np.load(path, mmap_mode="r")
+    if records.dtype != REQUEST_DTYPE:
+        raise ValueError(f"{path}: expected records of {REQUEST_DTYPE}, found {records.dtype}")
+    for offset in range(0, len(records), chunk):
+        yield from np.asarray(records[offset:offset + chunk]).tolist()
+
+def read_requests(path: str, lead: float = 1e9) -> Iterator[tuple]:
+    """Requests of a trace file, binary if it ends in ``.npy``, JSONL otherwise."""
+    if path.endswith(".npy"):
+        return read_binary(path)
+    return read_jsonl(path, lead)
+
+def write_requests(requests: Iterable[tuple], path: str, count: int) -> None:
+    """Writes ``count`` requests (router indices) to a ``.npy`` trace, without holding them in memory."""
+    records = np.lib.format.open_memmap(path, mode="w+", dtype=REQUEST_DTYPE, shape=(count,))
+    requests = iter(requests)
+    for offset in range(0, count, CHUNK):
+        block = list(islice(requests, CHUNK))
+        records[offset:offset + len(block)] = block
+        if len(block) < min(CHUNK, count - offset):
+            raise ValueError(f"expected {count} requests, got {offset + len(block)}")
+    records.flush()
+    del records
+
+
+class RequestDriver:
+    """Issues the requests of a trace on a network's timeline, ``window`` ps ahead at most.
+
+    Attributes:
+        network (Network): network the requests are made on.
+        window (int): how far (ps) ahead of the simulation time requests are scheduled.
+        issued (int): requests made so far.
+        late (int): requests whose issue time had already passed, made at once.
+        max_scheduled (int): most requests on the event list at the same time.
+    """
+
+    def __init__(self, network: Network, requests: Iterable[tuple], window: float = 1e12):
+        if window <= 0:
+            raise ValueError("window must be positive")
+        self.network = network
+        self.window = int(window)
+        self.issued = 0
+        self.late = 0
+        self.max_scheduled = 0
+        self.name = "request_driver"
+        self._requests = iter(requests)
+        self._next = next(self._requests, None)
+        self._last = None
+        self._scheduled = 0
+
+    def _router(self, router: Union[int, str]):
+        if isinstance(router, str):
+            return self.network.get_router(router)
+        return self.network.routers[router]
+
+    def start(self) -> None:
+        """Schedules the first window; call after ``tl.init()``."""
+        self.fill()
+
+    def fill(self) -> None:
+        tl = self.network.tl
+        horizon = tl.now() + self.window
+        while self._next is not None and self._next[0] <= horizon:
+            request = self._next
+            if self._last is not None and request[0] < self._last:
+                raise ValueError(f"requests must be sorted by issue time ({request[0]} after {self._last})")
+            self._last = request[0]
+            if request[0] < tl.now():
+                self.late += 1
+            tl.schedule(Event(max(request[0], tl.now()), Process(self, "issue", list(request[1:]))))
+            self._scheduled += 1
+            self._next = next(self._requests, None)
+        self.max_scheduled = max(self.max_scheduled, self._scheduled)
+        if self._next is not None:
+            # read on when the next request enters the window
+            tl.schedule(Event(max(self._next[0] - self.window, tl.now()), Process(self, "fill", [])))
+
+    def issue(self, src, dst, start_time: int, end_time: int, memory_size: int, fidelity: float) -> None:
+        self._scheduled -= 1
+        self._router(src).network_manager.request(self._router(dst).name, int(start_time), int(end_time),
+                                                  int(memory_size), float(fidelity))
+        self.issued += 1
+
+    @property
+    def exhausted(self) -> bool:
+        return self._next is None
+
+
+def run_workload(trace: str, window: float = 1e12, lead: float = 1e9, termination: Optional[dict] = None,
+                 **params) -> dict:
+    """Replays a trace on a scenario network (``params`` as in scenario.build_scenario).
+
+    ``termination`` holds stop conditions (see termination.py); ``resolved``
+    waits for the whole trace to be issued.
+
+    Returns:
+        dict: requests issued, RSVP reservations approved, entangled memories
+        at the end, events and wall times, and why the run stopped.
+    """
+    from scenario import build_scenario
+    from termination import Termination
+
+    tick = time.time()
+    network = build_scenario(**params)
+    network.tl.init()
+    build_time = time.time() - tick
+    driver = RequestDriver(network, read_requests(trace, lead), window)
+    driver.start()
+    watcher = Termination(network.tl, network.routers, driver=driver, **(termination or {}))
+    tick = time.time()
+    network.tl.run()
+    run_time = time.time() - tick
+    report = watcher.report()
+    watcher.close()
+    # every router on the path keeps the reservation, count it at its initiator
+    accepted = sum(reservation.initiator == router.name
+                   for router in network.routers
+                   for reservation in router.network_manager.protocol_stack[1].accepted_reservations)
+    entangled = sum(memory.entangled_memory["node_id"] is not None
+                    for router in network.routers
+                    for memory in router.get_components_by_type("MemoryArray")[0].memories)
+    return {"issued": driver.issued, "late": driver.late, "max_scheduled": driver.max_scheduled,
+            "accepted_reservations": accepted, "entangled_memories": entangled,
+            "events": network.tl.run_counter, "build_time": build_time, "run_time": run_time,
+            "stop_reason": report["stop_reason"], "stop_time": report["stop_time"]}
+
+
+if __name__ == '__main__':
+    import os
+    import tempfile
+
+    # a uniform random trace on the 4-router ring, 1 ms between requests
+    rng = np.random.default_rng(0)
+    count = 20
+    pairs = rng.choice(4, size=(count, 2), replace=True)
+    requests = [(int(i * 1e9), int(s), int((s + 1 + d % 3) % 4), int(i * 1e9 + 1e10), int(i * 1e9 + 2e11), 10, 0.9)
+                for i, (s, d) in enumerate(pairs)]
+    path = os.path.join(tempfile.mkdtemp(), "requests.npy")
+    write_requests(requests, path, count)
+    print(run_workload(path, window=5e9, sim_time=300, cc_delay=0.1, qc_atten=3e-5, qc_dist=1, memo_size=50))